@@ -3,11 +3,12 @@ import logging
 import re
 from typing import Optional
 
+import lxml.html
 import pandas as pd
 from bs4 import BeautifulSoup
 from bs4.element import PageElement
 
-from dify_rag.extractor.html import constants
+from dify_rag.extractor.html import constants, html_lxml, html_text
 from dify_rag.extractor.html.html_table import HtmlTableExtractor
 from dify_rag.models import constants as global_constants
 from dify_rag.models.document import Document
@@ -124,7 +125,21 @@ def preprocessing(
     fix_check: bool = True,
     seperate_tables: bool = True,
     prevent_duplicate_header: bool = True,
+    use_lxml: bool = False,
 ) -> tuple:
+    if use_lxml:
+        root = html_text.parse_html(content)
+        tables, title = html_lxml.preprocessing(
+            root,
+            title,
+            use_first_header_as_title,
+            remove_hyperlinks,
+            fix_check,
+            seperate_tables,
+            prevent_duplicate_header,
+        )
+        return lxml.html.tostring(root, encoding="unicode"), tables, title
+
     soup = BeautifulSoup(content, "html.parser")
 
     header = soup.find(["h1", "h2"])
@@ -240,21 +255,52 @@ def build_row_content(row, columns):
     return content
 
 
+def build_rows_content(values, columns) -> list[str]:
+    """按列批量生成每行内容，与逐行调用 build_row_content 结果一致"""
+    if len(columns) == 0:
+        return [""] * len(values)
+    if len(columns) == 1:
+        column = columns[0].strip()
+        return [f"{column}是{str(value.strip())}" for value in values[:, 0]]
+
+    first_col = columns[0].strip()
+    first_col_data = [str(value).strip() for value in values[:, 0]]
+    column_contents = [
+        [
+            f"{first_col}为{first}的{column}是{str(value).strip()}"
+            for first, value in zip(first_col_data, values[:, i])
+        ]
+        for i, column in enumerate((col.strip() for col in columns[1:]), 1)
+    ]
+    return ["\n\n".join(row) for row in zip(*column_contents)]
+
+
 def html_cut_table_handler(table):
     new_docs = []
     try:
         table_values = table["table"]
         df = pd.DataFrame(table_values[1:], columns=table_values[0])
-        for i, row in df.iterrows():
-            content = build_row_content(row, df.columns)
-
-            metadata = {
-                "titles": trans_meta_titles(table["titles"], False),
-                "row": i,
-                "content_type": global_constants.ContentType.TABLE,
-            }
-            doc = Document(page_content=content, metadata=metadata)
-            new_docs.append(doc)
+        if not df.columns.is_unique or not all(
+            isinstance(col, str) for col in df.columns
+        ):
+            # 重复或非字符串列名按标签取值的结果不是单个单元格，逐行处理
+            contents = [build_row_content(row, df.columns) for _, row in df.iterrows()]
+        else:
+            # df.values 与 iterrows 的每行取值相同，按列批量生成内容
+            contents = build_rows_content(df.values, df.columns)
+
+        titles = trans_meta_titles(table["titles"], False)
+        new_docs = [
+            Document(
+                page_content=content,
+                metadata={
+                    "titles": list(titles),
+                    "row": i,
+                    "content_type": global_constants.ContentType.TABLE,
+                },
+            )
+            for i, content in enumerate(contents)
+        ]
         return new_docs
     except ValueError:
         import traceback
@@ -0,0 +1,360 @@
+"""
+html_helper 预处理的 lxml 实现
+
+与 BeautifulSoup(html.parser) 版本逐步对应：标题清洗、超链接展开、未选中的复选框/单选框清理、
+表格分离及标题栈，直接修改 html_text.parse_html 得到的解析树，可与后续的 readability、
+正文提取共用同一棵树。
+
+BeautifulSoup 将 pre/textarea 之外仅含 ascii 空白的字符串替换为单个换行或空格，
+预处理前先对解析树做同样的替换（collapse_whitespace）。
+BeautifulSoup 中相邻的字符串是独立节点，lxml 会将其合并到 text/tail 中，
+因此记录发生过合并的节点，以保证 find_table_name 中 .string 的判断与 BeautifulSoup 一致；
+预处理期间在合并处插入标记注释，get_text(strip=True) 仍逐个字符串去除空白，预处理结束后删除。
+已知差异：libxml2 会将 \\r\\n 统一为 \\n，表格单元格中间的换行符与 BeautifulSoup 版本不同
+"""
+
+import copy
+from typing import Optional
+
+import lxml.etree
+import lxml.html
+
+from dify_rag.extractor.html import constants
+from dify_rag.extractor.html.html_table import HtmlTableExtractor
+
+# BeautifulSoup get_text 不包含这些标签中的字符串
+NON_TEXT_TAGS = frozenset(["script", "style", "template", "rt", "rp"])
+HEADER_TAGS = frozenset(["h1", "h2", "h3", "h4", "h5", "h6"])
+# 与 BeautifulSoup.ASCII_SPACES、HTMLTreeBuilder.DEFAULT_PRESERVE_WHITESPACE_TAGS 一致
+ASCII_SPACES = " \n\t\x0c\r"
+PRESERVE_WHITESPACE_TAGS = frozenset(["pre", "textarea"])
+# 分隔相邻字符串的标记注释，其 tail 为 BeautifulSoup 中的一个独立字符串
+STRING_MARKER = "dify-rag:string"
+
+
+def is_element(node) -> bool:
+    # 注释与处理指令的 tag 不是字符串
+    return isinstance(node.tag, str)
+
+
+def collapse_text(text: Optional[str]) -> Optional[str]:
+    """仅含 ascii 空白的字符串替换为单个换行或空格"""
+    if text and not text.strip(ASCII_SPACES):
+        return "\n" if "\n" in text else " "
+    return text
+
+
+def collapse_whitespace(root) -> None:
+    """与 BeautifulSoup 解析结果一致：pre/textarea 之外仅含 ascii 空白的 text/tail 替换为单个换行或空格"""
+    preserved = set()
+    for tag in root.iter(*PRESERVE_WHITESPACE_TAGS):
+        preserved.update(tag.iter())
+    for string in root.xpath("//text()"):
+        if string.strip(ASCII_SPACES):
+            continue
+        owner = string.getparent()
+        if string.is_tail:
+            # tail 属于父节点的内容
+            if owner is not root and owner.getparent() not in preserved:
+                owner.tail = collapse_text(owner.tail)
+        elif owner not in preserved:
+            owner.text = collapse_text(owner.text)
+
+
+def _iter_strings(element):
+    if element.text and element.tag not in NON_TEXT_TAGS:
+        yield element.text
+    for child in element:
+        if is_element(child) and child.tag not in NON_TEXT_TAGS:
+            yield from _iter_strings(child)
+        if child.tail:
+            yield child.tail
+
+
+def get_text(element, strip: bool = False) -> str:
+    """与 BeautifulSoup Tag.get_text 一致"""
+    if element.tag in NON_TEXT_TAGS:
+        return ""
+    if strip:
+        return "".join(s.strip() for s in _iter_strings(element) if s.strip())
+    return "".join(_iter_strings(element))
+
+
+def _contents(element) -> list:
+    contents = [element.text] if element.text else []
+    for child in element:
+        contents.append(child)
+        if child.tail:
+            contents.append(child.tail)
+    return contents
+
+
+def get_string(element, fragmented: Optional[set] = None) -> Optional[str]:
+    """与 BeautifulSoup Tag.string 一致：仅有一个子节点时返回其字符串"""
+    while True:
+        if fragmented and element in fragmented:
+            return None
+        contents = _contents(element)
+        if len(contents) != 1:
+            return None
+        node = contents[0]
+        if isinstance(node, str):
+            return node
+        if not is_element(node):
+            return node.text
+        element = node
+
+
+def _previous_text(element) -> Optional[str]:
+    previous = element.getprevious()
+    if previous is None:
+        return element.getparent().text
+    return previous.tail
+
+
+def _add_string_marker(element, text: Optional[str]) -> None:
+    marker = lxml.etree.Comment(STRING_MARKER)
+    marker.tail = text
+    element.addprevious(marker)
+
+
+def remove_string_markers(root) -> None:
+    """删除标记注释，其 tail 合并到前一个字符串中"""
+    for marker in list(root.iter(lxml.etree.Comment)):
+        if marker.text != STRING_MARKER:
+            continue
+        if marker.tail:
+            previous = marker.getprevious()
+            if previous is None:
+                parent = marker.getparent()
+                parent.text = (parent.text or "") + marker.tail
+            else:
+                previous.tail = (previous.tail or "") + marker.tail
+        marker.getparent().remove(marker)
+
+
+def remove_element(element, fragmented: set) -> None:
+    """删除元素并保留其后的文本，与 BeautifulSoup extract 一致"""
+    if element.getparent() is None:
+        return
+    if element.tail and _previous_text(element):
+        fragmented.add(element.getparent())
+        _add_string_marker(element, element.tail)
+        element.tail = None
+    element.drop_tree()
+
+
+def replace_with_text(element, text: str, fragmented: set) -> None:
+    """将元素替换为文本，与 BeautifulSoup replace_with(str) 一致"""
+    parent = element.getparent()
+    if parent is None:
+        return
+    # 空字符串在 BeautifulSoup 中同样是一个节点
+    if not text or element.tail or _previous_text(element):
+        fragmented.add(parent)
+        _add_string_marker(element, text)
+        if element.tail:
+            _add_string_marker(element, element.tail)
+        element.tail = None
+        element.drop_tree()
+        return
+    element.text = text
+    for child in list(element):
+        element.remove(child)
+    element.drop_tag()
+
+
+def is_detached(element, root) -> bool:
+    """元素所在子树已从 root 中删除"""
+    for ancestor in element.iterancestors():
+        element = ancestor
+    return element is not root
+
+
+class LxmlTableExtractor(HtmlTableExtractor):
+    def __init__(self, table, transformer=str):
+        self._table = table
+        self._transformer = transformer
+        self._output = []
+
+    def _rows(self):
+        return self._table.iter("tr")
+
+    def _cells(self, row):
+        return [cell for cell in row if cell.tag in ("td", "th")]
+
+    def _cell_text(self, cell) -> str:
+        return get_text(cell)
+
+
+def convert_table_to_markdown(table) -> str:
+    md = []
+    first_row = True
+
+    for row in table.iter("tr"):
+        cells = list(row.iter("th", "td"))
+        row_text = "| " + " | ".join(get_text(cell, strip=True) for cell in cells) + " |"
+        md.append(row_text)
+
+        if next(row.iter("th"), None) is not None or first_row:
+            header_sep = "| " + " | ".join("---" for _ in cells) + " |"
+            md.append(header_sep)
+            first_row = False
+
+    return "\n".join(md)
+
+
+def _iter_title_or_table(root, title: str):
+    """按文档顺序返回 (标题栈, 表格)，已删除表格中的标题与表格不再处理"""
+    title_stack = []
+    if title and title != constants.NO_TITLE:
+        title_stack.append((constants.TITLE_KEY, title))
+
+    removed = False
+    for tag in list(root.iter(*HEADER_TAGS, "table")):
+        if removed and is_detached(tag, root):
+            continue
+        if tag.tag in constants.TAG_HIERARCHY:
+            level = constants.TAG_HIERARCHY[tag.tag]
+            title_text = get_text(tag, strip=True)
+
+            while title_stack and constants.TAG_HIERARCHY[title_stack[-1][0]] <= level:
+                title_stack.pop()
+
+            title_stack.append((tag.tag, title_text))
+        else:
+            yield title_stack, tag
+            removed = True
+
+
+def recursive_preprocess_tables(root, title: str) -> list:
+    table_with_titles = []
+    fragmented = set()
+    for title_stack, tag in _iter_title_or_table(root, title):
+        table_md = convert_table_to_markdown(tag)
+        remove_element(tag, fragmented)
+
+        table_with_titles.append(
+            {"table": table_md, "titles": copy.deepcopy(title_stack)}
+        )
+
+    return table_with_titles
+
+
+def get_table_name(element, fragmented: Optional[set] = None) -> Optional[tuple[str, str]]:
+    """element 的字符串以“表”开头或结尾时作为表格名称，返回 (标签名, 名称)"""
+    content = get_string(element, fragmented)
+    if content and (content.startswith("表") or content.endswith("表")):
+        return element.tag, content
+    return None
+
+
+def find_table_name(table_elem, fragmented: Optional[set] = None) -> tuple[str, str]:
+    prev_sibling = next(
+        (e for e in table_elem.itersiblings(preceding=True) if is_element(e)), None
+    )
+    if prev_sibling is not None:
+        table_name = get_table_name(prev_sibling, fragmented)
+        if table_name:
+            return table_name
+
+    next_sibling = next((e for e in table_elem.itersiblings() if is_element(e)), None)
+    if next_sibling is not None:
+        table_name = get_table_name(next_sibling, fragmented)
+        if table_name:
+            return table_name
+
+    return "", ""
+
+
+def preprocess_tables(root, title: str, fragmented: Optional[set] = None) -> list:
+    table_with_titles = []
+    fragmented = set() if fragmented is None else fragmented
+    for title_stack, tag in _iter_title_or_table(root, title):
+        table_name_tag, table_name = find_table_name(tag, fragmented)
+        table_name_array = [(table_name_tag, table_name)] if table_name else []
+        table_md = convert_table_to_markdown(tag)
+        table_extractor = LxmlTableExtractor(tag)
+        table_extractor.parse()
+        remove_element(tag, fragmented)
+
+        table_with_titles.append(
+            {
+                "table": table_extractor.return_list(),
+                "table_md": table_md,
+                "titles": copy.deepcopy(title_stack) + table_name_array,
+            }
+        )
+
+    return table_with_titles
+
+
+def clean_header(tag, fragmented: set) -> None:
+    tag_text = get_text(tag)
+    for child in list(tag):
+        tag.remove(child)
+    tag.text = tag_text.replace("\n", " ").replace("\r", "")
+    fragmented.discard(tag)
+
+
+def clean_hyperlink(tag, fragmented: set) -> str:
+    """将超链接替换为其文本，返回替换后的文本"""
+    text = get_text(tag)
+    cleaned_text = text.replace("\n", " ").replace("\r", "")
+    replace_with_text(tag, cleaned_text, fragmented)
+    return cleaned_text
+
+
+def is_unchecked_input(tag) -> bool:
+    return tag.get("type") in ("checkbox", "radio") and tag.get("checked") is None
+
+
+def clean_tags(
+    root, fragmented: set, remove_hyperlinks: bool = True, fix_check: bool = True
+) -> None:
+    """清洗标题、展开超链接并删除未选中的复选框/单选框及其后的 span"""
+    # clean header contents
+    for tag in list(root.iter(*HEADER_TAGS)):
+        clean_header(tag, fragmented)
+
+    # clean hyperlinks
+    if remove_hyperlinks:
+        for tag in list(root.iter("a")):
+            clean_hyperlink(tag, fragmented)
+
+    # clean unchecked checkboxes and radio buttons
+    if fix_check:
+        match_inputs = [tag for tag in root.iter("input") if is_unchecked_input(tag)]
+        for input_tag in match_inputs:
+            next_span = next(input_tag.itersiblings("span"), None)
+            if next_span is not None:
+                remove_element(next_span, fragmented)
+            remove_element(input_tag, fragmented)
+
+
+def preprocessing(
+    root: lxml.html.HtmlElement,
+    title: str,
+    use_first_header_as_title: bool = False,
+    remove_hyperlinks: bool = True,
+    fix_check: bool = True,
+    seperate_tables: bool = True,
+    prevent_duplicate_header: bool = True,
+) -> tuple:
+    """直接修改解析树，返回 (表格, 标题)"""
+    fragmented = set()
+    collapse_whitespace(root)
+
+    header = next(root.iter("h1", "h2"), None)
+    if header is not None and use_first_header_as_title:
+        title = get_text(header).strip()
+        if prevent_duplicate_header:
+            remove_element(header, fragmented)
+
+    clean_tags(root, fragmented, remove_hyperlinks, fix_check)
+
+    tables = []
+    if seperate_tables:
+        tables = preprocess_tables(root, title, fragmented)
+    remove_string_markers(root)
+    return tables, title
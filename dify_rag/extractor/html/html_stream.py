@@ -0,0 +1,431 @@
+"""
+html 增量解析
+
+基于 lxml HTMLPullParser 边读取边解析，按文档顺序完成 html_lxml 的预处理（空白字符串替换、
+标题清洗、超链接展开、未选中的复选框/单选框清理、表格分离）以及 html_text.cleaner 的清洗，
+生成与 lxml.etree.iterwalk 顺序一致的事件供 html_text.iter_event_sections 分段。已处理的节点随即从解析树中删除，
+每层只保留最近的兄弟节点用于表格名称判断，内存占用与文件大小无关。
+
+解析器只会向最后一个未闭合节点追加文本，因此每个事件在下一个事件到达后才处理，此时该节点的
+text/tail 已完整，修改该节点及之前的节点不会影响解析器。被清洗掉的节点（注释、script 等）的文本
+合并到前一个输出节点中，与 cleaner 删除节点后文本合并的效果一致。
+
+与 use_lxml 全量解析的已知差异：
+- 不生成 summary
+- 表格在其名称确定后即输出，与正文分段按文档顺序交替返回
+- 只读取标题确定前（body 之前，use_first_header_as_title 时为首个 h1/h2 之前）的 <title>
+"""
+
+from collections import deque
+from typing import Iterable, Iterator, Optional
+
+import lxml.etree
+import lxml.html
+
+from dify_rag.extractor.html import constants, html_lxml
+from dify_rag.extractor.html.readability import htmls
+
+CHUNK_SIZE = 64 * 1024
+
+# 与 html_text.cleaner 的配置对应：删除节点及其内容
+KILL_TAGS = frozenset(
+    ["script", "style", "link", "meta", "applet", "noframes", "frame", "frameset"]
+)
+# 与 html_text.cleaner 的配置对应：删除标签，保留内容
+UNWRAP_TAGS = frozenset(["iframe", "embed", "layer", "object", "param"])
+
+# 节点类型
+KEPT = "kept"
+UNWRAP = "unwrap"
+HIDDEN = "hidden"
+HEADER = "header"
+LINK = "link"
+TABLE = "table"
+DROP = "drop"
+# 标题、超链接、表格等整体处理的节点的子孙节点
+INNER = "inner"
+
+ATOMIC_KINDS = frozenset([HEADER, LINK, TABLE, DROP, INNER])
+
+
+class TextNode:
+    """html_text 分段所需的节点信息"""
+
+    __slots__ = ("tag", "text", "tail")
+
+    def __init__(self, tag, text=None, tail=None):
+        self.tag = tag
+        self.text = text
+        self.tail = tail
+
+
+class _Frame:
+    __slots__ = ("element", "kind", "visible", "preprocess", "spans", "tables", "name_for")
+
+    def __init__(self, element, kind, visible, preprocess):
+        self.element = element
+        self.kind = kind
+        # 子节点是否输出
+        self.visible = visible
+        # 子节点是否逐个预处理，整体处理的节点在闭合时统一处理
+        self.preprocess = preprocess
+        # 待删除的 span 数量，对应之前未选中的复选框/单选框
+        self.spans = 0
+        # 等待后一个兄弟节点确定名称的子表格，元素为 [表格, 是否完成]
+        self.tables = []
+        # 以当前节点作为后一个兄弟节点确定名称的表格
+        self.name_for = []
+
+
+def iter_text_chunks(chunks: Iterable[str]) -> Iterator[bytes]:
+    """与 html_text.parse_html 一致：去除首尾空白及 \\x00 后按 utf-8 编码"""
+    started = False
+    whitespace = ""
+    for chunk in chunks:
+        if not started:
+            chunk = chunk.lstrip()
+            if not chunk:
+                continue
+            started = True
+        body = chunk.rstrip()
+        if body:
+            yield (whitespace + body).replace("\x00", "").encode("utf8")
+            whitespace = ""
+        whitespace += chunk[len(body) :]
+
+
+class HtmlStream:
+    def __init__(
+        self,
+        chunks: Iterable[str],
+        default_title: str = constants.NO_TITLE,
+        use_first_header_as_title: bool = False,
+        remove_hyperlinks: bool = True,
+        fix_check: bool = True,
+        seperate_tables: bool = True,
+        prevent_duplicate_header: bool = True,
+    ) -> None:
+        self._chunks = iter_text_chunks(chunks)
+        self._use_first_header_as_title = use_first_header_as_title
+        self._remove_hyperlinks = remove_hyperlinks
+        self._fix_check = fix_check
+        self._seperate_tables = seperate_tables
+        self._prevent_duplicate_header = prevent_duplicate_header
+
+        self._parser = lxml.etree.HTMLPullParser(
+            events=("start", "end", "comment", "pi"), recover=True, encoding="utf8"
+        )
+        self._parser.set_element_class_lookup(lxml.html.HtmlElementClassLookup())
+        self._fed = False
+        self._closed = False
+        # 尚未处理的解析事件，最后一个事件需要等待下一个事件到达
+        self._events = deque()
+        self._output = deque()
+        self._stack = []
+        self._fragmented = set()
+        self._object_depth = 0
+        # 未闭合的 pre/textarea 数量，其中的空白字符串不做替换
+        self._preserve_depth = 0
+        # 最后一个输出事件在下一个输出事件产生前保留，被清洗节点的文本合并到其中
+        self._held = None
+        self._held_texts = []
+        # 表格的标题栈，不含文档标题
+        self._title_stack = []
+        # 全量解析时 next 兄弟节点在表格删除前判断名称，记录删除过表格的父节点
+        self._table_parents = set()
+        # 按文档顺序排列的表格，元素为 [表格, 是否完成]
+        self._tables = deque()
+        self._first_header = None
+        self._header_title = False
+        self._title_seen = False
+        self._body_started = False
+
+        self.root = None
+        self.title = default_title
+
+    @property
+    def title_final(self) -> bool:
+        """标题已确定，之后不会再改变"""
+        if self._closed:
+            return True
+        if self._use_first_header_as_title:
+            return self._header_title
+        return self._title_seen or self._body_started
+
+    def pop_tables(self) -> list[dict]:
+        """返回已完成分离的表格，titles 不含文档标题"""
+        tables = []
+        while self._tables and self._tables[0][1]:
+            tables.append(self._tables.popleft()[0])
+        return tables
+
+    def events(self) -> Iterator[tuple[str, TextNode]]:
+        while True:
+            while self._output:
+                yield self._output.popleft()
+            if self._closed:
+                return
+            self._pump()
+
+    def _pump(self) -> None:
+        chunk = next(self._chunks, None)
+        if chunk is not None:
+            self._parser.feed(chunk)
+            self._fed = True
+            self._events.extend(self._parser.read_events())
+            while len(self._events) > 1:
+                self._process(*self._events.popleft())
+            return
+
+        if not self._fed:
+            self._parser.feed(b"<html/>")
+        self._parser.close()
+        self._events.extend(self._parser.read_events())
+        while self._events:
+            self._process(*self._events.popleft())
+        self._release()
+        self._closed = True
+
+    def _process(self, event: str, node) -> None:
+        if event == "start":
+            self._start(node)
+        elif event == "end":
+            self._end(node)
+        else:
+            self._misc(node)
+
+    def _start(self, element) -> None:
+        if self.root is None:
+            self.root = element
+        parent = self._stack[-1] if self._stack else None
+        tag = element.tag
+        if (
+            self._use_first_header_as_title
+            and self._first_header is None
+            and tag in ("h1", "h2")
+        ):
+            self._first_header = element
+        if tag in html_lxml.PRESERVE_WHITESPACE_TAGS:
+            self._preserve_depth += 1
+        if not self._preserve_depth:
+            element.text = html_lxml.collapse_text(element.text)
+
+        if parent is not None and not parent.preprocess:
+            self._stack.append(_Frame(element, INNER, False, False))
+            return
+
+        if parent is not None:
+            self._prune(element, parent)
+        kind = self._classify(element, parent)
+        visible = parent.visible if parent is not None else True
+        frame = _Frame(
+            element, kind, visible and kind in (KEPT, UNWRAP), kind not in ATOMIC_KINDS
+        )
+        # 超链接替换为文本，复选框及 span 被删除，均不作为表格的后一个兄弟节点
+        if parent is not None and parent.tables and kind not in (LINK, DROP):
+            frame.name_for, parent.tables = parent.tables, []
+        self._stack.append(frame)
+
+        if tag == "object":
+            self._object_depth += 1
+        if tag == "body":
+            self._body_started = True
+        if visible:
+            if kind == KEPT:
+                self._emit("start", element)
+            elif kind == UNWRAP:
+                self._flow(element.text)
+
+    def _classify(self, element, parent: Optional[_Frame]) -> str:
+        tag = element.tag
+        if element is self._first_header and self._prevent_duplicate_header:
+            return DROP
+        if tag in html_lxml.HEADER_TAGS:
+            return HEADER
+        if tag == "a" and self._remove_hyperlinks:
+            return LINK
+        if tag == "table" and self._seperate_tables:
+            return TABLE
+        if self._fix_check and parent is not None:
+            if tag == "span" and parent.spans:
+                parent.spans -= 1
+                return DROP
+            if tag == "input" and html_lxml.is_unchecked_input(element):
+                parent.spans += 1
+                return DROP
+        if tag in KILL_TAGS or (tag == "param" and not self._object_depth):
+            return HIDDEN
+        if tag in UNWRAP_TAGS:
+            return UNWRAP
+        return KEPT
+
+    def _end(self, element) -> None:
+        frame = self._stack.pop()
+        if element.tag in html_lxml.PRESERVE_WHITESPACE_TAGS:
+            self._preserve_depth -= 1
+        if not self._preserve_depth and self._stack:
+            element.tail = html_lxml.collapse_text(element.tail)
+        if element is self._first_header:
+            self._take_first_header(element)
+        if frame.kind == INNER:
+            if element is self._first_header and self._prevent_duplicate_header:
+                html_lxml.remove_element(element, self._fragmented)
+            return
+
+        if element.tag == "object":
+            self._object_depth -= 1
+        if element.tag == "title" and not self._title_seen and not self.title_final:
+            self._take_title(element)
+        visible = self._stack[-1].visible if self._stack else True
+        kind = frame.kind
+        if kind == LINK:
+            tail = element.tail
+            text = html_lxml.clean_hyperlink(element, self._fragmented)
+            if visible:
+                self._flow(text)
+                self._flow(tail)
+        elif kind == DROP:
+            tail = element.tail
+            html_lxml.remove_element(element, self._fragmented)
+            if visible:
+                self._flow(tail)
+        else:
+            if kind == HEADER:
+                html_lxml.clean_header(element, self._fragmented)
+                self._push_title(element)
+            elif kind == TABLE:
+                html_lxml.clean_tags(
+                    element, self._fragmented, self._remove_hyperlinks, self._fix_check
+                )
+            if frame.name_for:
+                self._name_tables(frame.name_for, element)
+
+            if kind == TABLE:
+                self._separate_table(element, visible)
+            elif visible and kind in (KEPT, HEADER):
+                if kind == HEADER:
+                    self._emit("start", element)
+                self._emit("end", element)
+            elif visible:
+                self._flow(element.tail)
+
+        # 没有后一个兄弟节点的表格
+        for entry in frame.tables:
+            entry[1] = True
+
+    def _misc(self, node) -> None:
+        """注释与处理指令"""
+        if not self._stack or node.getparent() is None:
+            return
+        if not self._preserve_depth:
+            node.tail = html_lxml.collapse_text(node.tail)
+        parent = self._stack[-1]
+        if not parent.preprocess:
+            return
+        self._prune(node, parent)
+        if parent.visible:
+            self._flow(node.tail)
+
+    def _take_title(self, element) -> None:
+        """与 htmls.get_title 一致，读取第一个 <title>"""
+        self._title_seen = True
+        if element.text and not self._header_title:
+            self.title = htmls.norm_title(element.text)
+
+    def _take_first_header(self, element) -> None:
+        self.title = html_lxml.get_text(element).strip()
+        self._header_title = True
+
+    def _push_title(self, element) -> None:
+        level = constants.TAG_HIERARCHY[element.tag]
+        while (
+            self._title_stack
+            and constants.TAG_HIERARCHY[self._title_stack[-1][0]] <= level
+        ):
+            self._title_stack.pop()
+        self._title_stack.append((element.tag, html_lxml.get_text(element, strip=True)))
+
+    def _separate_table(self, table, visible: bool) -> None:
+        prev_sibling = next(
+            (e for e in table.itersiblings(preceding=True) if html_lxml.is_element(e)),
+            None,
+        )
+        table_name = None
+        if prev_sibling is not None:
+            table_name = html_lxml.get_table_name(prev_sibling, self._fragmented)
+        table_md = html_lxml.convert_table_to_markdown(table)
+        table_extractor = html_lxml.LxmlTableExtractor(table)
+        table_extractor.parse()
+        tail = table.tail
+        self._table_parents.add(table.getparent())
+        html_lxml.remove_element(table, self._fragmented)
+        if visible:
+            self._flow(tail)
+
+        table_with_titles = {
+            "table": table_extractor.return_list(),
+            "table_md": table_md,
+            "titles": list(self._title_stack),
+        }
+        entry = [table_with_titles, False]
+        self._tables.append(entry)
+        if table_name:
+            table_with_titles["titles"].append(table_name)
+            entry[1] = True
+        else:
+            self._stack[-1].tables.append(entry)
+
+    def _name_tables(self, entries: list, element) -> None:
+        # 删除过表格的节点在全量解析中仍包含该表格，不是单个字符串
+        table_name = html_lxml.get_table_name(
+            element, self._fragmented | self._table_parents
+        )
+        for entry in entries:
+            if table_name:
+                entry[0]["titles"].append(table_name)
+            entry[1] = True
+
+    def _prune(self, node, parent: _Frame) -> None:
+        """删除已处理的兄弟节点，只保留前一个节点及前一个元素"""
+        previous = node.getprevious()
+        if previous is None:
+            return
+        has_element = html_lxml.is_element(previous)
+        sibling = previous.getprevious()
+        while sibling is not None:
+            current, sibling = sibling, sibling.getprevious()
+            if not has_element and html_lxml.is_element(current):
+                has_element = True
+                continue
+            for element in current.iter():
+                self._fragmented.discard(element)
+                self._table_parents.discard(element)
+            parent.element.remove(current)
+            # 父节点仍包含多个子节点，不再是单个字符串
+            self._fragmented.add(parent.element)
+
+    def _emit(self, event: str, element) -> None:
+        self._release()
+        if event == "start":
+            node = TextNode(element.tag, text=element.text)
+        else:
+            tail = element.tail if self._stack else None
+            node = TextNode(element.tag, tail=tail)
+        self._held = (event, node)
+
+    def _flow(self, text: Optional[str]) -> None:
+        if text and self._held is not None:
+            self._held_texts.append(text)
+
+    def _release(self) -> None:
+        if self._held is None:
+            return
+        event, node = self._held
+        if self._held_texts:
+            if event == "start":
+                node.text = (node.text or "") + "".join(self._held_texts)
+            else:
+                node.tail = (node.tail or "") + "".join(self._held_texts)
+            self._held_texts = []
+        self._output.append(self._held)
+        self._held = None
@@ -40,44 +40,43 @@ class HtmlTableExtractor(object):
         self._output = []
         row_ind = 0
         col_ind = 0
-        for row in self._table.find_all("tr"):
+        for row in self._rows():
             # record the smallest row_span, so that we know how many rows
             # we should skip
             smallest_row_span = 1
 
-            for cell in row.children:
-                if cell.name in ("td", "th"):
-                    # check multiple rows
-                    row_span = int(cell.get("rowspan")) if cell.get("rowspan") else 1
-
-                    # try updating smallest_row_span
-                    smallest_row_span = min(smallest_row_span, row_span)
-
-                    # check multiple columns
-                    col_span = int(cell.get("colspan")) if cell.get("colspan") else 1
-
-                    # find the right index
-                    while True:
-                        if self._check_cell_validity(row_ind, col_ind):
-                            break
-                        col_ind += 1
-
-                    # insert into self._output
-                    try:
-                        self._insert(
-                            row_ind,
-                            col_ind,
-                            row_span,
-                            col_span,
-                            self._transformer(cell.get_text()),
-                        )
-                    except UnicodeEncodeError:
-                        raise Exception(
-                            "Failed to decode text; you might want to specify kwargs transformer=unicode"
-                        )
-
-                    # update col_ind
-                    col_ind += col_span
+            for cell in self._cells(row):
+                # check multiple rows
+                row_span = int(cell.get("rowspan")) if cell.get("rowspan") else 1
+
+                # try updating smallest_row_span
+                smallest_row_span = min(smallest_row_span, row_span)
+
+                # check multiple columns
+                col_span = int(cell.get("colspan")) if cell.get("colspan") else 1
+
+                # find the right index
+                while True:
+                    if self._check_cell_validity(row_ind, col_ind):
+                        break
+                    col_ind += 1
+
+                # insert into self._output
+                try:
+                    self._insert(
+                        row_ind,
+                        col_ind,
+                        row_span,
+                        col_span,
+                        self._transformer(self._cell_text(cell)),
+                    )
+                except UnicodeEncodeError:
+                    raise Exception(
+                        "Failed to decode text; you might want to specify kwargs transformer=unicode"
+                    )
+
+                # update col_ind
+                col_ind += col_span
 
             # update row_ind
             # 进行合并操作
@@ -85,6 +84,15 @@ class HtmlTableExtractor(object):
             col_ind = 0
         return self
 
+    def _rows(self):
+        return self._table.find_all("tr")
+
+    def _cells(self, row):
+        return [cell for cell in row.children if cell.name in ("td", "th")]
+
+    def _cell_text(self, cell) -> str:
+        return cell.get_text()
+
     @staticmethod
     def merge_same_first_column(data: list[list[str]]) -> list[list[str]]:
         """Optimizes complex tables by merging cells with same first column value.
@@ -1,5 +1,4 @@
 # -*- coding: utf-8 -*-
-import copy
 import enum
 import re
 
@@ -107,10 +106,15 @@ _whitespace = re.compile(r"\s+")
 _has_trailing_whitespace = re.compile(r"\s$").search
 _has_punct_after = re.compile(r'^[,:;.!?")]').search
 _has_open_bracket_before = re.compile(r"\($").search
+_quote_pattern = re.compile(
+    r"^\[\s*(\d+|(\d+\s*[-～]\s*\d+))(?:[\s,，]\s*(\d+|(\d+\s*[-～]\s*\d+)))*\s*\]$"
+)
 
 
 def _normalize_whitespace(text):
-    return _whitespace.sub(" ", text.strip())
+    # same as _whitespace.sub(" ", text.strip()): str.split() splits on the
+    # characters matched by \s, without going through the regex engine
+    return " ".join(text.split())
 
 
 def etree_to_text(
@@ -131,143 +135,204 @@ def etree_to_text(
     approach and options.
     """
     chunks = []
-    split_chunks = []
     split_texts = []
     split_texts_hierarch_titles = []
-    current_hierarchy_titles = []
-    if title and title != constants.NO_TITLE:
-        current_hierarchy_titles.append((constants.TITLE_KEY, title))
-
-    _NEWLINE = object()
-    _DOUBLE_NEWLINE = object()
-    prev = _DOUBLE_NEWLINE  # _NEWLINE, _DOUBLE_NEWLINE or content of the previous chunk (str)
-
-    def check_sup_type(text, tag=None) -> SupType:
-        if not (tag and tag == "sup"):
-            return SupType.UNKNOWN
-
-        text = text.replace(" ", "")
-        QUOTE_PATTERN = r"^\[\s*(\d+|(\d+\s*[-～]\s*\d+))(?:[\s,，]\s*(\d+|(\d+\s*[-～]\s*\d+)))*\s*\]$"
-
-        if text.isdigit():
-            return SupType.NUMERAL
-        elif re.match(QUOTE_PATTERN, text):
-            return SupType.QUOTE
-
-        return SupType.UNKNOWN
-
-    def should_add_space(text, tag=None):
-        """Return True if extra whitespace should be added before text"""
-        if prev in {_NEWLINE, _DOUBLE_NEWLINE}:
-            return False
-        if not guess_punct_space:
-            return True
-        if not _has_trailing_whitespace(prev):
-            if (
-                _has_punct_after(text)
-                or _has_open_bracket_before(prev)
-                or check_sup_type(text, tag) == SupType.NUMERAL
-            ):
-                return False
-        return True
-
-    def get_space_between(text, tag=None):
-        if not text:
-            return " "
-        return " " if should_add_space(text, tag) else ""
-
-    def add_newlines(tag):
-        nonlocal prev
-        if not guess_layout:
-            return
-        if prev is _DOUBLE_NEWLINE:  # don't output more than 1 blank line
-            return
-        if tag in double_newline_tags:
-            chunks.append("\n" if prev is _NEWLINE else "\n\n")
-            split_chunks.append("\n" if prev is _NEWLINE else "\n\n")
-            prev = _DOUBLE_NEWLINE
-        elif tag in newline_tags:
-            if prev is not _NEWLINE:
-                chunks.append("\n")
-                split_chunks.append("\n")
-            prev = _NEWLINE
-
-    def add_text(text_content, tag=None):
-        nonlocal prev
-        text = _normalize_whitespace(text_content) if text_content else ""
-        if not text:
-            return
+    for split_text, hierarchy_titles in _etree_to_sections(
+        tree,
+        chunks,
+        guess_punct_space=guess_punct_space,
+        guess_layout=guess_layout,
+        newline_tags=newline_tags,
+        double_newline_tags=double_newline_tags,
+        split_tags=split_tags,
+        title=title,
+    ):
+        split_texts.append(split_text)
+        split_texts_hierarch_titles.append(list(hierarchy_titles))
 
-        space = get_space_between(text, tag)
+    return "".join(chunks).strip(), split_texts, split_texts_hierarch_titles
 
-        sup_type = check_sup_type(text, tag)
-        if sup_type == SupType.QUOTE:
-            return
-        elif sup_type == SupType.NUMERAL:
-            text = f"^{text}"
 
-        chunks.extend([space, text])
-        # ignore header title
-        if not (tag and tag in split_tags):
-            split_chunks.extend([space, text])
+def iter_etree_sections(
+    tree,
+    guess_punct_space=True,
+    guess_layout=True,
+    newline_tags=NEWLINE_TAGS,
+    double_newline_tags=DOUBLE_NEWLINE_TAGS,
+    split_tags=constants.SPLIT_TAGS,
+    title=None,
+):
+    """
+    Generator variant of etree_to_text: yields (section_text, hierarchy_titles)
+    as soon as the next split tag is reached, without building the whole text.
+    hierarchy_titles is an immutable tuple of (tag, title) pairs.
+    """
+    return _etree_to_sections(
+        tree,
+        None,
+        guess_punct_space=guess_punct_space,
+        guess_layout=guess_layout,
+        newline_tags=newline_tags,
+        double_newline_tags=double_newline_tags,
+        split_tags=split_tags,
+        title=title,
+    )
 
-        prev = text_content
 
-    def compare_html_tags(tag1, tag2):
-        level1 = constants.TAG_HIERARCHY.get(tag1.lower(), 0)
-        level2 = constants.TAG_HIERARCHY.get(tag2.lower(), 0)
+def iter_event_sections(
+    events,
+    guess_punct_space=True,
+    guess_layout=True,
+    newline_tags=NEWLINE_TAGS,
+    double_newline_tags=DOUBLE_NEWLINE_TAGS,
+    split_tags=constants.SPLIT_TAGS,
+    title=None,
+):
+    """
+    Same as iter_etree_sections, but reads ("start", node) / ("end", node)
+    pairs in lxml.etree.iterwalk order from ``events`` instead of walking a
+    tree. Nodes only need ``tag``, ``text`` (read on start) and ``tail``
+    (read on end), see ``html_stream.HtmlStream``.
+    """
+    return _etree_to_sections(
+        None,
+        None,
+        guess_punct_space=guess_punct_space,
+        guess_layout=guess_layout,
+        newline_tags=newline_tags,
+        double_newline_tags=double_newline_tags,
+        split_tags=split_tags,
+        title=title,
+        events=events,
+    )
 
-        if level1 > level2:
-            return 1
-        elif level1 < level2:
-            return -1
-        else:
-            return 0
 
-    def update_current_hierarchy_titles(tag=None, text=None):
-        nonlocal current_hierarchy_titles
+def _check_sup_type(text) -> SupType:
+    """Type of the normalized text of a <sup> tag"""
+    text = text.replace(" ", "")
+    if text.isdigit():
+        return SupType.NUMERAL
+    elif _quote_pattern.match(text):
+        return SupType.QUOTE
+    return SupType.UNKNOWN
 
-        if (not tag) or (not text) or (tag not in split_tags):
-            return
 
-        while (
-            current_hierarchy_titles
-            and compare_html_tags(current_hierarchy_titles[-1][0], tag) <= 0
-        ):
-            current_hierarchy_titles.pop()
+def _etree_to_sections(
+    tree,
+    chunks,
+    guess_punct_space=True,
+    guess_layout=True,
+    newline_tags=NEWLINE_TAGS,
+    double_newline_tags=DOUBLE_NEWLINE_TAGS,
+    split_tags=constants.SPLIT_TAGS,
+    title=None,
+    events=None,
+):
+    """
+    Yields (section_text, hierarchy_titles) per split tag. The text of the whole
+    tree is collected into ``chunks`` unless it is None. ``events`` replaces the
+    walk over ``tree`` when given.
 
-        normalized_text = _normalize_whitespace(text)
-        current_hierarchy_titles.append((tag.strip(), normalized_text.strip()))
+    This loop runs for every element, so the helpers are inlined and the
+    state is kept in local variables.
+    """
+    split_tags = frozenset(split_tags)
+    tag_levels = constants.TAG_HIERARCHY
+    collect_text = chunks is not None
+    split_chunks = []
+    # split_chunks contains text besides newlines and spaces
+    has_split_text = False
+    # titles are immutable tuples shared by the yielded sections
+    hierarchy_titles = ()
+    if title and title != constants.NO_TITLE:
+        hierarchy_titles = ((constants.TITLE_KEY, title),)
 
-    def check_add_add_split_texts(tag=None, text=None):
-        nonlocal split_texts
-        nonlocal split_chunks
+    _NEWLINE = object()
+    _DOUBLE_NEWLINE = object()
+    prev = _DOUBLE_NEWLINE  # _NEWLINE, _DOUBLE_NEWLINE or content of the previous chunk (str)
 
-        if tag and (tag not in split_tags):
-            return
+    if events is None:
+        events = lxml.etree.iterwalk(tree, events=("start", "end"))
 
-        prev_text = "".join(split_chunks).strip()
-        if prev_text:
-            split_texts.append(prev_text)
-            split_texts_hierarch_titles.append(copy.deepcopy(current_hierarchy_titles))
+    # Extract text from the ``tree``: yield a section at every split tag
+    for event, el in events:
+        tag = el.tag
+        if event == "start":
+            text_content = el.text
+            if tag in split_tags:
+                if has_split_text:
+                    yield "".join(split_chunks).strip(), hierarchy_titles
+                split_chunks.clear()
+                has_split_text = False
+
+                if text_content:
+                    level = tag_levels.get(tag.lower(), 0)
+                    while (
+                        hierarchy_titles
+                        and tag_levels.get(hierarchy_titles[-1][0].lower(), 0) <= level
+                    ):
+                        hierarchy_titles = hierarchy_titles[:-1]
+                    hierarchy_titles += (
+                        (tag.strip(), _normalize_whitespace(text_content)),
+                    )
+        else:
+            text_content = el.tail if el is not tree else None
+
+        if guess_layout and prev is not _DOUBLE_NEWLINE:
+            # don't output more than 1 blank line
+            if tag in double_newline_tags:
+                newline = "\n" if prev is _NEWLINE else "\n\n"
+                if collect_text:
+                    chunks.append(newline)
+                split_chunks.append(newline)
+                prev = _DOUBLE_NEWLINE
+            elif tag in newline_tags:
+                if prev is not _NEWLINE:
+                    if collect_text:
+                        chunks.append("\n")
+                    split_chunks.append("\n")
+                prev = _NEWLINE
+
+        if not text_content:
+            continue
+        text = _normalize_whitespace(text_content)
+        if not text:
+            continue
+
+        sup_type = _check_sup_type(text) if tag == "sup" else SupType.UNKNOWN
+        if sup_type is SupType.QUOTE:
+            continue
+
+        # whether extra whitespace should be added before text
+        if prev is _NEWLINE or prev is _DOUBLE_NEWLINE:
+            space = ""
+        elif not guess_punct_space or _has_trailing_whitespace(prev):
+            space = " "
+        elif (
+            _has_punct_after(text)
+            or _has_open_bracket_before(prev)
+            or sup_type is SupType.NUMERAL
+        ):
+            space = ""
+        else:
+            space = " "
 
-        update_current_hierarchy_titles(tag, text)
-        split_chunks = []
+        if sup_type is SupType.NUMERAL:
+            text = f"^{text}"
 
-    # Extract text from the ``tree``: fill ``chunks`` variable
-    for event, el in lxml.etree.iterwalk(tree, events=("start", "end")):
-        if event == "start":
-            check_add_add_split_texts(el.tag, el.text)
-            add_newlines(el.tag)
-            add_text(el.text, el.tag)
-        elif event == "end":
-            add_newlines(el.tag)
-            if el is not tree:
-                add_text(el.tail, el.tag)
+        if collect_text:
+            chunks.append(space)
+            chunks.append(text)
+        # ignore header title
+        if tag not in split_tags:
+            split_chunks.append(space)
+            split_chunks.append(text)
+            has_split_text = True
 
-    check_add_add_split_texts()
+        prev = text_content
 
-    return "".join(chunks).strip(), split_texts, split_texts_hierarch_titles
+    if has_split_text:
+        yield "".join(split_chunks).strip(), hierarchy_titles
 
 
 def selector_to_text(sel, guess_punct_space=True, guess_layout=True):
@@ -360,3 +425,33 @@ def extract_text(
         split_tags=split_tags,
         title=title,
     )
+
+
+def iter_text(
+    html,
+    guess_punct_space=True,
+    guess_layout=True,
+    newline_tags=NEWLINE_TAGS,
+    double_newline_tags=DOUBLE_NEWLINE_TAGS,
+    split_tags=constants.SPLIT_TAGS,
+    title=None,
+):
+    """
+    Same as extract_text, but lazily yields (section_text, hierarchy_titles)
+    per split tag, see ``html_text.iter_etree_sections``.
+    """
+    if html is None:
+        return
+    no_content_nodes = (lxml.html.HtmlComment, lxml.html.HtmlProcessingInstruction)
+    if isinstance(html, no_content_nodes):
+        return
+    cleaned = _cleaned_html_tree(html)
+    yield from iter_etree_sections(
+        cleaned,
+        guess_punct_space=guess_punct_space,
+        guess_layout=guess_layout,
+        newline_tags=newline_tags,
+        double_newline_tags=double_newline_tags,
+        split_tags=split_tags,
+        title=title,
+    )
@@ -1,9 +1,11 @@
 #!/usr/bin/env python
 from __future__ import print_function
 
+import copy
 import logging
 import re
 import sys
+from functools import lru_cache
 
 from lxml.etree import _ElementTree, tounicode
 from lxml.html import HtmlElement, document_fromstring, fragment_fromstring
@@ -42,6 +44,9 @@ REGEXES = {
 }
 
 
+PUNCTUATION_RE = re.compile(r"[,.，。；;：:！!？?、]")
+
+
 class Unparseable(ValueError):
     pass
 
@@ -69,6 +74,157 @@ def text_length(i):
     return len(clean(i.text_content() or ""))
 
 
+# clean() turns any whitespace run of this length into a single space
+MAX_WHITESPACE_RUN = 255
+
+
+def _cap_run(run):
+    return run if len(run) < MAX_WHITESPACE_RUN else " " * MAX_WHITESPACE_RUN
+
+
+@lru_cache(maxsize=1024)
+def _run_length(run):
+    # length of a whitespace run between two words once clean() is applied
+    return len(clean("x" + run + "x")) - 2
+
+
+def _text_piece(text):
+    """
+    Summary of a text used to compute len(clean(text)) of concatenations:
+    (leading whitespace, cleaned length of the rest, trailing whitespace,
+    blank). clean() only rewrites whitespace runs, so the cleaned length of
+    a concatenation only depends on the runs where the pieces meet.
+    """
+    core = text.strip()
+    if not core:
+        return (_cap_run(text), 0, "", True)
+    lead = text[: len(text) - len(text.lstrip())]
+    trail = text[len(text.rstrip()) :]
+    return (_cap_run(lead), len(clean(core)), _cap_run(trail), False)
+
+
+def _join_pieces(left, right):
+    l_lead, l_length, l_trail, l_blank = left
+    r_lead, r_length, r_trail, r_blank = right
+    if r_blank:
+        if l_blank:
+            return (_cap_run(l_lead + r_lead), 0, "", True)
+        return (l_lead, l_length, _cap_run(l_trail + r_lead), False)
+    if l_blank:
+        return (_cap_run(l_lead + r_lead), r_length, r_trail, False)
+    run_length = _run_length(_cap_run(l_trail + r_lead))
+    return (l_lead, l_length + run_length + r_length, r_trail, False)
+
+
+@lru_cache(maxsize=None)
+def _nesting(parent_tag, child_tag):
+    """
+    How the html parser handles a <child_tag> start tag directly inside
+    <parent_tag>: "nested" when the child stays there, "closed" when it ends
+    the parent implicitly (e.g. <p><h1>) and follows it, "other" otherwise.
+    The parser is asked once per tag pair, so the rules always match libxml2.
+    """
+    probe = fragment_fromstring(
+        "<div><{0}><{1}></{1}></{0}></div>".format(parent_tag, child_tag)
+    )
+    parent = probe.find(parent_tag)
+    # <html>, <head> and <body> are only kept at the top of the document
+    if parent is None or len(parent):
+        return "nested"
+    if [child.tag for child in probe] == [parent_tag, child_tag]:
+        return "closed"
+    return "other"
+
+
+@lru_cache(maxsize=None)
+def _keeps_empty(tag):
+    """
+    Whether an empty <tag> element stays empty once serialized and parsed:
+    libxml2 writes an empty <li> without its end tag, so the text after it
+    ends up inside it.
+    """
+    probe = fragment_fromstring("<div></div>")
+    child = probe.makeelement(tag)
+    child.tail = "x"
+    probe.append(child)
+    parsed = fragment_fromstring(tounicode(probe, method="html"))
+    return len(parsed) > 0 and parsed[0].tag == tag and not parsed[0].text
+
+
+def _first_misnested(elem):
+    return next(
+        (
+            index
+            for index, child in enumerate(elem)
+            if isinstance(child.tag, str) and _nesting(elem.tag, child.tag) != "nested"
+        ),
+        None,
+    )
+
+
+def fix_nesting(root):
+    """
+    Restore the structure the html parser builds from the serialized tree:
+    readability rewrites <div>s into <p>s that may hold block children
+    (e.g. <h1>), which the parser moves out of the paragraph together with
+    the content after them.
+
+    Returns False and leaves the tree untouched when the parser would do more
+    than that, e.g. the misplaced </p> also closes an enclosing <p>, or an
+    empty element loses its end tag; the caller then parses the serialized
+    tree instead.
+    """
+    splits = []
+    for elem in root.iter():
+        if not isinstance(elem.tag, str):
+            continue
+        if len(elem) == 0 and not elem.text and not _keeps_empty(elem.tag):
+            return False
+        index = _first_misnested(elem)
+        if index is not None:
+            splits.append((elem, index))
+    misnested = {elem for elem, _ in splits}
+    for elem, index in splits:
+        if elem is root or _nesting(elem.tag, elem[index].tag) != "closed":
+            return False
+        if any(a.tag == elem.tag or a in misnested for a in elem.iterancestors()):
+            return False
+        parent = elem.getparent()
+        if any(
+            isinstance(child.tag, str) and _nesting(parent.tag, child.tag) != "nested"
+            for child in elem[index:]
+        ):
+            return False
+
+    for elem, index in splits:
+        parent = elem.getparent()
+        moved = elem[index:]
+        position = parent.index(elem) + 1
+        tail, elem.tail = elem.tail, None
+        parent[position:position] = moved
+        if tail:
+            moved[-1].tail = (moved[-1].tail or "") + tail
+    return True
+
+
+class NodeStats:
+    """Text statistics of an element's text_content(), excluding its tail."""
+
+    __slots__ = ("text", "punctuation", "commas", "link_length", "class_weight")
+
+    def __init__(self, text, punctuation, commas, link_length, class_weight):
+        self.text = text
+        self.punctuation = punctuation
+        self.commas = commas
+        self.link_length = link_length
+        self.class_weight = class_weight
+
+    @property
+    def text_length(self):
+        # same as text_length(elem): length of the cleaned text content
+        return self.text[1]
+
+
 def compile_pattern(elements):
     if not elements:
         return None
@@ -129,6 +285,12 @@ class Document:
         """
         self.input = input
         self.html = None
+        # element -> NodeStats, filled by a post-order pass over the tree and
+        # invalidated for the ancestors of every element changed afterwards
+        self._node_stats = {}
+        # text -> (piece, punctuation, commas) of a text or tail, only depends
+        # on the text so it is kept across the retry on the snapshot tree
+        self._text_stats = {}
         self.encoding = None
         self.positive_keywords = compile_pattern(positive_keywords)
         self.negative_keywords = compile_pattern(negative_keywords)
@@ -210,10 +372,36 @@ class Document:
         Warning: It mutates internal DOM representation of the HTML document,
         so it is better to call other API methods before this one.
         """
+        self._summary_tree(html_partial=html_partial)
+        return self.get_clean_html()
+
+    def summary_tree(self, html_partial=False):
+        """
+        Same as summary(), but returns the sanitized article element instead
+        of serialized html, so callers working on lxml trees can skip the
+        serialize / re-parse round trip. The tree has the structure the html
+        parser gives for summary(); when it can't be fixed in place, the
+        parsed summary() document is returned instead.
+        """
+        article = self._summary_tree(html_partial=html_partial)
+        # the article may hold the whole document, whose <html>, <head> and
+        # <body> tags the parser ignores there
+        for elem in list(article.iter("html", "head", "body")):
+            if elem is not article:
+                elem.drop_tag()
+        if not fix_nesting(article):
+            return document_fromstring(self.get_clean_html())
+        return article
+
+    def _summary_tree(self, html_partial=False):
         try:
             ruthless = True
+            # parse and clean the input once; the ruthless pass works on a copy
+            # so that the retry can start from the untouched snapshot
+            snapshot = self._html(True)
             while True:
-                self._html(True)
+                self.html = copy.deepcopy(snapshot) if ruthless else snapshot
+                self._node_stats = {}
                 for i in self.tags(self.html, "script", "style"):
                     i.drop_tree()
                 for i in self.tags(self.html, "body"):
@@ -248,17 +436,14 @@ class Document:
                         article = self.html.find("body")
                         if article is None:
                             article = self.html
-                cleaned_article = self.sanitize(article, candidates)
+                self.sanitize_tree(article, candidates)
 
-                article_length = len(cleaned_article or "")
-                retry_length = self.retry_length
-                of_acceptable_length = article_length >= retry_length
-                if ruthless and not of_acceptable_length:
+                if ruthless and not self.is_acceptable_length():
                     ruthless = False
                     # Loop through and try again.
                     continue
                 else:
-                    return cleaned_article
+                    return self.html
         except Exception as e:
             log.exception("error getting summary: ")
             if sys.version_info[0] == 2:
@@ -267,6 +452,13 @@ class Document:
                 from .compat.three import raise_with_traceback
             raise_with_traceback(Unparseable, sys.exc_info()[2], str_(e))
 
+    def is_acceptable_length(self):
+        # the text content is a lower bound of the cleaned html length, so the
+        # article only has to be serialized when its text alone is too short
+        if len(self.html.text_content()) >= self.retry_length:
+            return True
+        return len(self.get_clean_html()) >= self.retry_length
+
     def get_article(self, candidates, best_candidate, html_partial=False):
         # Now that we have the top candidate, look through its siblings for
         # content that might also be related.
@@ -321,6 +513,8 @@ class Document:
                     append = True
 
             if append:
+                if sibling.getparent() is not None:
+                    self.invalidate_stats(sibling.getparent())
                 # We don't want to append directly to output, but the div
                 # in html->body->div
                 if html_partial:
@@ -346,13 +540,10 @@ class Document:
         return best_candidate
 
     def get_link_density(self, elem):
-        link_length = 0
-        for i in elem.findall(".//a"):
-            link_length += text_length(i)
+        stats = self.node_stats(elem)
         # if len(elem.findall(".//div") or elem.findall(".//p")):
         #    link_length = link_length
-        total_length = text_length(elem)
-        return float(link_length) / max(total_length, 1)
+        return float(stats.link_length) / max(stats.text_length, 1)
 
     def score_paragraphs(self):
         MIN_LEN = self.min_text_length
@@ -361,6 +552,8 @@ class Document:
 
         content_tags = ["p", "pre", "td"]
 
+        # compute the text statistics of the whole tree in one pass
+        self.node_stats(self._html())
         for elem in self.tags(self._html(), *content_tags):
             # 获取所有父节点
             parent_nodes = []
@@ -370,15 +563,11 @@ class Document:
                 current = current.getparent()
 
             # 处理当前元素
-            inner_text = clean(elem.text_content() or "")
-            inner_text_len = len(inner_text)
+            inner_text_len, content_score = self.score_paragraph(elem)
 
             if inner_text_len < MIN_LEN:
                 continue
 
-            content_score = len(re.compile(r"[,.，。；;：:！!？?、]").split(inner_text))
-            content_score += min((inner_text_len / 100), 3)
-
             # 为每个父节点计算分数
             for i, parent in enumerate(parent_nodes):
                 if parent not in candidates:
@@ -394,14 +583,90 @@ class Document:
             candidate = candidates[elem]
             ld = self.get_link_density(elem)
             score = candidate["content_score"]
-            log.debug(
-                "Branch %6.3f %s link density %.3f -> %6.3f"
-                % (score, describe(elem), ld, score * (1 - ld))
-            )
+            if log.isEnabledFor(logging.DEBUG):
+                log.debug(
+                    "Branch %6.3f %s link density %.3f -> %6.3f"
+                    % (score, describe(elem), ld, score * (1 - ld))
+                )
             candidate["content_score"] *= 1 - ld
 
         return candidates
 
+    def node_stats(self, elem):
+        """
+        Returns the NodeStats of elem, computing the missing ones of its
+        subtree in a single post-order pass.
+        """
+        stats = self._node_stats.get(elem)
+        if stats is not None:
+            return stats
+
+        stack = [(elem, False)]
+        while stack:
+            node, children_done = stack.pop()
+            if not children_done:
+                stack.append((node, True))
+                stack.extend(
+                    (child, False)
+                    for child in node
+                    if isinstance(child.tag, str) and child not in self._node_stats
+                )
+                continue
+
+            piece, punctuation, commas = self.text_stats(node.text or "")
+            link_length = 0
+            for child in node:
+                # comments and processing instructions only contribute their tail
+                if isinstance(child.tag, str):
+                    child_stats = self._node_stats[child]
+                    piece = _join_pieces(piece, child_stats.text)
+                    punctuation += child_stats.punctuation
+                    commas += child_stats.commas
+                    link_length += child_stats.link_length
+                    if child.tag == "a":
+                        link_length += child_stats.text_length
+                if child.tail:
+                    tail_piece, tail_punctuation, tail_commas = self.text_stats(child.tail)
+                    piece = _join_pieces(piece, tail_piece)
+                    punctuation += tail_punctuation
+                    commas += tail_commas
+            self._node_stats[node] = NodeStats(
+                piece, punctuation, commas, link_length, self.class_weight(node)
+            )
+        return self._node_stats[elem]
+
+    def text_stats(self, text):
+        """Returns the text piece, punctuation and comma counts of a text or tail."""
+        stats = self._text_stats.get(text)
+        if stats is None:
+            stats = self._text_stats[text] = (
+                _text_piece(text),
+                len(PUNCTUATION_RE.findall(text)),
+                text.count(","),
+            )
+        return stats
+
+    def invalidate_stats(self, elem):
+        """The text of elem changed: drop the stats of elem and its ancestors."""
+        self._node_stats.pop(elem, None)
+        for ancestor in elem.iterancestors():
+            self._node_stats.pop(ancestor, None)
+
+    def drop_tree(self, elem):
+        parent = elem.getparent()
+        if parent is not None:
+            self.invalidate_stats(parent)
+        elem.drop_tree()
+
+    def text_length(self, elem):
+        return self.node_stats(elem).text_length
+
+    def score_paragraph(self, elem):
+        stats = self.node_stats(elem)
+        content_score = stats.punctuation + 1
+        content_score += min((stats.text_length / 100), 3)
+        return stats.text_length, content_score
+
     def class_weight(self, e):
         weight = 0
         for feature in [e.get("class", None), e.get("id", None)]:
@@ -427,7 +692,7 @@ class Document:
         return weight
 
     def score_node(self, elem):
-        content_score = self.class_weight(elem)
+        content_score = self.node_stats(elem).class_weight
         name = elem.tag.lower()
         if name in ["div", "article"]:
             content_score += 5
@@ -508,19 +773,27 @@ class Document:
                 yield e
 
     def sanitize(self, node, candidates):
+        self.sanitize_tree(node, candidates)
+        return self.get_clean_html()
+
+    def sanitize_tree(self, node, candidates):
         MIN_LEN = self.min_text_length
         for header in self.tags(node, "h1", "h2", "h3", "h4", "h5", "h6"):
-            if self.class_weight(header) < 0 or self.get_link_density(header) > 0.33:
-                header.drop_tree()
+            if (
+                self.node_stats(header).class_weight < 0
+                or self.get_link_density(header) > 0.33
+            ):
+                self.drop_tree(header)
 
         for elem in self.tags(node, "form", "textarea"):
-            elem.drop_tree()
+            self.drop_tree(elem)
 
         for elem in self.tags(node, "iframe"):
             if "src" in elem.attrib and REGEXES["videoRe"].search(elem.attrib["src"]):
                 elem.text = "VIDEO"  # ADD content to iframe text node to force <iframe></iframe> proper output
+                self.invalidate_stats(elem)
             else:
-                elem.drop_tree()
+                self.drop_tree(elem)
 
         allowed = {}
         # Conditionally clean <table>s, <ul>s, and <div>s
@@ -529,7 +802,7 @@ class Document:
         ):
             if el in allowed:
                 continue
-            weight = self.class_weight(el)
+            weight = self.node_stats(el).class_weight
             if el in candidates:
                 content_score = candidates[el]["content_score"]
                 # print '!',el, '-> %6.3f' % content_score
@@ -546,8 +819,8 @@ class Document:
                         weight,
                     )
                 )
-                el.drop_tree()
-            elif el.text_content().count(",") < 10:
+                self.drop_tree(el)
+            elif self.node_stats(el).commas < 10:
                 counts = {}
                 for kind in ["p", "img", "li", "a", "embed", "input"]:
                     counts[kind] = len(el.findall(".//%s" % kind))
@@ -555,7 +828,7 @@ class Document:
                 counts["input"] -= len(el.findall('.//input[@type="hidden"]'))
 
                 # Count the text length excluding any surrounding whitespace
-                content_length = text_length(el)
+                content_length = self.text_length(el)
                 link_density = self.get_link_density(el)
                 parent_node = el.getparent()
                 if parent_node is not None:
@@ -642,7 +915,7 @@ class Document:
                     siblings = []
                     for sib in el.itersiblings():
                         # log.debug(sib.text_content())
-                        sib_content_length = text_length(sib)
+                        sib_content_length = self.text_length(sib)
                         if sib_content_length:
                             i = +1
                             siblings.append(sib_content_length)
@@ -650,7 +923,7 @@ class Document:
                                 break
                     for sib in el.itersiblings(preceding=True):
                         # log.debug(sib.text_content())
-                        sib_content_length = text_length(sib)
+                        sib_content_length = self.text_length(sib)
                         if sib_content_length:
                             j = +1
                             siblings.append(sib_content_length)
@@ -670,15 +943,15 @@ class Document:
                     )
                     # print tounicode(el)
                     # log.debug("pname %s pweight %.3f" %(pname, pweight))
-                    el.drop_tree()
-                else:
+                    self.drop_tree(el)
+                elif log.isEnabledFor(logging.DEBUG):
                     log.debug(
                         "Not removing %s of length %s: %s"
                         % (describe(el), content_length, text_content(el))
                     )
 
         self.html = node
-        return self.get_clean_html()
+        return node
 
 
 def main():
@@ -1,11 +1,21 @@
 import os
 from pathlib import Path
-from typing import Optional
+from typing import Iterator, Optional, Union
+
+import lxml.html
 
 from dify_rag.extractor import utils
 from dify_rag.extractor.emr_extractor import EMRExtractorFactory
 from dify_rag.extractor.extractor_base import BaseExtractor
-from dify_rag.extractor.html import constants, html_helper, html_text, readability
+from dify_rag.extractor.html import (
+    constants,
+    html_helper,
+    html_lxml,
+    html_stream,
+    html_text,
+    readability,
+)
+from dify_rag.extractor.html.readability import htmls
 from dify_rag.models.document import Document
 
 
@@ -24,6 +34,11 @@ class HtmlExtractor(BaseExtractor):
         split_tags: list[str] = constants.SPLIT_TAGS,
         prevent_duplicate_header: bool = True,
         use_summary: bool = True,
+        # 使用 lxml 预处理，嵌套规范的 html 与 BeautifulSoup 版本结果一致，解析树可在各阶段共用
+        use_lxml: bool = False,
+        # 增量解析，边读取边输出，内存占用与文件大小无关
+        # 不生成 summary（忽略 use_summary），EMR 识别需要完整解析文件，也不再进行
+        incremental: bool = False,
         # dify 本地文件名为 id，可以通过 file_name 传递真实文件名
         file_name: Optional[str] = None,
     ) -> None:
@@ -41,13 +56,23 @@ class HtmlExtractor(BaseExtractor):
         self._split_tags = split_tags
         self._prevent_duplicate_header = prevent_duplicate_header
         self._use_summary = use_summary
+        self._use_lxml = use_lxml
+        self._incremental = incremental
         self._file_name = file_name
 
-    def get_title(self, text_content: str) -> str:
-        title = readability.Document(text_content).title()
+    def get_title(self, text_content: Union[str, lxml.html.HtmlElement]) -> str:
+        # <title> 内容按原始文本解析，不受 readability 清洗影响，直接读取解析树即可
+        if isinstance(text_content, lxml.html.HtmlElement):
+            doc = text_content
+        else:
+            doc, _ = htmls.build_doc(text_content)
+        title = htmls.get_title(doc)
         if title != constants.NO_TITLE:
             return title
 
+        return self.get_default_title()
+
+    def get_default_title(self) -> str:
         # get title from file_path
         if self._file_name:
             title = os.path.basename(self._file_name).split(".")[0]
@@ -56,13 +81,26 @@ class HtmlExtractor(BaseExtractor):
         return constants.NO_TITLE
 
     def extract(self) -> list[Document]:
+        return list(self.lazy_extract())
+
+    def lazy_extract(self) -> Iterator[Document]:
+        """
+        流式解析，正文每到达一个分段标签即返回上一段的 Document，最后返回表格
+        不再保存全文及全部分段，长页面内存占用更低，首个分段返回更快
+        """
+        if self._incremental:
+            yield from self._incremental_extract()
+            return
+
         # check if the file is an EMR file
         if self._file_path:
             extractor = EMRExtractorFactory.get_extractor(self._file_path)
             if extractor:
-                return extractor.extract()
+                yield from extractor.extract()
+                return
 
-            # if not EMR file, then extract as html file
+        # if not EMR file, then extract as html file
+        if self._file_path:
             text_content = Path(self._file_path).read_text(
                 encoding=utils.get_encoding(self._file_path)
             )
@@ -70,51 +108,121 @@ class HtmlExtractor(BaseExtractor):
             text_content = self._file
 
         # preprocess
-        text, tables, title = html_helper.preprocessing(
-            text_content,
-            self.get_title(text_content),
+        if self._use_lxml:
+            # 原始 html 只解析一次，标题、预处理、summary 与正文提取共用解析树
+            tree, tables = None, []
+            if text_content:
+                tree = html_text.parse_html(text_content)
+                tables, title = html_lxml.preprocessing(
+                    tree,
+                    self.get_title(tree),
+                    self._use_first_header_as_title,
+                    self._remove_hyperlinks,
+                    self._fix_check,
+                    self._seperate_tables,
+                    self._prevent_duplicate_header,
+                )
+        else:
+            text, tables, title = html_helper.preprocessing(
+                text_content,
+                self.get_title(text_content),
+                self._use_first_header_as_title,
+                self._remove_hyperlinks,
+                self._fix_check,
+                self._seperate_tables,
+                self._prevent_duplicate_header,
+            )
+            # 预处理后的 html 只解析一次，summary 与正文提取之间直接传递解析树
+            tree = html_text.parse_html(text) if text else None
+
+        if tree is not None:
+            if self._use_summary:
+                # 直接使用 summary 的解析树，仅在 readability 改写后的节点不符合 html 嵌套规则
+                # （如 p 中包含 h1）时按序列化结果重新解析
+                tree = readability.Document(tree).summary_tree(html_partial=True)
+            for content, hierarchy_titles in html_text.iter_text(
+                tree,
+                title=title,
+                split_tags=self._split_tags,
+            ):
+                yield self._text_document(content, hierarchy_titles)
+
+        for table in tables:
+            yield from self._table_documents(table)
+
+    def _iter_chunks(self) -> Iterator[str]:
+        if self._file_path:
+            with open(
+                self._file_path, encoding=utils.get_encoding(self._file_path)
+            ) as f:
+                while chunk := f.read(html_stream.CHUNK_SIZE):
+                    yield chunk
+        else:
+            for i in range(0, len(self._file), html_stream.CHUNK_SIZE):
+                yield self._file[i : i + html_stream.CHUNK_SIZE]
+
+    def _incremental_extract(self) -> Iterator[Document]:
+        """
+        增量解析：正文分段与表格按文档顺序交替返回
+        标题确定前（<title> 或 body 出现，use_first_header_as_title 时为首个 h1/h2）暂存已生成的 Document
+        """
+        stream = html_stream.HtmlStream(
+            self._iter_chunks(),
+            self.get_default_title(),
             self._use_first_header_as_title,
             self._remove_hyperlinks,
             self._fix_check,
             self._seperate_tables,
             self._prevent_duplicate_header,
         )
+        # 标题确定前按 (是否表格, 内容, 标题) 暂存
+        pending = []
 
-        docs = []
-        if text:
-            if self._use_summary:
-                html_doc = readability.Document(text)
-                text = html_doc.summary(html_partial=True)
-            content, split_contents, titles = html_text.extract_text(
-                text,
-                title=title,
-                split_tags=self._split_tags,
-            )
-            for content, hierarchy_titles in zip(split_contents, titles):
-                docs.append(
-                    Document(
-                        page_content=html_helper.trans_titles_and_content(
-                            content,
-                            hierarchy_titles,
-                            self._contain_closest_title_levels,
-                            self._title_convert_to_markdown,
-                        ),
-                        metadata={
-                            "titles": html_helper.trans_meta_titles(
-                                hierarchy_titles, self._title_convert_to_markdown
-                            ),
-                        },
-                    )
-                )
+        def with_title(hierarchy_titles):
+            if stream.title and stream.title != constants.NO_TITLE:
+                return [(constants.TITLE_KEY, stream.title), *hierarchy_titles]
+            return list(hierarchy_titles)
 
-        for table in tables:
-            if self._cut_table_to_line:
-                for doc in html_helper.html_cut_table_handler(table):
-                    docs.append(doc)
-            else:
-                docs.append(
-                    html_helper.html_origin_table_handler(
-                        table, self._title_convert_to_markdown
+        def flush():
+            for is_table, content, titles in pending:
+                if is_table:
+                    yield from self._table_documents(
+                        {**content, "titles": with_title(titles)}
                     )
-                )
-        return docs
+                else:
+                    yield self._text_document(content, with_title(titles))
+            pending.clear()
+
+        sections = html_text.iter_event_sections(
+            stream.events(), split_tags=self._split_tags
+        )
+        for content, hierarchy_titles in sections:
+            pending.append((False, content, hierarchy_titles))
+            pending.extend((True, table, table["titles"]) for table in stream.pop_tables())
+            if stream.title_final:
+                yield from flush()
+        pending.extend((True, table, table["titles"]) for table in stream.pop_tables())
+        yield from flush()
+
+    def _text_document(self, content: str, hierarchy_titles) -> Document:
+        return Document(
+            page_content=html_helper.trans_titles_and_content(
+                content,
+                hierarchy_titles,
+                self._contain_closest_title_levels,
+                self._title_convert_to_markdown,
+            ),
+            metadata={
+                "titles": html_helper.trans_meta_titles(
+                    hierarchy_titles, self._title_convert_to_markdown
+                ),
+            },
+        )
+
+    def _table_documents(self, table: dict) -> Iterator[Document]:
+        if self._cut_table_to_line:
+            yield from html_helper.html_cut_table_handler(table)
+        else:
+            yield html_helper.html_origin_table_handler(
+                table, self._title_convert_to_markdown
+            )
@@ -0,0 +1,124 @@
+import multiprocessing
+import os
+import sys
+import traceback
+from collections import deque
+from collections.abc import Iterable, Iterator
+from multiprocessing.connection import wait
+from typing import Any, Callable, Optional
+
+
+def get_rss_mb() -> float:
+    """当前进程的常驻内存，Linux 读取 /proc，其他平台使用峰值近似"""
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE") / 1024 / 1024
+    except OSError:
+        import resource
+
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # macOS 单位为字节，Linux 为 KB
+        return peak / 1024 / 1024 if sys.platform == "darwin" else peak / 1024
+
+
+def _pool_worker(conn, func, max_rss_mb):
+    """子进程循环执行任务，内存超过上限时返回结果后退出，由主进程补充新的进程"""
+    while True:
+        task = conn.recv()
+        if task is None:
+            break
+        idx, item = task
+        try:
+            result, error = func(item), None
+        except Exception:
+            result, error = None, traceback.format_exc()
+        retire = bool(max_rss_mb) and get_rss_mb() > max_rss_mb
+        try:
+            conn.send((idx, result, error, retire))
+        except Exception:
+            conn.send((idx, None, traceback.format_exc(), retire))
+        if retire:
+            break
+    conn.close()
+
+
+def run_in_pool(
+    func: Callable[[Any], Any],
+    items: Iterable,
+    workers: int = 1,
+    max_rss_mb: Optional[float] = None,
+) -> Iterator[tuple[int, Any, Optional[str]]]:
+    """
+    在进程池中执行 func(item)，按完成顺序返回 (下标, 结果, 错误信息)
+    每个进程独占一条管道，主进程知道每个进程正在处理的任务：
+    任务异常时返回异常堆栈，进程崩溃时返回退出码，均不影响其他任务
+    子进程以 spawn 方式启动，不继承主进程已打开的 sqlite 连接等资源，
+    全局缓存在子进程中按环境变量重新打开；func 与 item 需可被 pickle
+    """
+    ctx = multiprocessing.get_context("spawn")
+    pending = deque(enumerate(items))
+    # 管道 -> (进程, 正在处理的任务下标)
+    running = {}
+
+    def start():
+        parent_conn, child_conn = ctx.Pipe()
+        process = ctx.Process(
+            target=_pool_worker, args=(child_conn, func, max_rss_mb), daemon=True
+        )
+        process.start()
+        child_conn.close()
+        return parent_conn, process
+
+    def dispatch(conn, process):
+        if pending:
+            idx, item = pending.popleft()
+            conn.send((idx, item))
+            running[conn] = (process, idx)
+        else:
+            conn.send(None)
+            process.join()
+            conn.close()
+
+    def retire(conn, process):
+        process.join()
+        conn.close()
+        if pending:
+            dispatch(*start())
+
+    try:
+        for _ in range(min(max(1, workers), len(pending))):
+            dispatch(*start())
+
+        while running:
+            wait(list(running) + [process.sentinel for process, _ in running.values()])
+            for conn, (process, idx) in list(running.items()):
+                message = None
+                if conn.poll():
+                    try:
+                        message = conn.recv()
+                    except EOFError:
+                        pass
+                elif process.is_alive():
+                    continue
+
+                # 先返回结果再移出 running，调用方提前关闭生成器时该进程仍会被清理
+                if message is None:
+                    process.join()
+                    yield idx, None, f"worker exited with code {process.exitcode}"
+                    del running[conn]
+                    retire(conn, process)
+                    continue
+
+                _, result, error, should_retire = message
+                yield idx, result, error
+                del running[conn]
+                if should_retire:
+                    retire(conn, process)
+                else:
+                    dispatch(conn, process)
+    finally:
+        for conn, (process, _) in running.items():
+            process.terminate()
+            process.join()
+            conn.close()
@@ -0,0 +1,186 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from typing import Optional
+
+from dify_rag.extractor.pdf import constants
+from dify_rag.models.document import Document
+
+
+def hash_file(file_path: str, chunk_size: int = 1 << 20) -> str:
+    """计算文件内容的 sha256，作为未提供 file_cache_key 时的缓存标识"""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def make_cache_key(file_key: str, config: dict) -> str:
+    """文件标识与解析配置共同决定缓存项，配置变化时不会命中旧结果"""
+    payload = json.dumps(
+        {"version": constants.PDF_CACHE_VERSION, "config": config},
+        sort_keys=True,
+        ensure_ascii=False,
+    )
+    return f"{file_key}:{hashlib.sha256(payload.encode()).hexdigest()}"
+
+
+class PdfExtractionCache:
+    """
+    PDF 解析结果的持久化缓存
+    使用 sqlite 保存压缩后的 Document 列表，按最近访问时间淘汰，
+    总大小不超过 max_bytes；未配置 store_path 时不启用
+    """
+
+    def __init__(
+        self,
+        store_path: Optional[str] = None,
+        max_bytes: int = constants.PDF_CACHE_MAX_BYTES,
+    ):
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._last_access = 0
+        self._lock = threading.Lock()
+        self._store = None
+        self._store_path = None
+        if store_path:
+            self.open_store(store_path)
+
+    @property
+    def enabled(self) -> bool:
+        return self._store is not None
+
+    def open_store(self, store_path: str) -> None:
+        store = sqlite3.connect(store_path, check_same_thread=False)
+        store.execute(
+            "CREATE TABLE IF NOT EXISTS extractions ("
+            "key TEXT PRIMARY KEY, file_key TEXT, size INTEGER, "
+            "accessed INTEGER, documents BLOB)"
+        )
+        store.execute(
+            "CREATE INDEX IF NOT EXISTS extractions_file_key ON extractions (file_key)"
+        )
+        store.execute(
+            "CREATE INDEX IF NOT EXISTS extractions_accessed ON extractions (accessed)"
+        )
+        store.commit()
+        with self._lock:
+            self._store, self._store_path = store, store_path
+
+    def __reduce__(self):
+        # 传给子进程时按路径重新打开 sqlite 连接
+        return type(self), (self._store_path, self.max_bytes)
+
+    def _next_access(self) -> int:
+        # 时钟精度不足时保证同一进程内的访问时间严格递增
+        self._last_access = max(time.time_ns(), self._last_access + 1)
+        return self._last_access
+
+    @staticmethod
+    def _dumps(documents: list[Document]) -> bytes:
+        data = [document.model_dump() for document in documents]
+        return zlib.compress(json.dumps(data, ensure_ascii=False).encode())
+
+    @staticmethod
+    def _loads(blob: bytes) -> list[Document]:
+        data = json.loads(zlib.decompress(blob))
+        return [Document(**item) for item in data]
+
+    def _evict(self) -> None:
+        total = self._store.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM extractions"
+        ).fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        rows = self._store.execute(
+            "SELECT key, size FROM extractions ORDER BY accessed"
+        )
+        expired = []
+        for key, size in rows:
+            if total <= self.max_bytes:
+                break
+            expired.append((key,))
+            total -= size
+        self._store.executemany("DELETE FROM extractions WHERE key = ?", expired)
+        self.evictions += len(expired)
+
+    def get(self, file_key: str, config: dict) -> Optional[list[Document]]:
+        if not self.enabled:
+            return None
+        key = make_cache_key(file_key, config)
+        with self._lock:
+            row = self._store.execute(
+                "SELECT documents FROM extractions WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self._store.execute(
+                "UPDATE extractions SET accessed = ? WHERE key = ?",
+                (self._next_access(), key),
+            )
+            self._store.commit()
+            self.hits += 1
+        return self._loads(row[0])
+
+    def set(self, file_key: str, config: dict, documents: list[Document]) -> None:
+        if not self.enabled:
+            return
+        key = make_cache_key(file_key, config)
+        blob = self._dumps(documents)
+        # 单个结果超过缓存上限时不保存，避免把其他结果全部淘汰
+        if len(blob) > self.max_bytes:
+            return
+        with self._lock:
+            self._store.execute(
+                "INSERT OR REPLACE INTO extractions VALUES (?, ?, ?, ?, ?)",
+                (key, file_key, len(blob), self._next_access(), blob),
+            )
+            self._evict()
+            self._store.commit()
+
+    def invalidate(self, file_key: str) -> int:
+        """删除文件在所有解析配置下的缓存结果，返回删除的数量"""
+        if not self.enabled:
+            return 0
+        with self._lock:
+            count = self._store.execute(
+                "DELETE FROM extractions WHERE file_key = ?", (file_key,)
+            ).rowcount
+            self._store.commit()
+            return count
+
+    def clear(self) -> None:
+        with self._lock:
+            if self._store is not None:
+                self._store.execute("DELETE FROM extractions")
+                self._store.commit()
+            self.hits = self.misses = self.evictions = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            size, count = 0, 0
+            if self._store is not None:
+                size, count = self._store.execute(
+                    "SELECT COALESCE(SUM(size), 0), COUNT(*) FROM extractions"
+                ).fetchone()
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "entries": count,
+                "size": size,
+                "max_bytes": self.max_bytes,
+            }
+
+
+pdf_extraction_cache = PdfExtractionCache(
+    store_path=os.environ.get("DIFY_RAG_PDF_CACHE_PATH")
+)
@@ -31,4 +31,32 @@ TITLE_PATTERN = [
 MAX_WORD_COUNT = 10
 MAX_CHAR_COUNT = 20
 
-SPLIT_TAGS = [1, 2, 3]
\ No newline at end of file
+SPLIT_TAGS = [1, 2, 3]
+
+# 并行解析时每个进程分配的页区间数量，区间更小可以减少负载不均
+PAGE_CHUNKS_PER_WORKER = 4
+
+# 解析结果缓存，缓存格式或解析逻辑变化时递增版本号使旧结果失效
+PDF_CACHE_VERSION = 4
+PDF_CACHE_MAX_BYTES = 1 << 30
+
+# 预览默认返回的章节数
+PREVIEW_MAX_SECTIONS = 5
+
+# 判断页眉页脚时抽样的页数，抽样页同时用于流式解析时的字体映射错误检测
+HEADER_FOOTER_SAMPLE_PAGES = 20
+# 页眉页脚高度相差不超过该值时视为相同
+HEADER_FOOTER_HEIGHT_TOLERANCE = 0.25
+
+# 字体映射错误检测
+CORRUPTION_SAMPLE_LINES = 200
+CORRUPTION_MIN_EVIDENCE = 3
+CORRUPTION_PUNCTUATION_RATIO = 0.5
+# 数字旁的 袁/遥/益/依，以及成对出现的 渊…冤、叶…曳
+CORRUPTION_PATTERN = (
+    r"\d\s?[袁遥益依]|[袁遥]\d|渊[^渊冤]{0,30}冤|叶[^叶曳]{0,30}曳"
+)
+CORRUPTED_PUNCTUATION = "袁遥"
+NORMAL_PUNCTUATION = "，。"
+
+CONTENT_REPAIRED_KEY = "content_repaired"
@@ -0,0 +1,169 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+from dataclasses import dataclass
+from typing import Optional
+
+from dify_rag.models.document import Document
+
+
+@dataclass(frozen=True)
+class IncrementalExtraction:
+    documents: list[Document]
+    # 本次重新解析的页码，其余页面复用上次的解析结果
+    changed_pages: list[int]
+    # documents 中相对上次解析新增或内容变化的章节下标
+    changed_sections: list[int]
+    # 与 documents 一一对应的章节指纹
+    section_hashes: list[str]
+    # 上次存在、本次已不存在的章节指纹
+    removed_sections: list[str]
+
+
+def section_hash(document: Document) -> str:
+    """章节指纹，标题路径与内容均相同时视为未变化"""
+    payload = json.dumps(
+        [document.metadata.get("titles"), document.page_content], ensure_ascii=False
+    )
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class PdfPageStore:
+    """
+    按页保存解析结果，用于修订后的 PDF 增量解析
+    页面解析结果以页面指纹为键保存，与文档无关；
+    每个文档记录最近一次解析的页面指纹与章节指纹，
+    文档更新后不再被任何文档引用的页面会被清理；
+    未配置 store_path 时不启用，每次增量解析都视为首次解析
+    """
+
+    def __init__(self, store_path: Optional[str] = None):
+        self._lock = threading.Lock()
+        self._store = None
+        self._store_path = None
+        if store_path:
+            self.open_store(store_path)
+
+    @property
+    def enabled(self) -> bool:
+        return self._store is not None
+
+    def open_store(self, store_path: str) -> None:
+        store = sqlite3.connect(store_path, check_same_thread=False)
+        store.executescript(
+            "CREATE TABLE IF NOT EXISTS pages (hash TEXT PRIMARY KEY, metrics TEXT);"
+            "CREATE TABLE IF NOT EXISTS document_pages ("
+            "document_key TEXT, page_idx INTEGER, hash TEXT, "
+            "PRIMARY KEY (document_key, page_idx));"
+            "CREATE INDEX IF NOT EXISTS document_pages_hash ON document_pages (hash);"
+            "CREATE TABLE IF NOT EXISTS document_sections ("
+            "document_key TEXT PRIMARY KEY, section_hashes TEXT);"
+        )
+        store.commit()
+        with self._lock:
+            self._store, self._store_path = store, store_path
+
+    def __reduce__(self):
+        # 传给子进程时按路径重新打开 sqlite 连接
+        return type(self), (self._store_path,)
+
+    @staticmethod
+    def _dumps(metrics: Optional[dict]) -> str:
+        return json.dumps(metrics, ensure_ascii=False)
+
+    @staticmethod
+    def _loads(data: str) -> Optional[dict]:
+        metrics = json.loads(data)
+        if metrics:
+            metrics["text_blocks"] = [tuple(block) for block in metrics["text_blocks"]]
+        return metrics
+
+    def get_pages(self, page_hashes: list[str]) -> dict[str, Optional[dict]]:
+        """返回已保存的页面解析结果，页面指纹 -> 度量数据"""
+        if not self.enabled:
+            return {}
+        pages = {}
+        unique_hashes = list(dict.fromkeys(page_hashes))
+        with self._lock:
+            # 分批查询，避免超过 sqlite 的参数数量限制
+            for start in range(0, len(unique_hashes), 500):
+                batch = unique_hashes[start:start + 500]
+                rows = self._store.execute(
+                    f"SELECT hash, metrics FROM pages WHERE hash IN ({','.join('?' * len(batch))})",
+                    batch,
+                )
+                pages.update((page_hash, self._loads(data)) for page_hash, data in rows)
+        return pages
+
+    def get_sections(self, document_key: str) -> list[str]:
+        if not self.enabled:
+            return []
+        with self._lock:
+            row = self._store.execute(
+                "SELECT section_hashes FROM document_sections WHERE document_key = ?",
+                (document_key,),
+            ).fetchone()
+        return json.loads(row[0]) if row else []
+
+    def save(
+        self,
+        document_key: str,
+        page_hashes: list[str],
+        new_pages: dict[str, Optional[dict]],
+        section_hashes: list[str],
+    ) -> None:
+        """保存本次解析的新页面，并将文档记录替换为本次的页面与章节指纹"""
+        if not self.enabled:
+            return
+        with self._lock, self._store:
+            self._store.executemany(
+                "INSERT OR REPLACE INTO pages VALUES (?, ?)",
+                [(page_hash, self._dumps(m)) for page_hash, m in new_pages.items()],
+            )
+            self._store.execute(
+                "DELETE FROM document_pages WHERE document_key = ?", (document_key,)
+            )
+            self._store.executemany(
+                "INSERT INTO document_pages VALUES (?, ?, ?)",
+                [(document_key, i, page_hash) for i, page_hash in enumerate(page_hashes)],
+            )
+            self._store.execute(
+                "INSERT OR REPLACE INTO document_sections VALUES (?, ?)",
+                (document_key, json.dumps(section_hashes)),
+            )
+            self._prune()
+
+    def _prune(self) -> None:
+        self._store.execute(
+            "DELETE FROM pages WHERE hash NOT IN (SELECT hash FROM document_pages)"
+        )
+
+    def invalidate(self, document_key: str) -> None:
+        """删除文档的解析记录，下次解析时全部页面重新解析"""
+        if not self.enabled:
+            return
+        with self._lock, self._store:
+            self._store.execute(
+                "DELETE FROM document_pages WHERE document_key = ?", (document_key,)
+            )
+            self._store.execute(
+                "DELETE FROM document_sections WHERE document_key = ?", (document_key,)
+            )
+            self._prune()
+
+    def stats(self) -> dict:
+        pages, documents = 0, 0
+        with self._lock:
+            if self._store is not None:
+                pages = self._store.execute("SELECT COUNT(*) FROM pages").fetchone()[0]
+                documents = self._store.execute(
+                    "SELECT COUNT(*) FROM document_sections"
+                ).fetchone()[0]
+        return {"pages": pages, "documents": documents}
+
+
+pdf_page_store = PdfPageStore(
+    store_path=os.environ.get("DIFY_RAG_PDF_PAGE_STORE_PATH")
+)
@@ -1,17 +1,34 @@
-from collections import Counter
+import hashlib
+import math
+import re
+from concurrent.futures import ProcessPoolExecutor
 
-from dify_rag.extractor.utils import is_gibberish
+import pymupdf
+
+from dify_rag.extractor.pdf import constants
+from dify_rag.extractor.utils import classify_gibberish
+
+corruption_pattern = re.compile(constants.CORRUPTION_PATTERN)
+# 对象定义中的间接引用，以及指向页面树的 /Parent 引用
+reference_pattern = re.compile(r"\b(\d+) \d+ R\b")
+parent_pattern = re.compile(r"/Parent \d+ \d+ R\b")
 
 
 def get_lines(page_blocks):
     lines = []
     lines_page_idx = []
+    block_texts, block_page_idx = [], []
     for page_idx, text_blocks in enumerate(page_blocks):
         for block in text_blocks:
-            block_text = block[4]
-            if is_gibberish(block_text):
-                lines.append(block_text.replace("\n", ""))
-                lines_page_idx.append(page_idx)
+            block_texts.append(block[4])
+            block_page_idx.append(page_idx)
+
+    for block_text, page_idx, is_valid in zip(
+        block_texts, block_page_idx, classify_gibberish(block_texts)
+    ):
+        if is_valid:
+            lines.append(block_text.replace("\n", ""))
+            lines_page_idx.append(page_idx)
     return lines, lines_page_idx
 
 def collect_page_metrics(page):
@@ -39,7 +56,28 @@ def collect_page_metrics(page):
         'footer_height': footer_height
     }
 
-def should_remove_headers_footers(page_metrics, threshold=0.9):
+def exists_common_height(heights, threshold, tolerance):
+    """
+    判断是否存在占比达到 threshold 的共同高度
+    高度排序后以宽度为 tolerance 的滑动窗口统计，窗口内的高度两两相差不超过 tolerance，
+    以窗口内的最大数量作为近似相等高度的数量
+    """
+    if not heights:
+        return False
+    heights = sorted(heights)
+    count, start = 0, 0
+    for end, height in enumerate(heights):
+        while height - heights[start] > tolerance:
+            start += 1
+        count = max(count, end - start + 1)
+    return count / len(heights) >= threshold
+
+
+def should_remove_headers_footers(
+    page_metrics,
+    threshold=0.9,
+    tolerance=constants.HEADER_FOOTER_HEIGHT_TOLERANCE,
+):
     """判断是否应该移除页眉页脚"""
     if not page_metrics:
         return False, False
@@ -47,56 +85,221 @@ def should_remove_headers_footers(page_metrics, threshold=0.9):
     header_heights = [m['header_height'] for m in page_metrics if m]
     footer_heights = [m['footer_height'] for m in page_metrics if m]
 
-    def exists_common_height(heights):
-        if not heights:
-            return False
-        _, count = Counter(heights).most_common(1)[0]
-        return count / len(heights) >= threshold
+    return (
+        exists_common_height(header_heights, threshold, tolerance),
+        exists_common_height(footer_heights, threshold, tolerance),
+    )
+
+
+def sample_page_indexes(page_count, sample_pages=constants.HEADER_FOOTER_SAMPLE_PAGES):
+    """均匀抽样的页码"""
+    step = max(1, page_count // sample_pages)
+    return range(0, page_count, step)
 
-    return exists_common_height(header_heights), exists_common_height(footer_heights)
 
-def filter_doc_header_or_footer(doc):
+def page_content_hash(page, stream_digests=None):
+    """
+    页面内容指纹，用于增量解析时判断页面是否变化
+    包含页面对象及其递归引用的全部对象（资源字典、字体、内嵌字体文件、ToUnicode、XObject 等）
+    的定义和原始数据，任一变化都会重新解析；不追踪 /Parent，避免引入整个页面树
+    使用未解压的原始数据，计算成本远低于文本提取
+    stream_digests 缓存同一文档中各数据流的摘要，多页共用的字体文件只计算一次
+    """
+    doc = page.parent
+    if stream_digests is None:
+        stream_digests = {}
+    xref_length = doc.xref_length()
+    digest = hashlib.sha256()
+    visited = set()
+    stack = [page.xref]
+    while stack:
+        xref = stack.pop()
+        if xref in visited or not 0 < xref < xref_length:
+            continue
+        visited.add(xref)
+        source = doc.xref_object(xref, compressed=True)
+        digest.update(source.encode())
+        if doc.xref_is_stream(xref):
+            if xref not in stream_digests:
+                stream_digests[xref] = hashlib.sha256(doc.xref_stream_raw(xref) or b"").digest()
+            digest.update(stream_digests[xref])
+        references = reference_pattern.findall(parent_pattern.sub("", source))
+        stack.extend(int(ref) for ref in reversed(references))
+    return digest.hexdigest()
+
+
+def collect_page_range_metrics(file_path, start, end):
+    """在子进程中独立打开文件，收集 [start, end) 页的度量数据"""
+    with pymupdf.open(file_path) as doc:
+        return [collect_page_metrics(doc[page_idx]) for page_idx in range(start, end)]
+
+
+def collect_doc_metrics_parallel(file_path, page_count, workers):
+    """按页区间并行收集度量数据，结果按页码顺序合并"""
+    chunk_size = max(1, math.ceil(page_count / (workers * constants.PAGE_CHUNKS_PER_WORKER)))
+    ranges = [
+        (start, min(start + chunk_size, page_count))
+        for start in range(0, page_count, chunk_size)
+    ]
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        results = executor.map(
+            collect_page_range_metrics,
+            [file_path] * len(ranges),
+            [start for start, _ in ranges],
+            [end for _, end in ranges],
+        )
+        return [metrics for range_metrics in results for metrics in range_metrics]
+
+
+def filter_doc_header_or_footer(doc, page_metrics=None):
     """
     过滤文档中的页眉页脚
     页眉和页脚，每页都应该具备且格式相同
+    基于抽样页面判断是否存在页眉页脚；未提供度量数据时，
+    判断后逐页提取并过滤，抽样页的结果直接复用，每页只提取一次
     """
-    page_metrics = [collect_page_metrics(page) for page in doc]
+    return filter_doc_header_or_footer_with_samples(doc, page_metrics)[0]
 
-    header_exists, footer_exists = should_remove_headers_footers(page_metrics)
+
+def filter_doc_header_or_footer_with_samples(doc, page_metrics=None):
+    """同 filter_doc_header_or_footer，同时返回抽样页过滤后的文本块"""
+    if page_metrics is None:
+        header_exists, footer_exists, sample_metrics = sample_doc_header_or_footer(doc)
+        page_metrics = iter_doc_metrics(doc, sample_metrics)
+    else:
+        sample_metrics = {
+            i: page_metrics[i] for i in sample_page_indexes(len(page_metrics))
+        }
+        header_exists, footer_exists = should_remove_headers_footers(
+            list(sample_metrics.values())
+        )
+    sample_blocks = filter_sample_blocks(sample_metrics, header_exists, footer_exists)
 
     if not header_exists and not footer_exists:
-        return [m['text_blocks'] for m in page_metrics if m]
+        return [m['text_blocks'] for m in page_metrics if m], sample_blocks
+
+    return [
+        filter_page_blocks(metrics, header_exists, footer_exists)
+        for metrics in page_metrics
+        if metrics
+    ], sample_blocks
+
 
-    filtered_page_blocks = []
-    for metrics in page_metrics:
+def filter_sample_blocks(sample_metrics, header_exists, footer_exists):
+    """
+    抽样页过滤页眉页脚后的文本块
+    完整解析与流式解析均基于抽样页判断字体映射错误，结果保持一致
+    """
+    return [
+        filter_page_blocks(m, header_exists, footer_exists)
+        for m in sample_metrics.values()
+        if m
+    ]
+
+
+def filter_page_blocks(metrics, header_exists, footer_exists):
+    """移除单页中的页眉页脚文本块"""
+    indices_to_remove = []
+    if header_exists and metrics['header_idx'] != -1:
+        indices_to_remove.append(metrics['header_idx'])
+    if footer_exists and metrics['footer_idx'] != -1:
+        indices_to_remove.append(metrics['footer_idx'])
+
+    return [
+        block for idx, block in enumerate(metrics['text_blocks'])
+        if idx not in indices_to_remove
+    ]
+
+
+def sample_doc_header_or_footer(doc, sample_pages=constants.HEADER_FOOTER_SAMPLE_PAGES):
+    """
+    抽样判断页眉页脚，只提取均匀分布的少量页面
+    返回判断结果及抽样页的度量数据（页码 -> 度量数据），供后续逐页处理时复用
+    """
+    sample_metrics = {
+        page_idx: collect_page_metrics(doc[page_idx])
+        for page_idx in sample_page_indexes(doc.page_count, sample_pages)
+    }
+    header_exists, footer_exists = should_remove_headers_footers(
+        list(sample_metrics.values())
+    )
+    return header_exists, footer_exists, sample_metrics
+
+
+def iter_doc_metrics(doc, sample_metrics):
+    """逐页返回度量数据，抽样页直接复用已提取的结果"""
+    for page_idx in range(doc.page_count):
+        if page_idx in sample_metrics:
+            yield sample_metrics[page_idx]
+        else:
+            yield collect_page_metrics(doc[page_idx])
+
+
+def iter_page_lines(doc, header_exists, footer_exists, sample_metrics):
+    """
+    流式解析时逐页返回过滤页眉页脚后的有效文本行
+    页码与 get_lines 一致，只统计包含文本块的页面
+    """
+    page_idx = 0
+    for metrics in iter_doc_metrics(doc, sample_metrics):
         if not metrics:
             continue
+        blocks = filter_page_blocks(metrics, header_exists, footer_exists)
+        yield page_idx, get_lines([blocks])[0]
+        page_idx += 1
 
-        indices_to_remove = []
-        if header_exists and metrics['header_idx'] != -1:
-            indices_to_remove.append(metrics['header_idx'])
-        if footer_exists and metrics['footer_idx'] != -1:
-            indices_to_remove.append(metrics['footer_idx'])
+def find_title_line(title, page_lines):
+    """在单页文本行中查找包含标题的行"""
+    compact_title = title.replace(" ", "")
+    return next(
+        (i for i, line in enumerate(page_lines) if title in line or compact_title in line),
+        None,
+    )
 
-        filtered_blocks = [
-            block for idx, block in enumerate(metrics['text_blocks'])
-            if idx not in indices_to_remove
-        ]
-        filtered_page_blocks.append(filtered_blocks)
 
-    return filtered_page_blocks
+def build_page_line_index(lines_page_idx):
+    """按页建立行号索引，页号 -> 该页全部行号"""
+    page_line_index = {}
+    for i, page_idx in enumerate(lines_page_idx):
+        page_line_index.setdefault(page_idx, []).append(i)
+    return page_line_index
+
 
 def get_lines_toc(toc, lines, lines_page_idx):
     """获取TOC的行索引"""
+    page_line_index = build_page_line_index(lines_page_idx)
     lines_toc = []
     for level, title, page in toc:
-        # 在目标页中查找包含该标题的行
+        # 只在目标页的行中查找包含该标题的行
+        line_indexes = page_line_index.get(page - 1)
+        if not line_indexes:
+            continue
+        compact_title = title.replace(" ", "")
         title_line_idx = next(
-            (i for i, idx in enumerate(lines_page_idx)
-                if idx == page - 1 and
-                (title in lines[i] or title.replace(" ", "") in lines[i])),
-            None
-            )
+            (i for i in line_indexes if title in lines[i] or compact_title in lines[i]),
+            None,
+        )
         if title_line_idx is not None:
             lines_toc.append((level, title, title_line_idx))
     return lines_toc
+
+def is_content_corrupted(lines, sample_lines=constants.CORRUPTION_SAMPLE_LINES):
+    """
+    抽样判断文档是否存在字体映射错误
+    错误的文档中 ，。 被识别为 袁遥，且常出现在数字旁或以 渊…冤 形式成对出现
+    """
+    if not lines:
+        return False
+
+    step = max(1, len(lines) // sample_lines)
+    sample = "\n".join(lines[::step])
+
+    if len(corruption_pattern.findall(sample)) >= constants.CORRUPTION_MIN_EVIDENCE:
+        return True
+
+    corrupted = sum(sample.count(c) for c in constants.CORRUPTED_PUNCTUATION)
+    normal = sum(sample.count(c) for c in constants.NORMAL_PUNCTUATION)
+    return (
+        corrupted >= constants.CORRUPTION_MIN_EVIDENCE
+        and corrupted / (corrupted + normal) >= constants.CORRUPTION_PUNCTUATION_RATIO
+    )
@@ -3,6 +3,13 @@ from typing import Optional
 
 from dify_rag.extractor.pdf import constants
 
+# 所有标题模式编译为一个按顺序尝试的分支正则，命名分组 p{i} 对应 TITLE_PATTERN[i]
+title_pattern = re.compile(
+    "|".join(f"(?P<p{i}>{pattern})" for i, pattern in enumerate(constants.TITLE_PATTERN))
+)
+zh_char_pattern = re.compile(r'[\u4e00-\u9fff]')
+punctuation_pattern = re.compile(r'[，,。：:；;!！?？]')
+
 
 def extract_title(text: str) -> Optional[dict[str, str]]:
     """匹配标题并返回标题及其对应的正则匹配模式"""
@@ -13,79 +20,73 @@ def extract_title(text: str) -> Optional[dict[str, str]]:
     words = text.split()
     if len(words) > constants.MAX_WORD_COUNT:
         return None
-    if re.search(r'[\u4e00-\u9fff]', text) and len(text) >= constants.MAX_CHAR_COUNT:
+    if len(text) >= constants.MAX_CHAR_COUNT and zh_char_pattern.search(text):
         return None
 
-    for pattern in constants.TITLE_PATTERN:
-        pattern = re.compile(pattern)
-        match = pattern.match(text)
-        if match:
-            matched_text = match.group(0)
-            # 如果匹配的文本后面紧跟着标点符号，不视为标题
-            remaining_text = text[len(matched_text):].strip()
-            if remaining_text and re.search(r'[，,。：:；;!！?？]', remaining_text) and len(remaining_text) > 2:
-                return None
-            return {
-                'text': text,
-                'pattern': pattern.pattern
-            }
-    return None
+    match = title_pattern.match(text)
+    if not match:
+        return None
+    matched_text = match.group(0)
+    # 如果匹配的文本后面紧跟着标点符号，不视为标题
+    remaining_text = text[len(matched_text):].strip()
+    if remaining_text and punctuation_pattern.search(remaining_text) and len(remaining_text) > 2:
+        return None
+    return {
+        'text': text,
+        'pattern': constants.TITLE_PATTERN[int(match.lastgroup[1:])]
+    }
 
 def is_summary(title: dict) -> bool:
     """判断给定的模式是否为摘要模式"""
     return title['pattern'] == constants.SUMMARY_PATTERN if constants.SUMMARY_PATTERN else False
 
-def generate_toc(lines: list[str]) -> list[list]:
-    """生成目录结构"""
-    toc = []
-    pattern_order = []
-    stack = []
-    level = None
-    
-    # 提取所有标题
-    titles = []
-    for i, line in enumerate(lines):
-        title_info = extract_title(line)
-        if title_info:
-            title_info['line_number'] = i
-            titles.append(title_info)
+class TocGenerator:
+    """逐行增量生成目录结构，标题模式的顺序按首次出现的先后确定"""
 
-    # 构建 pattern_order
-    for title in titles:
-        if title['pattern'] not in pattern_order and not is_summary(title):
-            pattern_order.append(title['pattern'])
+    def __init__(self):
+        self.pattern_order = []
+        # 模式 -> 在 pattern_order 中的序号，模式只追加不移动，序号一经确定不再变化
+        self.pattern_index = {}
+        self.stack = []
+        self.level = None
 
-    # 构建层级树并生成 TOC
-    for title in titles:
+    def feed(self, line: str, line_number: int) -> Optional[list]:
+        title = extract_title(line)
+        if not title:
+            return None
+        title['line_number'] = line_number
 
         if is_summary(title):
             # 摘要作为顶层标题
-            if level is None:
-                level = 1
-            toc.append([level, title['text'], title['line_number']])
-            continue
-
-        current_level = pattern_order.index(title['pattern'])
-
-        # 根据栈顶元素判断当前标题的层级
-        while stack:
-            top_level = pattern_order.index(stack[-1]['pattern'])
-            if current_level > top_level:
-                level = top_level + 1
-                break
-            else:
-                stack.pop()
-        else:
-            level = 1
+            if self.level is None:
+                self.level = 1
+            return [self.level, title['text'], title['line_number']]
+
+        current_level = self.pattern_index.get(title['pattern'])
+        if current_level is None:
+            current_level = self.pattern_index[title['pattern']] = len(self.pattern_order)
+            self.pattern_order.append(title['pattern'])
+
+        # 弹出栈顶中层级不高于当前标题的项，栈中保存各标题的模式序号
+        while self.stack and current_level <= self.stack[-1]:
+            self.stack.pop()
 
         # 如果栈不为空，当前层级基于父层级
-        if stack:
-            level = pattern_order.index(title['pattern']) - pattern_order.index(stack[-1]['pattern']) + 1
+        if self.stack:
+            self.level = current_level - self.stack[-1] + 1
         else:
-            level = 1
+            self.level = 1
 
-        toc.append([level, title['text'], title['line_number']])
+        self.stack.append(current_level)
+        return [self.level, title['text'], title['line_number']]
 
-        stack.append(title)
 
-    return toc
\ No newline at end of file
+def generate_toc(lines: list[str]) -> list[list]:
+    """生成目录结构"""
+    generator = TocGenerator()
+    toc = []
+    for i, line in enumerate(lines):
+        entry = generator.feed(line, i)
+        if entry:
+            toc.append(entry)
+    return toc
@@ -2,69 +2,212 @@
 # File: pdf_extractor.py
 # Description: None
 
-from typing import Optional
+import hashlib
+import mmap
+import os
+from collections.abc import Iterable, Iterator
+from contextlib import contextmanager
+from dataclasses import dataclass
+from functools import lru_cache, partial
+from itertools import islice
+from typing import BinaryIO, Callable, Optional, Union
 
 import pymupdf
 
 from dify_rag.extractor.extractor_base import BaseExtractor
 from dify_rag.extractor.pdf import constants, pdf_helper
-from dify_rag.extractor.pdf.toc import generate_toc
-from dify_rag.extractor.utils import fix_error_pdf_content
+from dify_rag.extractor.pdf.batch import run_in_pool
+from dify_rag.extractor.pdf.cache import (
+    PdfExtractionCache,
+    hash_file,
+    pdf_extraction_cache,
+)
+from dify_rag.extractor.pdf.incremental import (
+    IncrementalExtraction,
+    PdfPageStore,
+    pdf_page_store,
+    section_hash,
+)
+from dify_rag.extractor.pdf.toc import TocGenerator, generate_toc
+from dify_rag.extractor.utils import clean_pdf_content, fix_error_pdf_content
 from dify_rag.models.document import Document
 
 
 class PdfExtractor(BaseExtractor):
     def __init__(
         self,
-        file_path: str,
+        # 文件路径，或 bytes / memoryview / 文件对象形式的内存数据
+        file_path: Union[str, os.PathLike, bytes, bytearray, memoryview, BinaryIO],
         file_cache_key: Optional[str] = None,
         split_tags: list[str] = constants.SPLIT_TAGS,
+        # None 时自动检测是否存在字体映射错误，True/False 强制开启或关闭修复
+        fix_content: Optional[bool] = None,
+        # 大于 1 时按页区间多进程并行解析
+        workers: int = 1,
+        # 解析结果缓存，默认使用 DIFY_RAG_PDF_CACHE_PATH 配置的全局缓存
+        cache: Optional[PdfExtractionCache] = None,
+        # 增量解析使用的页面存储，默认使用 DIFY_RAG_PDF_PAGE_STORE_PATH 配置的全局存储，
+        # 未配置时不保存页面，每次增量解析都视为首次解析
+        page_store: Optional[PdfPageStore] = None,
+        # 以 mmap 映射本地文件，由操作系统按需换页，适合大文件
+        use_mmap: bool = False,
     ) -> None:
-        self._file_path = file_path
+        self._file_path, self._stream = None, None
+        if isinstance(file_path, (str, os.PathLike)):
+            self._file_path = os.fspath(file_path)
+        elif isinstance(file_path, (bytes, memoryview)):
+            self._stream = file_path
+        elif isinstance(file_path, bytearray):
+            # 避免 pymupdf 将 bytearray 复制为 bytes
+            self._stream = memoryview(file_path)
+        else:
+            self._stream = file_path.read()
+        self._use_mmap = use_mmap
         self._file_cache_key = file_cache_key
         self._split_tags = split_tags
+        self._fix_content = fix_content
+        self._workers = workers
+        self._cache = cache if cache is not None else pdf_extraction_cache
+        self._page_store = page_store if page_store is not None else pdf_page_store
+
+    @contextmanager
+    def _open(self) -> Iterator[pymupdf.Document]:
+        """
+        打开文档，内存数据与 mmap 映射以 stream 方式打开，不读写磁盘文件
+        退出时关闭文档，并立即解除 mmap 映射，不依赖垃圾回收释放文件
+        """
+        if self._stream is not None:
+            with pymupdf.open(stream=self._stream, filetype="pdf") as doc:
+                yield doc
+        elif self._use_mmap:
+            with open(self._file_path, "rb") as f:
+                mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            view = memoryview(mapped)
+            try:
+                with pymupdf.open(stream=view, filetype="pdf") as doc:
+                    yield doc
+            finally:
+                view.release()
+                mapped.close()
+        else:
+            with pymupdf.open(self._file_path) as doc:
+                yield doc
 
     @staticmethod
-    def _split_content(lines_toc, lines):
+    def _push_title(ancestors, level, title, repair_title):
+        """维护祖先标题栈，返回当前标题的完整标题路径"""
+        while ancestors and ancestors[-1][0] >= level:
+            ancestors.pop()
+        ancestors.append((level, repair_title(title)))
+        return [t for _, t in ancestors]
+
+    @staticmethod
+    def _split_content(
+        lines_toc,
+        lines,
+        repair: Callable[[str], str] = fix_error_pdf_content,
+        metadata: Optional[dict] = None,
+    ):
         documents = []
+        metadata = metadata or {}
+        # 重复出现的标题只修复一次
+        repair_title = lru_cache(maxsize=None)(repair)
 
         if lines_toc[0][2] > 1:
             documents.append(
                 Document(
-                    page_content=fix_error_pdf_content(
-                        "".join(lines[0:lines_toc[0][2]])
-                    )
+                    page_content=repair("".join(lines[0:lines_toc[0][2]])),
+                    metadata={**metadata},
                 )
             )
 
+        # 正向扫描，栈中保存当前标题之前层级严格递增的祖先标题
+        ancestors = []
         for i, (current_level, current_title, current_idx) in enumerate(lines_toc):
-            titles = []
-            stack = []
-
-            for prev_idx in range(i - 1, -1, -1):
-                prev_level, prev_title, _ = lines_toc[prev_idx]
-                if prev_level < current_level and (not stack or prev_level < stack[-1][0]):
-                    stack.append((prev_level, prev_title))
-
-            titles = [fix_error_pdf_content(title) for _, title in sorted(stack)]
-            titles.append(fix_error_pdf_content(current_title))
+            titles = PdfExtractor._push_title(
+                ancestors, current_level, current_title, repair_title
+            )
 
             next_idx = lines_toc[i + 1][2] if i + 1 < len(lines_toc) else len(lines)
 
-            section_content = fix_error_pdf_content("".join(lines[current_idx+1:next_idx]))
+            section_content = repair("".join(lines[current_idx+1:next_idx]))
 
             documents.append(Document(
                 page_content=section_content,
-                metadata={"titles": titles}
+                metadata={"titles": titles, **metadata}
             ))
         return documents
 
-    def extract(self) -> list[Document]:
+    def _should_fix_content(self, sample_lines) -> bool:
+        """基于抽样页的文本行判断，完整解析与流式解析结果一致"""
+        if self._fix_content is not None:
+            return self._fix_content
+        return pdf_helper.is_content_corrupted(sample_lines)
+
+    def _cache_file_key(self) -> str:
+        if self._file_cache_key:
+            return self._file_cache_key
+        if self._stream is not None:
+            return hashlib.sha256(self._stream).hexdigest()
+        return hash_file(self._file_path)
+
+    def _cache_config(self) -> dict:
+        # workers 只影响解析速度，不影响结果，不参与缓存键
+        return {"split_tags": self._split_tags, "fix_content": self._fix_content}
+
+    def invalidate_cache(self) -> int:
+        """删除当前文件在所有解析配置下的缓存结果"""
+        if not self._cache.enabled:
+            return 0
+        return self._cache.invalidate(self._cache_file_key())
+
+    def extract(self, pages: Optional[range] = None) -> list[Document]:
+        """
+        pages 为从 0 开始的页码范围，指定时只解析范围内的页面，
+        目录中指向范围外页面的条目被忽略，部分解析的结果不使用缓存
+        """
+        if pages is not None:
+            return self._extract(pages)
+        if not self._cache.enabled:
+            return self._extract()
+
+        file_key, config = self._cache_file_key(), self._cache_config()
+        documents = self._cache.get(file_key, config)
+        if documents is None:
+            documents = self._extract()
+            self._cache.set(file_key, config, documents)
+        return documents
+
+    def _extract(self, pages: Optional[range] = None) -> list[Document]:
         # 基于pymupdf版本
-        doc = pymupdf.open(self._file_path)
-        toc = doc.get_toc()
+        with self._open() as doc:
+            toc = doc.get_toc()
+            page_metrics = None
+            if pages is not None:
+                page_indexes = range(doc.page_count)[pages.start:pages.stop:pages.step]
+                # 目录页码转换为在所选页面中的序号，与 get_lines 的页码保持一致
+                positions = {page_idx: i for i, page_idx in enumerate(page_indexes)}
+                toc = [
+                    [level, title, positions[page - 1] + 1]
+                    for level, title, page, *_ in toc
+                    if page - 1 in positions
+                ]
+                page_metrics = [
+                    pdf_helper.collect_page_metrics(doc[page_idx]) for page_idx in page_indexes
+                ]
+            elif self._workers > 1 and doc.page_count > 1 and self._file_path:
+                # 子进程按文件路径独立打开文档，内存数据不跨进程复制，按单进程解析
+                page_metrics = pdf_helper.collect_doc_metrics_parallel(
+                    self._file_path, doc.page_count, self._workers
+                )
+            documents = self._build_documents(doc, toc, page_metrics)
+        return documents
+
+    def _build_documents(self, doc, toc, page_metrics=None) -> list[Document]:
         content, documents = "", []
-        filtered_page_blocks = pdf_helper.filter_doc_header_or_footer(doc)
+        filtered_page_blocks, sample_page_blocks = (
+            pdf_helper.filter_doc_header_or_footer_with_samples(doc, page_metrics)
+        )
         lines, lines_page_idx = pdf_helper.get_lines(filtered_page_blocks)
 
         if toc:
@@ -75,11 +218,229 @@ class PdfExtractor(BaseExtractor):
         if self._split_tags and lines_toc:
             lines_toc = [t for t in lines_toc if t[0] in self._split_tags]
 
+        sample_lines, _ = pdf_helper.get_lines(sample_page_blocks)
+        fix_content = self._should_fix_content(sample_lines)
+        repair = fix_error_pdf_content if fix_content else clean_pdf_content
+        metadata = {constants.CONTENT_REPAIRED_KEY: fix_content}
+
         if lines_toc:
-            documents = self._split_content(lines_toc, lines)
+            documents = self._split_content(lines_toc, lines, repair, metadata)
         else:
-            content = fix_error_pdf_content("".join(lines))
-            documents = [Document(page_content=content, metadata={"titles":[]})]
-
-        doc.close()
+            content = repair("".join(lines))
+            documents = [
+                Document(page_content=content, metadata={"titles": [], **metadata})
+            ]
         return documents
+
+    def extract_incremental(self, document_key: Optional[str] = None) -> IncrementalExtraction:
+        """
+        增量解析，只重新解析指纹变化的页面，其余页面复用上次保存的解析结果
+        页眉页脚检测与章节切分基于全部页面重新计算，返回结果中标记变化的章节
+        document_key 标识同一文档的不同修订版本，默认使用文件路径，内存数据必须指定
+        """
+        if document_key is None:
+            if self._file_path is None:
+                raise ValueError("document_key is required for in-memory input")
+            document_key = os.path.abspath(self._file_path)
+        with self._open() as doc:
+            toc = doc.get_toc()
+            stream_digests = {}
+            page_hashes = [
+                pdf_helper.page_content_hash(page, stream_digests) for page in doc
+            ]
+            stored_pages = self._page_store.get_pages(page_hashes)
+
+            new_pages, page_metrics, changed_pages = {}, [], []
+            for page_idx, page_hash in enumerate(page_hashes):
+                if page_hash in stored_pages:
+                    metrics = stored_pages[page_hash]
+                elif page_hash in new_pages:
+                    metrics = new_pages[page_hash]
+                else:
+                    metrics = pdf_helper.collect_page_metrics(doc[page_idx])
+                    new_pages[page_hash] = metrics
+                    changed_pages.append(page_idx)
+                page_metrics.append(metrics)
+
+            documents = self._build_documents(doc, toc, page_metrics)
+
+        section_hashes = [section_hash(d) for d in documents]
+        previous_hashes = self._page_store.get_sections(document_key)
+        self._page_store.save(document_key, page_hashes, new_pages, section_hashes)
+
+        previous, current = set(previous_hashes), set(section_hashes)
+        return IncrementalExtraction(
+            documents=documents,
+            changed_pages=changed_pages,
+            changed_sections=[
+                i for i, h in enumerate(section_hashes) if h not in previous
+            ],
+            section_hashes=section_hashes,
+            removed_sections=[h for h in previous_hashes if h not in current],
+        )
+
+    @staticmethod
+    def _slice_buffer(buffer, buffer_start, start, end):
+        """按全文行号截取缓冲区中的文本行，等价于 lines[start:end]"""
+        return buffer[max(0, start - buffer_start):max(0, end - buffer_start)]
+
+    def _iter_lines_toc(self, doc, toc, header_exists, footer_exists, sample_metrics):
+        """
+        逐页返回 (页内文本行, 页内解析出的目录项)
+        目录项按 get_lines_toc / generate_toc 的规则解析，行号为全文行号
+        """
+        toc_idx = 0
+        toc_generator = None if toc else TocGenerator()
+        line_count = 0
+        for page_idx, page_lines in pdf_helper.iter_page_lines(
+            doc, header_exists, footer_exists, sample_metrics
+        ):
+            page_toc = []
+            if toc_generator:
+                for i, line in enumerate(page_lines):
+                    entry = toc_generator.feed(line, line_count + i)
+                    if entry:
+                        page_toc.append(tuple(entry))
+            else:
+                # 目录需按阅读顺序排列，指向已处理页面的目录项无法再定位
+                while toc_idx < len(toc) and toc[toc_idx][2] - 1 <= page_idx:
+                    level, title, page = toc[toc_idx]
+                    toc_idx += 1
+                    if page - 1 < page_idx:
+                        continue
+                    line_idx = pdf_helper.find_title_line(title, page_lines)
+                    if line_idx is not None:
+                        page_toc.append((level, title, line_count + line_idx))
+
+            if self._split_tags:
+                page_toc = [t for t in page_toc if t[0] in self._split_tags]
+            yield page_lines, page_toc
+            line_count += len(page_lines)
+
+    def lazy_extract(self) -> Iterator[Document]:
+        """
+        流式解析，每解析到下一个目录边界即返回上一章节的 Document
+        页眉页脚与字体映射错误基于抽样页面判断，之后逐页处理内容，
+        内存占用与单个章节大小相关，与总页数无关
+        缓存命中时直接返回缓存结果，流式解析的结果不写入缓存
+        """
+        yield from self._stream_documents()
+
+    def preview(self, max_sections: int = constants.PREVIEW_MAX_SECTIONS) -> list[Document]:
+        """
+        预览前 max_sections 个章节，解析到足够的章节后不再读取后续页面
+        """
+        documents = self._stream_documents()
+        try:
+            return list(islice(documents, max_sections))
+        finally:
+            documents.close()
+
+    def _stream_documents(self) -> Iterator[Document]:
+        if self._cache.enabled:
+            documents = self._cache.get(self._cache_file_key(), self._cache_config())
+            if documents is not None:
+                yield from documents
+                return
+
+        with self._open() as doc:
+            toc = doc.get_toc()
+            header_exists, footer_exists, sample_metrics = (
+                pdf_helper.sample_doc_header_or_footer(doc)
+            )
+            sample_lines, _ = pdf_helper.get_lines(
+                pdf_helper.filter_sample_blocks(
+                    sample_metrics, header_exists, footer_exists
+                )
+            )
+            fix_content = self._should_fix_content(sample_lines)
+            repair = fix_error_pdf_content if fix_content else clean_pdf_content
+            repair_title = lru_cache(maxsize=None)(repair)
+            metadata = {constants.CONTENT_REPAIRED_KEY: fix_content}
+
+            # buffer 保存全文行号从 buffer_start 开始、尚未输出的文本行
+            buffer, buffer_start = [], 0
+            current = None
+            ancestors = []
+            for page_lines, page_toc in self._iter_lines_toc(
+                doc, toc, header_exists, footer_exists, sample_metrics
+            ):
+                buffer.extend(page_lines)
+                for level, title, line_idx in page_toc:
+                    if current is None:
+                        if line_idx > 1:
+                            yield Document(
+                                page_content=repair(
+                                    "".join(self._slice_buffer(buffer, buffer_start, 0, line_idx))
+                                ),
+                                metadata={**metadata},
+                            )
+                    else:
+                        yield Document(
+                            page_content=repair(
+                                "".join(
+                                    self._slice_buffer(
+                                        buffer, buffer_start, current[2] + 1, line_idx
+                                    )
+                                )
+                            ),
+                            metadata={"titles": current[3], **metadata},
+                        )
+
+                    titles = self._push_title(ancestors, level, title, repair_title)
+                    current = (level, title, line_idx, titles)
+
+                    drop = max(0, min(line_idx + 1 - buffer_start, len(buffer)))
+                    buffer, buffer_start = buffer[drop:], buffer_start + drop
+
+            if current is None:
+                yield Document(
+                    page_content=repair("".join(buffer)),
+                    metadata={"titles": [], **metadata},
+                )
+            else:
+                yield Document(
+                    page_content=repair(
+                        "".join(
+                            self._slice_buffer(
+                                buffer, buffer_start, current[2] + 1, buffer_start + len(buffer)
+                            )
+                        )
+                    ),
+                    metadata={"titles": current[3], **metadata},
+                )
+
+
+@dataclass(frozen=True)
+class BatchExtractionResult:
+    index: int
+    path: str
+    documents: Optional[list[Document]]
+    # 解析失败时的异常堆栈或进程退出信息
+    error: Optional[str] = None
+
+
+def _extract_file(extractor_kwargs: dict, path: str) -> list[Document]:
+    return PdfExtractor(path, **extractor_kwargs).extract()
+
+
+def extract_many(
+    paths: Iterable[str],
+    workers: Optional[int] = None,
+    max_rss_mb: Optional[float] = None,
+    **extractor_kwargs,
+) -> Iterator[BatchExtractionResult]:
+    """
+    批量解析 PDF，在进程池中并行执行，按完成顺序返回结果
+    进程常驻内存超过 max_rss_mb 时处理完当前文件后退出并补充新进程，
+    单个文件解析失败或导致进程崩溃时只记录该文件的错误
+    extractor_kwargs 传给每个 PdfExtractor
+    """
+    paths = list(paths)
+    for idx, documents, error in run_in_pool(
+        partial(_extract_file, extractor_kwargs),
+        paths,
+        workers=workers or os.cpu_count() or 1,
+        max_rss_mb=max_rss_mb,
+    ):
+        yield BatchExtractionResult(idx, paths[idx], documents, error)
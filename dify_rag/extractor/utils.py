@@ -1,7 +1,15 @@
+import bisect
+import codecs
+import os
 import re
+import sqlite3
+import threading
+from collections import Counter, OrderedDict
+from dataclasses import dataclass
 from functools import lru_cache
+from typing import Optional
 
-import jieba
+import numpy as np
 
 common_characters = set(
     "＞、abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789 .,!?;:'\"-，。！？；：”“‘’\n\t+-*\\/·[]{}【】()（）@#$%^&<>《》`~］′＜～‐='"
@@ -123,107 +131,609 @@ def find_codec(blob):
     return "utf-8"
 
 
-def get_encoding(file) -> str:
+ENCODING_SAMPLE_SIZE = 64 * 1024
+ENCODING_CHUNK_SIZE = 1024 * 1024
+ENCODING_MIN_CONFIDENCE = 0.9
+
+BOM_CODECS = [
+    (codecs.BOM_UTF32_LE, "utf_32"),
+    (codecs.BOM_UTF32_BE, "utf_32"),
+    (codecs.BOM_UTF8, "utf-8-sig"),
+    (codecs.BOM_UTF16_LE, "utf_16"),
+    (codecs.BOM_UTF16_BE, "utf_16"),
+]
+
+# 采样判断时可能只看到了子集字符，返回对应的超集编码，避免后续完整解码失败
+SUPERSET_CODECS = {
+    "ascii": "utf-8",
+    "gb2312": "gb18030",
+    "gbk": "gb18030",
+    "big5": "big5hkscs",
+    "shift_jis": "cp932",
+    "euc_kr": "cp949",
+}
+
+MULTIBYTE_CJK_CODECS = frozenset(
+    [
+        "gb2312",
+        "gbk",
+        "gb18030",
+        "big5",
+        "big5hkscs",
+        "cp932",
+        "cp949",
+        "cp950",
+        "euc_jp",
+        "euc_kr",
+        "shift_jis",
+    ]
+)
+
+META_CHARSET_PATTERN = re.compile(
+    rb"""<meta[^>]*?charset\s*=\s*["']?\s*([a-zA-Z0-9_\-]+)""", re.I
+)
+XML_ENCODING_PATTERN = re.compile(rb"""^<\?xml[^>]*?encoding=["']([a-zA-Z0-9_\-]+)""")
+
+
+@dataclass(frozen=True)
+class EncodingResult:
+    encoding: str
+    confidence: float
+    # bom, meta, sample or full_scan
+    source: str
+
+
+def normalize_codec(name: str) -> Optional[str]:
+    try:
+        return codecs.lookup(name).name
+    except LookupError:
+        return None
+
+
+def find_declared_codec(sample: bytes) -> Optional[str]:
+    """从 html meta 或 xml 声明中获取编码"""
+    match = XML_ENCODING_PATTERN.search(sample) or META_CHARSET_PATTERN.search(sample)
+    if not match:
+        return None
+    declared = normalize_codec(match.group(1).decode("ascii", "ignore"))
+    if not declared:
+        return None
+    return SUPERSET_CODECS.get(declared, declared)
+
+
+def decodes_sample(codec: str, sample: bytes, final: bool) -> Optional[str]:
+    try:
+        return codecs.getincrementaldecoder(codec)().decode(sample, final=final)
+    except Exception:
+        return None
+
+
+def is_cjk_char(char: str) -> bool:
+    code = ord(char)
+    return (
+        start_zh_ord <= code <= end_zh_ord
+        or 0x3000 <= code <= 0x30FF
+        or 0xAC00 <= code <= 0xD7A3
+        or 0xFF00 <= code <= 0xFFEF
+        or char in common_characters
+    )
+
+
+def sample_confidence(codec: str, text: str) -> float:
+    """评估采样解码结果的可信度"""
+    non_ascii = [c for c in text if ord(c) > 0x7F]
+    if not non_ascii:
+        # 纯 ascii 采样无法区分编码
+        return 0.0
+    if codec in ("utf_8", "utf-8"):
+        # 非 ascii 内容能通过 utf-8 校验的概率极低
+        return 0.99
+    if codec in MULTIBYTE_CJK_CODECS:
+        return 0.98 * sum(1 for c in non_ascii if is_cjk_char(c)) / len(non_ascii)
+    return 0.5
+
+
+def scan_codec(file, codec: str, chunk_size: int = ENCODING_CHUNK_SIZE) -> bool:
+    """流式完整解码，遇到错误立即返回"""
+    decoder = codecs.getincrementaldecoder(codec)()
+    try:
+        with open(file, "rb") as f:
+            while chunk := f.read(chunk_size):
+                decoder.decode(chunk)
+        decoder.decode(b"", final=True)
+    except Exception:
+        return False
+    return True
+
+
+def detect_encoding(
+    file,
+    sample_size: int = ENCODING_SAMPLE_SIZE,
+    min_confidence: float = ENCODING_MIN_CONFIDENCE,
+) -> EncodingResult:
+    """
+    检测文件编码
+    依次检查 BOM、meta charset 声明与有限大小的采样，仅在采样无法判断时才完整扫描文件；
+    文件大于采样时，采样得到的编码需通过全文流式解码校验，采样之后存在无法解码的内容时
+    排除该编码，继续检测
+    """
+    file_size = os.path.getsize(file)
     with open(file, "rb") as f:
-        return find_codec(f.read())
+        sample = f.read(sample_size)
+    complete = len(sample) >= file_size
+
+    def verified(codec: str) -> bool:
+        return complete or scan_codec(file, codec)
+
+    for bom, codec in BOM_CODECS:
+        if (
+            sample.startswith(bom)
+            and decodes_sample(codec, sample, complete) is not None
+            and verified(codec)
+        ):
+            return EncodingResult(codec, 1.0, "bom")
+
+    declared = find_declared_codec(sample)
+    if declared and decodes_sample(declared, sample, complete) is None:
+        declared = None
+    if declared and (complete or not sample.isascii()):
+        # 声明的编码通过了含非 ascii 内容的采样校验
+        if verified(declared):
+            return EncodingResult(declared, 1.0 if complete else 0.95, "meta")
+        declared = None
+
+    candidates = []
+    for codec in all_codecs:
+        if codec in candidates or not normalize_codec(codec):
+            continue
+        text = decodes_sample(codec, sample, complete)
+        if text is None:
+            continue
+        if complete:
+            # 采样即全文，结果与 find_codec 一致
+            return EncodingResult(codec, 1.0, "sample")
+        if not candidates:
+            confidence = sample_confidence(codec, text)
+            if confidence >= min_confidence:
+                codec = SUPERSET_CODECS.get(codec, codec)
+                if scan_codec(file, codec):
+                    return EncodingResult(codec, confidence, "sample")
+                continue
+        candidates.append(codec)
+
+    if complete:
+        return EncodingResult("utf-8", 0.0, "sample")
+
+    # 采样无法确定，仅对采样阶段未被排除的编码进行完整扫描
+    if declared:
+        candidates = [declared] + [c for c in candidates if c != declared]
+    for codec in candidates:
+        if scan_codec(file, codec):
+            return EncodingResult(codec, 1.0, "full_scan")
+    return EncodingResult("utf-8", 0.0, "full_scan")
+
+
+class EncodingCache:
+    """
+    进程级编码检测结果缓存
+    以 (path, size, mtime_ns, inode) 标识文件，内存中按 LRU 淘汰，
+    可选使用 sqlite 持久化，重复导入时直接跳过检测
+    """
+
+    def __init__(self, maxsize: int = 1024, store_path: Optional[str] = None):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries: OrderedDict[tuple, EncodingResult] = OrderedDict()
+        self._lock = threading.Lock()
+        self._store = None
+        if store_path:
+            self.open_store(store_path)
+
+    @staticmethod
+    def file_key(file) -> tuple:
+        stat = os.stat(file)
+        return (
+            os.path.abspath(file),
+            stat.st_size,
+            stat.st_mtime_ns,
+            stat.st_ino,
+        )
+
+    def open_store(self, store_path: str) -> None:
+        store = sqlite3.connect(store_path, check_same_thread=False)
+        store.execute(
+            "CREATE TABLE IF NOT EXISTS encodings ("
+            "key TEXT PRIMARY KEY, encoding TEXT, confidence REAL, source TEXT)"
+        )
+        store.commit()
+        with self._lock:
+            self._store = store
+
+    def _load(self, key: tuple) -> Optional[EncodingResult]:
+        row = self._store.execute(
+            "SELECT encoding, confidence, source FROM encodings WHERE key = ?",
+            (repr(key),),
+        ).fetchone()
+        return EncodingResult(*row) if row else None
+
+    def _save(self, key: tuple, result: EncodingResult) -> None:
+        self._store.execute(
+            "INSERT OR REPLACE INTO encodings VALUES (?, ?, ?, ?)",
+            (repr(key), result.encoding, result.confidence, result.source),
+        )
+        self._store.commit()
+
+    def _put(self, key: tuple, result: EncodingResult) -> None:
+        self._entries[key] = result
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def get(self, file) -> Optional[EncodingResult]:
+        key = self.file_key(file)
+        with self._lock:
+            result = self._entries.get(key)
+            if result is not None:
+                self._entries.move_to_end(key)
+            elif self._store is not None:
+                result = self._load(key)
+                if result is not None:
+                    self._put(key, result)
+
+            if result is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return result
+
+    def set(self, file, result: EncodingResult) -> None:
+        key = self.file_key(file)
+        with self._lock:
+            self._put(key, result)
+            if self._store is not None:
+                self._save(key, result)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = self.evictions = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+            }
+
+
+encoding_cache = EncodingCache(
+    store_path=os.environ.get("DIFY_RAG_ENCODING_CACHE_PATH")
+)
+
+
+def get_encoding(file) -> str:
+    result = encoding_cache.get(file)
+    if result is None:
+        result = detect_encoding(file)
+        encoding_cache.set(file, result)
+    return result.encoding
+
+
+GIBBERISH_THRESHOLD = 0.3
+# BMP 码点查找表，超出 BMP 的字符统一映射到非字符 U+FFFF 视为非常见字符
+common_char_table = np.zeros(0x10000, dtype=bool)
+common_char_table[start_zh_ord : end_zh_ord + 1] = True
+common_char_table[[ord(c) for c in common_characters]] = True
+uncommon_char_pattern = re.compile(
+    "[^"
+    + "".join(re.escape(c) for c in sorted(common_characters))
+    + f"{chr(start_zh_ord)}-{chr(end_zh_ord)}]"
+)
+
+
+def is_common_char(char: str) -> bool:
+    return char in common_characters or (start_zh_ord <= ord(char) <= end_zh_ord)
+
+
+def has_prefix_overflow(text: str) -> bool:
+    """按码点升序累计，判断是否存在非常见字符占比超过阈值的前缀"""
+    total, invalid = 0, 0
+    # 同一字符连续出现时前缀占比单调递增，只需检查每组字符的末尾位置
+    for char, count in sorted(Counter(text).items()):
+        total += count
+        if not is_common_char(char):
+            invalid += count
+            if invalid / total > GIBBERISH_THRESHOLD:
+                return True
+    return False
 
 
 def is_gibberish(text):
-    text = sorted(text)
-    check_char_list = list(text)
-    check_result_list = list()
-    for char in check_char_list:
-        if char in common_characters or (start_zh_ord <= ord(char) <= end_zh_ord):
-            check_result_list.append(True)
-        else:
-            check_result_list.append(False)
-            if check_result_list.count(False) / len(check_result_list) > 0.3:
-                return False
-    return check_result_list.count(False) / len(check_result_list) < 0.3
-
-@lru_cache(maxsize=2048)
-def get_word_segments(context: str):
-    return list(jieba.cut(context, cut_all=True))
-
-@lru_cache(maxsize=4096)
-def should_protect_char(context: str, char: str) -> bool:
-    return any(len(word) > 1 for word in get_word_segments(context) if char in word)
+    """
+    判断文本是否为正常文本，非常见字符占比低于阈值时返回 True
+    按码点升序累计，任一前缀中非常见字符占比超过阈值即提前判定为 False
+    """
+    if not text:
+        return False
+
+    uncommon_count = len(uncommon_char_pattern.findall(text))
+    if not uncommon_count:
+        return True
+    if uncommon_count / len(text) >= GIBBERISH_THRESHOLD:
+        return False
+    return not has_prefix_overflow(text)
+
+
+def classify_gibberish(texts: list[str]) -> list[bool]:
+    """批量版本的 is_gibberish，一次性统计文档中所有文本块的非常见字符数"""
+    if not texts:
+        return []
+
+    lengths = np.fromiter((len(text) for text in texts), dtype=np.int64, count=len(texts))
+    results = np.zeros(len(texts), dtype=bool)
+    non_empty = lengths > 0
+    if not non_empty.any():
+        return results.tolist()
+
+    codes = np.frombuffer(
+        "".join(texts).encode("utf-32-le", "surrogatepass"), dtype=np.uint32
+    )
+    uncommon = ~common_char_table[np.minimum(codes, 0xFFFF)]
+    starts = np.cumsum(lengths) - lengths
+    uncommon_counts = np.zeros(len(texts), dtype=np.int64)
+    uncommon_counts[non_empty] = np.add.reduceat(uncommon, starts[non_empty])
+
+    results[non_empty] = (
+        uncommon_counts[non_empty] / lengths[non_empty] < GIBBERISH_THRESHOLD
+    )
+    # 只有同时包含非常见字符且总体占比未超阈值的文本块需要逐前缀检查
+    borderline = np.flatnonzero(results & (uncommon_counts > 0))
+    results = results.tolist()
+    for idx in borderline:
+        results[idx] = not has_prefix_overflow(texts[idx])
+    return results
 
-def create_replace_func(text: str, conversion_rules: dict):
-    def replace_func(match):
-        char = match.group(0)
-        pos = match.start()
-        context = text[max(0, pos - 3):min(len(text), pos + 4)]
-        return char if should_protect_char(context, char) else conversion_rules[char]
-    return replace_func
 
 MAX_MATCH_LENGTH = 500
+MAX_BRACKET_MATCH_LENGTH = 30
 CIRCLE_NUMBERS_MAP = {
     "淤": "①", "于": "②", "盂": "③", "榆": "④", "虞": "⑤",
     "愚": "⑥", "舆": "⑦", "余": "⑧", "俞": "⑨", "逾": "⑩"
 }
+# 空白字符与项目符号的替换与上下文无关，未发生字体映射错误的 PDF 也需要处理
+PDF_CHAR_TABLE = str.maketrans(
+    {
+        "\xa0": None,
+        "\u2002": None,
+        "\u2003": " ",
+        "\u3000": " ",
+        "\U001001b0": ".",
+        "\uf06c": "●",
+    }
+)
+PDF_CONVERSION_RULES = {
+    "袁": "，",
+    "遥": "。",
+    "院": "：",
+    "渊": "（",
+    "冤": "）",
+    "尧": "、",
+    "揖": "【",
+    "铱": "】",
+    "耀": "~",
+    "曰": "；",
+    "鄄": "-",
+    "覬": "∅",
+}
+ROMAN_NUMBERS_MAP = {"玉": "Ⅰ", "域": "Ⅱ", "芋": "Ⅲ", "郁": "Ⅳ"}
 
-def fix_error_pdf_content(text: str):
-    # 替换空白字符
-    text = text.replace("\xa0", "")
-    text = text.replace("\u2002", "")
-    text = text.replace("\u2003", " ")
-    text = text.replace("\u3000", " ")
-    text = text.replace("\U001001b0", ".")
-
-    conversion_rules = {
-        "袁": "，",
-        "遥": "。",
-        "院": "：",
-        "渊": "（",
-        "冤": "）",
-        "尧": "、",
-        "揖": "【",
-        "铱": "】",
-        "耀": "~",
-        "曰": "；",
-        "鄄": "-",
-        "覬": "∅",
+# 易错字符前后各取 3 个字符作为上下文，判断其是否属于正常词语
+PROTECTION_CONTEXT_RADIUS = 3
+PROTECTION_CONTEXT_LENGTH = PROTECTION_CONTEXT_RADIUS * 2 + 1
+# 由 scripts/build_protected_words.py 从 jieba 词典生成
+PROTECTED_WORDS_PATH = os.path.join(
+    os.path.dirname(__file__), "pdf", "protected_words.txt"
+)
+
+
+@lru_cache(maxsize=1)
+def load_protected_words(path: str = PROTECTED_WORDS_PATH) -> dict[str, frozenset]:
+    """按易错字符建立包含该字符的词语索引"""
+    index = {char: set() for char in PDF_CONVERSION_RULES}
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            word = line.strip()
+            for char in set(word):
+                if char in index:
+                    index[char].add(word)
+    return {char: frozenset(words) for char, words in index.items()}
+
+
+def should_protect_char(context: str, char: str) -> bool:
+    """上下文中存在包含该字符的词语时保留原字符"""
+    words = load_protected_words().get(char)
+    if not words:
+        return False
+    for start in range(len(context) - 1):
+        for end in range(start + 2, len(context) + 1):
+            if context[start:end] in words:
+                return True
+    return False
+
+
+def is_zh_char(char: str) -> bool:
+    return "\u4e00" <= char <= "\u9fa5"
+
+
+class PdfContentRepairer:
+    """
+    修复 PDF 字体映射错误导致的字符异常
+    所有规则在导入时编译一次，局部替换通过一个正则交替模式单次扫描完成，
+    圆圈数字、方括号与罗马数字等依赖上下文的规则在第二次扫描中按位置处理，
+    结果与逐条 re.sub 的实现保持一致
+    """
+
+    LOCAL_PATTERN = re.compile(
+        r"(?P<conversion>[" + "".join(PDF_CONVERSION_RULES) + r"])"
+        # 益 前为数字加一个空格时才是 ℃
+        r"|(?P<celsius>(?<=\d\s)益)"
+        r"|(?P<plus_minus>(?<=\d)依)"
+        r"|(?P<microgram>滋g)"
+        r"|(?P<multiply>伊(?=\d))"
+        r"|(?P<book_open>叶)"
+        r"|(?P<book_close>曳)"
+        r"|(?P<greater_equal>逸\d+)"
+        r"|(?P<less_equal>臆\d+)"
+    )
+    LOCAL_REPLACEMENTS = {
+        "celsius": "℃",
+        "plus_minus": "±",
+        "microgram": "μg",
+        "multiply": "x",
+        "greater_equal": "≥",
+        "less_equal": "≤",
     }
-    pattern = re.compile('|'.join(map(re.escape, conversion_rules.keys())))
+    POSITIONAL_CHARS = frozenset(
+        list(CIRCLE_NUMBERS_MAP) + list(ROMAN_NUMBERS_MAP) + ["咱", "暂"]
+    )
 
-    replace_func = create_replace_func(text, conversion_rules)
-    text = pattern.sub(replace_func, text)
+    def repair(self, text: str) -> str:
+        text = text.translate(PDF_CHAR_TABLE)
+        text = self.repair_local(text)
+        chars = list(text)
+        positions = {}
+        for idx, char in enumerate(text):
+            if char in self.POSITIONAL_CHARS:
+                positions.setdefault(char, []).append(idx)
+        if positions:
+            self.repair_circle_numbers(chars, positions)
+            self.repair_brackets(chars, positions)
+            self.repair_roman_numbers(chars, positions)
+        return "".join(chars).replace("\n", "")
 
-    # 匹配℃ 和益 利用正则匹配了益字前面是否为数字，如果是数字那么才匹配
-    # 注意识别出来的益和前面的数字之间有一个空格的
-    text = re.sub(r"(?<=\d\s)益", "℃", text)
+    def repair_local(self, text: str) -> str:
+        # 《》 按 叶(.*?)曳 的语义配对：叶 之后存在 曳 时才替换，配对内部的 叶 保持原样
+        last_close = text.rfind("曳")
+        book_open = False
 
-    text = re.sub(r"(\d)依", r"\1±", text)
+        def replace(match):
+            nonlocal book_open
+            kind = match.lastgroup
+            char = match.group(0)
+            if kind == "conversion":
+                pos = match.start()
+                context = text[
+                    max(0, pos - PROTECTION_CONTEXT_RADIUS) : pos + PROTECTION_CONTEXT_RADIUS + 1
+                ]
+                return char if should_protect_char(context, char) else PDF_CONVERSION_RULES[char]
+            if kind == "book_open":
+                if book_open or match.start() > last_close:
+                    return char
+                book_open = True
+                return "《"
+            if kind == "book_close":
+                if not book_open:
+                    return char
+                book_open = False
+                return "》"
+            return self.LOCAL_REPLACEMENTS[kind]
 
-    text = text.replace("滋g", "μg")
+        return self.LOCAL_PATTERN.sub(replace, text)
 
-    text = re.sub(r"伊(\d+)", r"x\1", text)
+    @staticmethod
+    def find_chain(chain_positions: list[list[int]], start: int) -> Optional[list[int]]:
+        """从 start 开始按最近优先的原则寻找间隔不超过 MAX_MATCH_LENGTH 的字符链"""
+        chain = [start]
+        for positions in chain_positions[1:]:
+            idx = bisect.bisect_right(positions, chain[-1])
+            if idx == len(positions) or positions[idx] > chain[-1] + MAX_MATCH_LENGTH + 1:
+                return None
+            chain.append(positions[idx])
+        return chain
 
-    # 修复 《 和 》 解析异常
-    text = re.sub(r"叶(.*?)曳", r"《\1》", text, flags=re.DOTALL)
+    def repair_circle_numbers(self, chars: list[str], positions: dict) -> None:
+        # 修复 ① ② ③ ④ ⑤ ⑥ ⑦ ⑧ ⑨ ⑩，优先匹配更长的序列
+        circle_chars = list(CIRCLE_NUMBERS_MAP)
+        remaining = {char: list(positions.get(char, [])) for char in circle_chars}
+        for length in range(len(circle_chars), 1, -1):
+            # 倒序计算每个位置能否完成后续字符链，只保留可完成的位置
+            feasible = [remaining[circle_chars[length - 1]]]
+            for char in reversed(circle_chars[: length - 1]):
+                next_positions = feasible[0]
+                current = []
+                for pos in remaining[char]:
+                    idx = bisect.bisect_right(next_positions, pos)
+                    if (
+                        idx < len(next_positions)
+                        and next_positions[idx] <= pos + MAX_MATCH_LENGTH + 1
+                    ):
+                        current.append(pos)
+                feasible.insert(0, current)
 
-    # 修复 ≤
-    text = re.sub(r"逸(\d+)", r"≥", text)
-    text = re.sub(r"臆(\d+)", r"≤", text)
+            matched = []
+            end = -1
+            for start in feasible[0]:
+                if start <= end:
+                    continue
+                chain = self.find_chain(feasible, start)
+                matched.extend(zip(circle_chars, chain))
+                end = chain[-1]
 
-    # 修复 ●
-    text = text.replace("\uf06c", "●")
+            if not matched:
+                continue
+            for char, pos in matched:
+                chars[pos] = CIRCLE_NUMBERS_MAP[char]
+            matched_positions = {pos for _, pos in matched}
+            remaining = {
+                char: [pos for pos in char_positions if pos not in matched_positions]
+                for char, char_positions in remaining.items()
+            }
 
-    # 修复 ① ② ③ ④ ⑤ ⑥ ⑦ ⑧ ⑨ ⑩
-    circle_numbers_chars = list(CIRCLE_NUMBERS_MAP.keys())
-    for i in range(len(circle_numbers_chars), 1, -1):
-        pattern = ''.join([f"{c}(.{{0,{MAX_MATCH_LENGTH}}}?)" for c in circle_numbers_chars[:i-1]]) + circle_numbers_chars[i-1]
-        replacement = ''.join([f"{CIRCLE_NUMBERS_MAP[c]}\\{j}" for j, c in enumerate(circle_numbers_chars[:i-1], 1)]) + CIRCLE_NUMBERS_MAP[circle_numbers_chars[i-1]]
-        text = re.sub(pattern, replacement, text, flags=re.DOTALL)
+    @staticmethod
+    def repair_brackets(chars: list[str], positions: dict) -> None:
+        # 修复 [ 和 ] 解析异常
+        closes = positions.get("暂", [])
+        end = -1
+        for start in positions.get("咱", []):
+            if start <= end:
+                continue
+            idx = bisect.bisect_right(closes, start)
+            if idx < len(closes) and closes[idx] <= start + MAX_BRACKET_MATCH_LENGTH + 1:
+                end = closes[idx]
+                chars[start], chars[end] = "[", "]"
 
-    # 修复 [ 和 ] 解析异常
-    text = re.sub(r"咱(.{0,30}?)暂", r"[\1]", text, flags=re.DOTALL)
+    @staticmethod
+    def repair_roman_numbers(chars: list[str], positions: dict) -> None:
+        # 修复罗马数字字符，前后不是汉字或后接“期”时替换，按字符依次处理
+        last = len(chars) - 1
+        for char, roman in ROMAN_NUMBERS_MAP.items():
+            replaced = []
+            for pos in positions.get(char, []):
+                if (
+                    pos == 0
+                    or not is_zh_char(chars[pos - 1])
+                    or pos == last
+                    or not is_zh_char(chars[pos + 1])
+                    or chars[pos + 1] == "期"
+                ):
+                    replaced.append(pos)
+            for pos in replaced:
+                chars[pos] = roman
+
+
+pdf_content_repairer = PdfContentRepairer()
+
+
+def fix_error_pdf_content(text: str):
+    return pdf_content_repairer.repair(text)
 
-    # 修复罗马数字字符
-    text = re.sub(r"(?<![\u4e00-\u9fa5])玉|玉(?![\u4e00-\u9fa5])|玉(?=期)", "Ⅰ", text)
-    text = re.sub(r"(?<![\u4e00-\u9fa5])域|域(?![\u4e00-\u9fa5])|域(?=期)", "Ⅱ", text)
-    text = re.sub(r"(?<![\u4e00-\u9fa5])芋|芋(?![\u4e00-\u9fa5])|芋(?=期)", "Ⅲ", text)
-    text = re.sub(r"(?<![\u4e00-\u9fa5])郁|郁(?![\u4e00-\u9fa5])|郁(?=期)", "Ⅳ", text)
 
-    return text.replace("\n", "")
+def clean_pdf_content(text: str):
+    """未检测到字体映射错误时只做空白字符清理"""
+    return text.translate(PDF_CHAR_TABLE).replace("\n", "")
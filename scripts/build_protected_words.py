@@ -0,0 +1,37 @@
+# -*- encoding: utf-8 -*-
+# File: build_protected_words.py
+# Description: 从 jieba 词典中提取包含 PDF 易错字符的词语，生成修复时的上下文保护词表
+
+import importlib.util
+import os
+import re
+
+from dify_rag.extractor.utils import (
+    PDF_CONVERSION_RULES,
+    PROTECTED_WORDS_PATH,
+    PROTECTION_CONTEXT_LENGTH,
+)
+
+HAN_WORD_PATTERN = re.compile(r"^[一-鿕]+$")
+
+
+def main():
+    jieba_dir = os.path.dirname(importlib.util.find_spec("jieba").origin)
+    words = set()
+    with open(os.path.join(jieba_dir, "dict.txt"), encoding="utf-8") as f:
+        for line in f:
+            word, freq, *_ = line.split()
+            if (
+                1 < len(word) <= PROTECTION_CONTEXT_LENGTH
+                and int(freq) > 0
+                and HAN_WORD_PATTERN.match(word)
+                and any(char in word for char in PDF_CONVERSION_RULES)
+            ):
+                words.add(word)
+
+    with open(PROTECTED_WORDS_PATH, "w", encoding="utf-8") as f:
+        f.writelines(f"{word}\n" for word in sorted(words))
+
+
+if __name__ == "__main__":
+    main()
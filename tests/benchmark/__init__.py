@@ -0,0 +1,21 @@
+import os
+import time
+
+import pytest
+
+# 基准测试耗时较长，默认跳过，设置 DIFY_RAG_BENCHMARK=1 后运行
+benchmark = pytest.mark.skipif(
+    not os.environ.get("DIFY_RAG_BENCHMARK"),
+    reason="set DIFY_RAG_BENCHMARK=1 to run benchmarks",
+)
+
+
+def timeit(func, *args, repeat: int = 3, **kwargs):
+    """返回多次运行中的最短耗时及最后一次运行结果"""
+    best, result = float("inf"), None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(*args, **kwargs)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
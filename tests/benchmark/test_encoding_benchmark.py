@@ -0,0 +1,44 @@
+import os
+import tempfile
+
+from dify_rag.extractor import utils
+from tests.benchmark import benchmark, timeit
+from tests.log import logger
+
+FILE_SIZE_MB = int(os.environ.get("DIFY_RAG_BENCHMARK_MB", "50"))
+LINE = "新生儿转运是危重新生儿救治的重要环节，需要规范的转运流程。abc,123\n"
+
+
+def write_large_file(dir_path: str, encoding: str) -> str:
+    file_path = os.path.join(dir_path, f"large_{encoding}.html")
+    blob = LINE.encode(encoding)
+    with open(file_path, "wb") as f:
+        for _ in range(FILE_SIZE_MB * 1024 * 1024 // len(blob)):
+            f.write(blob)
+    return file_path
+
+
+def old_get_encoding(file_path: str) -> str:
+    with open(file_path, "rb") as f:
+        return utils.find_codec(f.read())
+
+
+@benchmark
+def test_encoding_benchmark():
+    with tempfile.TemporaryDirectory() as dir_path:
+        for encoding in ["gbk", "utf-8"]:
+            file_path = write_large_file(dir_path, encoding)
+
+            old_cost, old_result = timeit(old_get_encoding, file_path)
+            new_cost, new_result = timeit(utils.detect_encoding, file_path)
+
+            logger.info(
+                f"{encoding} {FILE_SIZE_MB}MB: find_codec {old_cost:.3f}s ({old_result}), "
+                f"detect_encoding {new_cost:.3f}s ({new_result})"
+            )
+            with open(file_path, encoding=new_result.encoding) as f:
+                f.read()
+
+
+if __name__ == "__main__":
+    test_encoding_benchmark()
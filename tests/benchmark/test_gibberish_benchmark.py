@@ -0,0 +1,49 @@
+import os
+import tempfile
+
+import pymupdf
+
+from dify_rag.extractor import utils
+from dify_rag.extractor.pdf import pdf_helper
+from tests.benchmark import benchmark, timeit
+from tests.log import logger
+from tests.pdf_builder import make_pdf
+
+PAGES = int(os.environ.get("DIFY_RAG_BENCHMARK_PAGES", "1000"))
+
+
+def legacy_is_gibberish(text):
+    check_result_list = []
+    for char in sorted(text):
+        if char in utils.common_characters or (
+            utils.start_zh_ord <= ord(char) <= utils.end_zh_ord
+        ):
+            check_result_list.append(True)
+        else:
+            check_result_list.append(False)
+            if check_result_list.count(False) / len(check_result_list) > 0.3:
+                return False
+    return check_result_list.count(False) / len(check_result_list) < 0.3
+
+
+@benchmark
+def test_gibberish_benchmark():
+    with tempfile.TemporaryDirectory() as dir_path:
+        file_path = make_pdf(os.path.join(dir_path, "large.pdf"), PAGES)
+        with pymupdf.open(file_path) as doc:
+            page_blocks = pdf_helper.filter_doc_header_or_footer(doc)
+        texts = [block[4] for blocks in page_blocks for block in blocks]
+
+        legacy_cost, expected = timeit(lambda: [legacy_is_gibberish(t) for t in texts])
+        single_cost, single = timeit(lambda: [utils.is_gibberish(t) for t in texts])
+        batch_cost, batch = timeit(utils.classify_gibberish, texts)
+        assert single == batch == expected
+
+        logger.info(
+            f"{PAGES} pages, {len(texts)} blocks: legacy {legacy_cost:.3f}s, "
+            f"is_gibberish {single_cost:.3f}s, classify_gibberish {batch_cost:.3f}s"
+        )
+
+
+if __name__ == "__main__":
+    test_gibberish_benchmark()
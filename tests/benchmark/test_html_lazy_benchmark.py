@@ -0,0 +1,48 @@
+import time
+import tracemalloc
+
+from dify_rag.extractor.html_extractor import HtmlExtractor
+from tests.benchmark import benchmark
+from tests.benchmark.test_html_pipeline_benchmark import make_large_html
+from tests.log import logger
+
+REPEATS = [20, 100]
+
+
+def measure(func):
+    tracemalloc.start()
+    start = time.perf_counter()
+    documents = iter(func())
+    next(documents)
+    first_chunk = time.perf_counter() - start
+    for _ in documents:
+        pass
+    total = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return first_chunk, total, peak / 1024 / 1024
+
+
+@benchmark
+def test_html_lazy_benchmark():
+    for repeat in REPEATS:
+        text_content = make_large_html(repeat)
+        for use_summary in (True, False):
+            extractor = HtmlExtractor(
+                file=text_content, use_summary=use_summary, use_lxml=True
+            )
+            assert list(extractor.lazy_extract()) == extractor.extract()
+            for name, func in [
+                ("extract", extractor.extract),
+                ("lazy_extract", extractor.lazy_extract),
+            ]:
+                first_chunk, total, peak = measure(func)
+                logger.info(
+                    f"{len(text_content) / 1024:.0f}KB html, use_summary={use_summary} "
+                    f"{name}: first chunk {first_chunk:.3f}s, total {total:.3f}s, "
+                    f"peak {peak:.1f}MB"
+                )
+
+
+if __name__ == "__main__":
+    test_html_lazy_benchmark()
@@ -0,0 +1,73 @@
+import os
+import re
+from pathlib import Path
+
+from dify_rag.extractor.html import constants, html_helper, html_text, readability
+from dify_rag.extractor.html_extractor import HtmlExtractor
+from dify_rag.models.document import Document
+from tests.benchmark import benchmark, timeit
+from tests.log import logger
+from tests.test_extractor.test_html_extractor import file_path
+
+REPEAT = int(os.environ.get("DIFY_RAG_BENCHMARK_HTML_REPEAT", "20"))
+
+
+def legacy_extract(text_content: str, use_summary: bool = True) -> list[Document]:
+    """每个阶段各自解析字符串的原始流程，用于对比共享解析树后的结果"""
+    title = readability.Document(text_content).title()
+    text, tables, title = html_helper.preprocessing(
+        text_content, title, False, True, True, True, True
+    )
+    docs = []
+    if text:
+        if use_summary:
+            text = readability.Document(text).summary(html_partial=True)
+        _, split_contents, titles = html_text.extract_text(
+            text, title=title, split_tags=constants.SPLIT_TAGS
+        )
+        for content, hierarchy_titles in zip(split_contents, titles):
+            docs.append(
+                Document(
+                    page_content=html_helper.trans_titles_and_content(
+                        content, hierarchy_titles, 0, False
+                    ),
+                    metadata={
+                        "titles": html_helper.trans_meta_titles(hierarchy_titles, False)
+                    },
+                )
+            )
+    for table in tables:
+        docs.extend(html_helper.html_cut_table_handler(table))
+    return docs
+
+
+def make_large_html(repeat: int) -> str:
+    """重复临床指南样例的正文，构造大体积 html"""
+    text = Path(file_path).read_text(encoding="utf-8")
+    body = re.search(r"<body[^>]*>(.*)</body>", text, re.S).group(1)
+    return text.replace(body, body * repeat)
+
+
+@benchmark
+def test_html_pipeline_benchmark():
+    text_content = make_large_html(REPEAT)
+    for use_summary in (True, False):
+        extractor = HtmlExtractor(file=text_content, use_summary=use_summary)
+        lxml_extractor = HtmlExtractor(
+            file=text_content, use_summary=use_summary, use_lxml=True
+        )
+        legacy_cost, expected = timeit(legacy_extract, text_content, use_summary)
+        shared_cost, docs = timeit(extractor.extract)
+        lxml_cost, lxml_docs = timeit(lxml_extractor.extract)
+        assert docs == expected
+        assert lxml_docs == expected
+
+        logger.info(
+            f"{len(text_content) / 1024:.0f}KB html, use_summary={use_summary}: "
+            f"legacy {legacy_cost:.3f}s, shared tree {shared_cost:.3f}s, "
+            f"lxml preprocessing {lxml_cost:.3f}s"
+        )
+
+
+if __name__ == "__main__":
+    test_html_pipeline_benchmark()
@@ -0,0 +1,65 @@
+import subprocess
+import sys
+
+from dify_rag.extractor.html_extractor import HtmlExtractor
+from tests.benchmark import benchmark
+from tests.benchmark.test_html_pipeline_benchmark import make_large_html
+from tests.log import logger
+from tests.test_extractor.test_html_extractor import split_table_documents
+
+REPEATS = [20, 200]
+
+# 子进程中逐个消费 Document，返回峰值 RSS（MB）与耗时
+# ru_maxrss 在 exec 后仍保留父进程的峰值，改为读取 Linux 的 VmHWM
+MEASURE = """
+import re, sys, time
+from dify_rag.extractor.html_extractor import HtmlExtractor
+
+start = time.perf_counter()
+kwargs = {"use_lxml": True, "use_summary": False}
+if sys.argv[2] == "1":
+    kwargs = {"incremental": True}
+count = sum(1 for _ in HtmlExtractor(sys.argv[1], **kwargs).lazy_extract())
+cost = time.perf_counter() - start
+with open("/proc/self/status") as f:
+    peak = int(re.search(r"VmHWM:\\s+(\\d+) kB", f.read()).group(1)) / 1024
+print(peak, cost, count)
+"""
+
+
+def measure(file_path: str, incremental: bool) -> tuple[float, float, int]:
+    output = subprocess.run(
+        [sys.executable, "-c", MEASURE, file_path, "1" if incremental else "0"],
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stdout.split()
+    return float(output[0]), float(output[1]), int(output[2])
+
+
+@benchmark
+def test_html_stream_benchmark(tmp_path):
+    for repeat in REPEATS:
+        text_content = make_large_html(repeat)
+        file_path = tmp_path / f"large_{repeat}.html"
+        file_path.write_text(text_content, encoding="utf-8")
+
+        expected = HtmlExtractor(str(file_path), use_summary=False).extract()
+        docs = HtmlExtractor(str(file_path), incremental=True).extract()
+        assert split_table_documents(docs) == split_table_documents(expected)
+
+        for incremental in (False, True):
+            peak, cost, count = measure(str(file_path), incremental)
+            assert count == len(expected)
+            logger.info(
+                f"{len(text_content) / 1024:.0f}KB html, incremental={incremental}: "
+                f"{cost:.3f}s, peak rss {peak:.1f}MB"
+            )
+
+
+if __name__ == "__main__":
+    import pathlib
+    import tempfile
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        test_html_stream_benchmark(pathlib.Path(tmp_dir))
@@ -0,0 +1,65 @@
+import os
+
+import pandas as pd
+
+from dify_rag.extractor.html import constants, html_helper
+from dify_rag.models import constants as global_constants
+from dify_rag.models.document import Document
+from tests.benchmark import benchmark, timeit
+from tests.log import logger
+
+ROWS = [
+    int(rows)
+    for rows in os.environ.get("DIFY_RAG_BENCHMARK_ROWS", "10000,100000").split(",")
+]
+COLUMNS = 8
+
+
+def legacy_html_cut_table_handler(table):
+    """逐行调用 build_row_content 的原始实现"""
+    new_docs = []
+    try:
+        table_values = table["table"]
+        df = pd.DataFrame(table_values[1:], columns=table_values[0])
+        for i, row in df.iterrows():
+            content = html_helper.build_row_content(row, df.columns)
+
+            metadata = {
+                "titles": html_helper.trans_meta_titles(table["titles"], False),
+                "row": i,
+                "content_type": global_constants.ContentType.TABLE,
+            }
+            doc = Document(page_content=content, metadata=metadata)
+            new_docs.append(doc)
+        return new_docs
+    except ValueError:
+        return new_docs
+
+
+def make_csv_table(rows: int) -> dict:
+    """与 CSVExtractor 经 df.to_html 生成的表格结构一致"""
+    header = ["编号"] + [f"指标{i}" for i in range(1, COLUMNS)]
+    values = [
+        [f"{r}"] + [f" 数值{r}-{i} " for i in range(1, COLUMNS)] for r in range(rows)
+    ]
+    return {"table": [header] + values, "titles": [(constants.TITLE_KEY, "数据表")]}
+
+
+@benchmark
+def test_html_table_benchmark():
+    for rows in ROWS:
+        table = make_csv_table(rows)
+        legacy_cost, expected = timeit(legacy_html_cut_table_handler, table, repeat=1)
+        vectorized_cost, docs = timeit(
+            html_helper.html_cut_table_handler, table, repeat=1
+        )
+        assert docs == expected
+
+        logger.info(
+            f"{rows} rows x {COLUMNS} columns: "
+            f"iterrows {legacy_cost:.3f}s, vectorized {vectorized_cost:.3f}s"
+        )
+
+
+if __name__ == "__main__":
+    test_html_table_benchmark()
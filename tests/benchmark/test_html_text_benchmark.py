@@ -0,0 +1,202 @@
+import copy
+import os
+import random
+import re
+
+import lxml.etree
+
+from dify_rag.extractor.html import constants, html_text
+from tests.benchmark import benchmark, timeit
+from tests.benchmark.test_html_pipeline_benchmark import make_large_html
+from tests.benchmark.test_readability_benchmark import make_nested_html
+from tests.log import logger
+from tests.test_extractor.test_html_extractor import make_text_html
+
+REPEAT = int(os.environ.get("DIFY_RAG_BENCHMARK_HTML_REPEAT", "20"))
+
+
+def legacy_normalize_whitespace(text):
+    return re.sub(r"\s+", " ", text.strip())
+
+
+def legacy_etree_to_text(
+    tree,
+    guess_punct_space=True,
+    guess_layout=True,
+    newline_tags=html_text.NEWLINE_TAGS,
+    double_newline_tags=html_text.DOUBLE_NEWLINE_TAGS,
+    split_tags=constants.SPLIT_TAGS,
+    title=None,
+):
+    """逐元素调用闭包、每个分段复制标题栈的原始实现"""
+    chunks = []
+    split_chunks = []
+    split_texts = []
+    split_texts_hierarch_titles = []
+    current_hierarchy_titles = []
+    if title and title != constants.NO_TITLE:
+        current_hierarchy_titles.append((constants.TITLE_KEY, title))
+
+    _NEWLINE = object()
+    _DOUBLE_NEWLINE = object()
+    prev = _DOUBLE_NEWLINE  # _NEWLINE, _DOUBLE_NEWLINE or content of the previous chunk (str)
+
+    def check_sup_type(text, tag=None) -> html_text.SupType:
+        if not (tag and tag == "sup"):
+            return html_text.SupType.UNKNOWN
+
+        text = text.replace(" ", "")
+        QUOTE_PATTERN = r"^\[\s*(\d+|(\d+\s*[-～]\s*\d+))(?:[\s,，]\s*(\d+|(\d+\s*[-～]\s*\d+)))*\s*\]$"
+
+        if text.isdigit():
+            return html_text.SupType.NUMERAL
+        elif re.match(QUOTE_PATTERN, text):
+            return html_text.SupType.QUOTE
+
+        return html_text.SupType.UNKNOWN
+
+    def should_add_space(text, tag=None):
+        """Return True if extra whitespace should be added before text"""
+        if prev in {_NEWLINE, _DOUBLE_NEWLINE}:
+            return False
+        if not guess_punct_space:
+            return True
+        if not html_text._has_trailing_whitespace(prev):
+            if (
+                html_text._has_punct_after(text)
+                or html_text._has_open_bracket_before(prev)
+                or check_sup_type(text, tag) == html_text.SupType.NUMERAL
+            ):
+                return False
+        return True
+
+    def get_space_between(text, tag=None):
+        if not text:
+            return " "
+        return " " if should_add_space(text, tag) else ""
+
+    def add_newlines(tag):
+        nonlocal prev
+        if not guess_layout:
+            return
+        if prev is _DOUBLE_NEWLINE:  # don't output more than 1 blank line
+            return
+        if tag in double_newline_tags:
+            chunks.append("\n" if prev is _NEWLINE else "\n\n")
+            split_chunks.append("\n" if prev is _NEWLINE else "\n\n")
+            prev = _DOUBLE_NEWLINE
+        elif tag in newline_tags:
+            if prev is not _NEWLINE:
+                chunks.append("\n")
+                split_chunks.append("\n")
+            prev = _NEWLINE
+
+    def add_text(text_content, tag=None):
+        nonlocal prev
+        text = legacy_normalize_whitespace(text_content) if text_content else ""
+        if not text:
+            return
+
+        space = get_space_between(text, tag)
+
+        sup_type = check_sup_type(text, tag)
+        if sup_type == html_text.SupType.QUOTE:
+            return
+        elif sup_type == html_text.SupType.NUMERAL:
+            text = f"^{text}"
+
+        chunks.extend([space, text])
+        # ignore header title
+        if not (tag and tag in split_tags):
+            split_chunks.extend([space, text])
+
+        prev = text_content
+
+    def compare_html_tags(tag1, tag2):
+        level1 = constants.TAG_HIERARCHY.get(tag1.lower(), 0)
+        level2 = constants.TAG_HIERARCHY.get(tag2.lower(), 0)
+
+        if level1 > level2:
+            return 1
+        elif level1 < level2:
+            return -1
+        else:
+            return 0
+
+    def update_current_hierarchy_titles(tag=None, text=None):
+        nonlocal current_hierarchy_titles
+
+        if (not tag) or (not text) or (tag not in split_tags):
+            return
+
+        while (
+            current_hierarchy_titles
+            and compare_html_tags(current_hierarchy_titles[-1][0], tag) <= 0
+        ):
+            current_hierarchy_titles.pop()
+
+        normalized_text = legacy_normalize_whitespace(text)
+        current_hierarchy_titles.append((tag.strip(), normalized_text.strip()))
+
+    def check_add_add_split_texts(tag=None, text=None):
+        nonlocal split_texts
+        nonlocal split_chunks
+
+        if tag and (tag not in split_tags):
+            return
+
+        prev_text = "".join(split_chunks).strip()
+        if prev_text:
+            split_texts.append(prev_text)
+            split_texts_hierarch_titles.append(copy.deepcopy(current_hierarchy_titles))
+
+        update_current_hierarchy_titles(tag, text)
+        split_chunks = []
+
+    # Extract text from the ``tree``: fill ``chunks`` variable
+    for event, el in lxml.etree.iterwalk(tree, events=("start", "end")):
+        if event == "start":
+            check_add_add_split_texts(el.tag, el.text)
+            add_newlines(el.tag)
+            add_text(el.text, el.tag)
+        elif event == "end":
+            add_newlines(el.tag)
+            if el is not tree:
+                add_text(el.tail, el.tag)
+
+    check_add_add_split_texts()
+
+    return "".join(chunks).strip(), split_texts, split_texts_hierarch_titles
+
+
+def make_corpus() -> dict[str, str]:
+    """临床指南样例、多层嵌套表格及包含大量标题与上标引用的页面"""
+    rng = random.Random(0)
+    return {
+        "guideline": make_large_html(REPEAT),
+        "nested": make_nested_html(REPEAT * 50),
+        "sections": make_text_html(rng, REPEAT * 2000),
+    }
+
+
+@benchmark
+def test_etree_to_text_benchmark():
+    for name, page in make_corpus().items():
+        tree = html_text._cleaned_html_tree(page)
+        legacy_cost, expected = timeit(legacy_etree_to_text, tree, title="标题")
+        cost, result = timeit(html_text.etree_to_text, tree, title="标题")
+        sections_cost, sections = timeit(
+            lambda: list(html_text.iter_etree_sections(tree, title="标题"))
+        )
+        assert result == expected
+        assert [content for content, _ in sections] == expected[1]
+
+        logger.info(
+            f"{name} ({len(page) / 1024:.0f}KB, {len(expected[1])} sections): "
+            f"legacy {legacy_cost:.3f}s, etree_to_text {cost:.3f}s, "
+            f"iter_etree_sections {sections_cost:.3f}s"
+        )
+
+
+if __name__ == "__main__":
+    test_etree_to_text_benchmark()
@@ -0,0 +1,54 @@
+import os
+import tempfile
+import time
+import tracemalloc
+
+from dify_rag.extractor.pdf_extractor import PdfExtractor
+from tests.benchmark import benchmark
+from tests.log import logger
+from tests.pdf_builder import make_pdf
+
+PAGE_COUNTS = [200, 1000]
+
+
+def measure(func):
+    tracemalloc.start()
+    start = time.perf_counter()
+    documents = iter(func())
+    next(documents)
+    first_chunk = time.perf_counter() - start
+    for _ in documents:
+        pass
+    total = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    # pymupdf 的 get_text("blocks") 每次调用都会残留少量对象，单独统计以便区分
+    snapshot = tracemalloc.take_snapshot().filter_traces(
+        [tracemalloc.Filter(True, "*pymupdf*")]
+    )
+    retained = sum(stat.size for stat in snapshot.statistics("filename"))
+    tracemalloc.stop()
+    return first_chunk, total, peak / 1024 / 1024, retained / 1024 / 1024
+
+
+@benchmark
+def test_pdf_lazy_benchmark():
+    with tempfile.TemporaryDirectory() as dir_path:
+        for pages in PAGE_COUNTS:
+            file_path = make_pdf(os.path.join(dir_path, f"{pages}.pdf"), pages)
+            extractor = PdfExtractor(file_path)
+            for name, func in [
+                ("extract", extractor.extract),
+                ("lazy_extract", extractor.lazy_extract),
+                ("preview", extractor.preview),
+                ("extract(pages)", lambda: extractor.extract(pages=range(10))),
+            ]:
+                first_chunk, total, peak, retained = measure(func)
+                logger.info(
+                    f"{pages} pages {name}: first chunk {first_chunk:.3f}s, "
+                    f"total {total:.3f}s, peak {peak:.1f}MB "
+                    f"(retained by pymupdf {retained:.1f}MB)"
+                )
+
+
+if __name__ == "__main__":
+    test_pdf_lazy_benchmark()
@@ -0,0 +1,29 @@
+import os
+import tempfile
+
+from dify_rag.extractor.pdf_extractor import PdfExtractor
+from tests.benchmark import benchmark, timeit
+from tests.log import logger
+from tests.pdf_builder import make_pdf
+
+PAGES = int(os.environ.get("DIFY_RAG_BENCHMARK_PAGES", "500"))
+
+
+@benchmark
+def test_pdf_parallel_benchmark():
+    with tempfile.TemporaryDirectory() as dir_path:
+        file_path = make_pdf(os.path.join(dir_path, "large.pdf"), PAGES)
+
+        serial_cost, expected = timeit(PdfExtractor(file_path).extract, repeat=1)
+        logger.info(f"{PAGES} pages, os.cpu_count()={os.cpu_count()}")
+        logger.info(f"workers=1: {serial_cost:.3f}s")
+        for workers in [2, 4, 8]:
+            cost, documents = timeit(
+                PdfExtractor(file_path, workers=workers).extract, repeat=1
+            )
+            assert documents == expected
+            logger.info(f"workers={workers}: {cost:.3f}s ({serial_cost / cost:.2f}x)")
+
+
+if __name__ == "__main__":
+    test_pdf_parallel_benchmark()
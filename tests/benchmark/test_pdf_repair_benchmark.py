@@ -0,0 +1,80 @@
+import os
+import re
+from functools import lru_cache
+
+import jieba
+
+from dify_rag.extractor.utils import CIRCLE_NUMBERS_MAP, fix_error_pdf_content
+from tests.benchmark import benchmark, timeit
+from tests.log import logger
+
+SECTION_COUNT = int(os.environ.get("DIFY_RAG_BENCHMARK_SECTIONS", "200"))
+SECTION = (
+    "淤转运前评估院患儿体温36 益左右袁血压120依5 mmHg袁剂量10滋g/kg袁每日伊3次遥"
+    "于参见叶新生儿转运指南曳咱1暂袁玉期患儿逸3 d复查遥盂医院感染控制袁院内会诊遥\n"
+) * 40
+
+
+@lru_cache(maxsize=4096)
+def legacy_should_protect_char(context: str, char: str) -> bool:
+    return any(len(word) > 1 for word in jieba.cut(context, cut_all=True) if char in word)
+
+
+def legacy_fix_error_pdf_content(text: str):
+    for old, new in [
+        ("\xa0", ""), ("\u2002", ""), ("\u2003", " "), ("\u3000", " "), ("\U001001b0", ".")
+    ]:
+        text = text.replace(old, new)
+
+    conversion_rules = {
+        "袁": "，", "遥": "。", "院": "：", "渊": "（", "冤": "）", "尧": "、",
+        "揖": "【", "铱": "】", "耀": "~", "曰": "；", "鄄": "-", "覬": "∅",
+    }
+    pattern = re.compile("|".join(map(re.escape, conversion_rules.keys())))
+    source = text
+
+    def replace_func(match):
+        char, pos = match.group(0), match.start()
+        context = source[max(0, pos - 3):min(len(source), pos + 4)]
+        return char if legacy_should_protect_char(context, char) else conversion_rules[char]
+
+    text = pattern.sub(replace_func, text)
+    text = re.sub(r"(?<=\d\s)益", "℃", text)
+    text = re.sub(r"(\d)依", r"\1±", text)
+    text = text.replace("滋g", "μg")
+    text = re.sub(r"伊(\d+)", r"x\1", text)
+    text = re.sub(r"叶(.*?)曳", r"《\1》", text, flags=re.DOTALL)
+    text = re.sub(r"逸(\d+)", r"≥", text)
+    text = re.sub(r"臆(\d+)", r"≤", text)
+    text = text.replace("\uf06c", "●")
+
+    circle_numbers_chars = list(CIRCLE_NUMBERS_MAP.keys())
+    for i in range(len(circle_numbers_chars), 1, -1):
+        pattern = "".join(f"{c}(.{{0,500}}?)" for c in circle_numbers_chars[:i - 1]) + circle_numbers_chars[i - 1]
+        replacement = "".join(
+            f"{CIRCLE_NUMBERS_MAP[c]}\\{j}" for j, c in enumerate(circle_numbers_chars[:i - 1], 1)
+        ) + CIRCLE_NUMBERS_MAP[circle_numbers_chars[i - 1]]
+        text = re.sub(pattern, replacement, text, flags=re.DOTALL)
+
+    text = re.sub(r"咱(.{0,30}?)暂", r"[\1]", text, flags=re.DOTALL)
+    for char, roman in [("玉", "Ⅰ"), ("域", "Ⅱ"), ("芋", "Ⅲ"), ("郁", "Ⅳ")]:
+        text = re.sub(f"(?<![\u4e00-\u9fa5]){char}|{char}(?![\u4e00-\u9fa5])|{char}(?=期)", roman, text)
+    return text.replace("\n", "")
+
+
+@benchmark
+def test_pdf_repair_benchmark():
+    sections = [f"第{i}节{SECTION}" for i in range(SECTION_COUNT)]
+
+    legacy_cost, expected = timeit(lambda: [legacy_fix_error_pdf_content(s) for s in sections])
+    cost, result = timeit(lambda: [fix_error_pdf_content(s) for s in sections])
+    assert result == expected
+
+    logger.info(
+        f"{SECTION_COUNT} sections x {len(SECTION)} chars: "
+        f"legacy {legacy_cost:.3f}s, fix_error_pdf_content {cost:.3f}s"
+    )
+
+
+if __name__ == "__main__":
+    test_pdf_repair_benchmark()
@@ -0,0 +1,138 @@
+import os
+import re
+import tempfile
+
+import pymupdf
+
+from dify_rag.extractor.pdf import constants, pdf_helper, toc
+from tests.benchmark import benchmark, timeit
+from tests.log import logger
+from tests.pdf_builder import make_pdf
+
+PAGES = int(os.environ.get("DIFY_RAG_BENCHMARK_PAGES", "1000"))
+TOC_ENTRIES = int(os.environ.get("DIFY_RAG_BENCHMARK_TOC_ENTRIES", "2000"))
+
+
+def legacy_get_lines_toc(toc, lines, lines_page_idx):
+    lines_toc = []
+    for level, title, page in toc:
+        title_line_idx = next(
+            (i for i, idx in enumerate(lines_page_idx)
+                if idx == page - 1 and
+                (title in lines[i] or title.replace(" ", "") in lines[i])),
+            None
+            )
+        if title_line_idx is not None:
+            lines_toc.append((level, title, title_line_idx))
+    return lines_toc
+
+
+@benchmark
+def test_get_lines_toc_benchmark():
+    lines, lines_page_idx, toc = [], [], []
+    for page in range(TOC_ENTRIES):
+        for i in range(30):
+            lines.append(f"第{page}章 第 {i} 节 正文内容")
+            lines_page_idx.append(page)
+        toc.append([1, f"第{page}章 第{page % 30}节", page + 1])
+
+    legacy_cost, expected = timeit(legacy_get_lines_toc, toc, lines, lines_page_idx, repeat=1)
+    indexed_cost, lines_toc = timeit(pdf_helper.get_lines_toc, toc, lines, lines_page_idx)
+    assert lines_toc == expected
+
+    logger.info(
+        f"{TOC_ENTRIES} toc entries, {len(lines)} lines: "
+        f"legacy {legacy_cost:.3f}s, indexed {indexed_cost:.3f}s"
+    )
+
+
+def legacy_extract_title(text):
+    text = text.strip()
+    if not text:
+        return None
+
+    words = text.split()
+    if len(words) > constants.MAX_WORD_COUNT:
+        return None
+    if re.search(r'[\u4e00-\u9fff]', text) and len(text) >= constants.MAX_CHAR_COUNT:
+        return None
+
+    for pattern in constants.TITLE_PATTERN:
+        pattern = re.compile(pattern)
+        match = pattern.match(text)
+        if match:
+            matched_text = match.group(0)
+            remaining_text = text[len(matched_text):].strip()
+            if remaining_text and re.search(r'[，,。：:；;!！?？]', remaining_text) and len(remaining_text) > 2:
+                return None
+            return {
+                'text': text,
+                'pattern': pattern.pattern
+            }
+    return None
+
+
+def legacy_generate_toc(lines):
+    toc = []
+    stack = []
+    pattern_order = []
+    level = None
+
+    for i, line in enumerate(lines):
+        title = legacy_extract_title(line)
+        if not title:
+            continue
+        title['line_number'] = i
+
+        if title['pattern'] == constants.SUMMARY_PATTERN:
+            if level is None:
+                level = 1
+            toc.append([level, title['text'], title['line_number']])
+            continue
+
+        if title['pattern'] not in pattern_order:
+            pattern_order.append(title['pattern'])
+        current_level = pattern_order.index(title['pattern'])
+
+        while stack:
+            top_level = pattern_order.index(stack[-1]['pattern'])
+            if current_level > top_level:
+                level = top_level + 1
+                break
+            else:
+                stack.pop()
+        else:
+            level = 1
+
+        if stack:
+            level = current_level - pattern_order.index(stack[-1]['pattern']) + 1
+        else:
+            level = 1
+
+        stack.append(title)
+        toc.append([level, title['text'], title['line_number']])
+
+    return toc
+
+
+@benchmark
+def test_generate_toc_benchmark():
+    with tempfile.TemporaryDirectory() as dir_path:
+        file_path = make_pdf(os.path.join(dir_path, "no_toc.pdf"), PAGES, with_toc=False)
+        with pymupdf.open(file_path) as doc:
+            page_blocks = pdf_helper.filter_doc_header_or_footer(doc)
+        lines, _ = pdf_helper.get_lines(page_blocks)
+
+        legacy_cost, expected = timeit(legacy_generate_toc, lines)
+        compiled_cost, result = timeit(toc.generate_toc, lines)
+        assert result == expected
+
+        logger.info(
+            f"{PAGES} pages, {len(lines)} lines: legacy {legacy_cost:.3f}s, "
+            f"compiled {compiled_cost:.3f}s"
+        )
+
+
+if __name__ == "__main__":
+    test_get_lines_toc_benchmark()
+    test_generate_toc_benchmark()
@@ -0,0 +1,116 @@
+import os
+
+from dify_rag.extractor.html import readability
+from dify_rag.extractor.html.readability import readability as readability_module
+from tests.benchmark import benchmark, timeit
+from tests.log import logger
+from tests.test_extractor.test_html_extractor import make_retry_html
+
+PARAGRAPHS = int(os.environ.get("DIFY_RAG_BENCHMARK_PARAGRAPHS", "2000"))
+SECTIONS = int(os.environ.get("DIFY_RAG_BENCHMARK_SECTIONS", "300"))
+
+
+class LegacyDocument(readability.Document):
+    """每次重试重新解析输入、每次调用重新遍历子树计算文本统计的原始实现"""
+
+    def _summary_tree(self, html_partial=False):
+        ruthless = True
+        while True:
+            self._html(True)
+            for i in self.tags(self.html, "script", "style"):
+                i.drop_tree()
+            for i in self.tags(self.html, "body"):
+                i.set("id", "readabilityBody")
+            if ruthless:
+                self.remove_unlikely_candidates()
+            self.transform_misused_divs_into_paragraphs()
+            candidates = self.score_paragraphs()
+
+            best_candidate = self.select_best_candidate(candidates)
+
+            if best_candidate:
+                article = self.get_article(
+                    candidates, best_candidate, html_partial=html_partial
+                )
+            else:
+                if ruthless:
+                    ruthless = False
+                    continue
+                article = self.html.find("body")
+                if article is None:
+                    article = self.html
+            self.sanitize_tree(article, candidates)
+
+            if ruthless and not self.is_acceptable_length():
+                ruthless = False
+                continue
+            return self.html
+
+    def node_stats(self, elem):
+        text = elem.text_content()
+        return readability_module.NodeStats(
+            ("", readability_module.text_length(elem), "", False),
+            len(readability_module.PUNCTUATION_RE.findall(text)),
+            text.count(","),
+            sum(readability_module.text_length(a) for a in elem.findall(".//a")),
+            self.class_weight(elem),
+        )
+
+    def score_paragraph(self, elem):
+        inner_text = readability_module.clean(elem.text_content() or "")
+        content_score = len(readability_module.PUNCTUATION_RE.split(inner_text))
+        content_score += min((len(inner_text) / 100), 3)
+        return len(inner_text), content_score
+
+
+@benchmark
+def test_readability_retry_benchmark():
+    html = make_retry_html(PARAGRAPHS)
+    legacy_cost, expected = timeit(
+        lambda: LegacyDocument(html).summary(html_partial=True)
+    )
+    snapshot_cost, summary = timeit(
+        lambda: readability.Document(html).summary(html_partial=True)
+    )
+    assert summary == expected
+
+    logger.info(
+        f"{PARAGRAPHS} paragraphs ({len(html) / 1024:.0f}KB) with retry: "
+        f"legacy {legacy_cost:.3f}s, snapshot {snapshot_cost:.3f}s"
+    )
+
+
+def make_nested_html(sections: int) -> str:
+    """多层嵌套的 div 与表格，候选节点的祖先链较长"""
+    section = (
+        "<div class='section'><div><h2>第{i}节</h2>"
+        "<p>新生儿转运前需评估呼吸、循环及体温情况，<a href='#'>参见附录</a>。</p>"
+        "<table><tr><td><div><p>指标{i}，正常范围，单位。</p></div></td>"
+        "<td><p>说明：<a href='#'>链接</a>，备注。</p></td></tr></table></div></div>"
+    )
+    body = "".join(section.format(i=i) for i in range(sections))
+    for _ in range(10):
+        body = f"<div>{body}</div>"
+    return f"<html><body>{body}</body></html>"
+
+
+@benchmark
+def test_readability_nested_benchmark():
+    html = make_nested_html(SECTIONS)
+    legacy_cost, expected = timeit(
+        lambda: LegacyDocument(html).summary(html_partial=True)
+    )
+    cached_cost, summary = timeit(
+        lambda: readability.Document(html).summary(html_partial=True)
+    )
+    assert summary == expected
+
+    logger.info(
+        f"{SECTIONS} nested sections ({len(html) / 1024:.0f}KB): "
+        f"legacy {legacy_cost:.3f}s, node stats {cached_cost:.3f}s"
+    )
+
+
+if __name__ == "__main__":
+    test_readability_retry_benchmark()
+    test_readability_nested_benchmark()
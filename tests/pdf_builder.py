@@ -0,0 +1,47 @@
+from collections.abc import Container
+from typing import Optional
+
+import pymupdf
+
+
+def make_pdf(
+    file_path: str,
+    pages: int,
+    lines_per_page: int = 20,
+    with_toc: bool = True,
+    corrupted: bool = True,
+    # 只有这些页码（从 0 开始）的标点映射错误，None 时为全部页面
+    corrupted_pages: Optional[Container[int]] = None,
+    # 这些页码（从 0 开始）不插入页码页脚
+    footerless_pages: Optional[Container[int]] = None,
+) -> str:
+    """生成带页眉页脚和章节结构的中文 PDF，corrupted 时模拟字体映射错误的标点"""
+    doc = pymupdf.open()
+    toc = []
+    for page_idx in range(pages):
+        page_corrupted = corrupted and (
+            corrupted_pages is None or page_idx in corrupted_pages
+        )
+        comma, period, celsius = (
+            ("袁", "遥", "益") if page_corrupted else ("，", "。", "℃")
+        )
+        page = doc.new_page()
+        page.insert_text((72, 40), "临床诊疗指南", fontname="china-s", fontsize=9)
+        title = f"第{page_idx + 1}章 新生儿转运"
+        page.insert_text((72, 80), title, fontname="china-s", fontsize=14)
+        toc.append([1, title, page_idx + 1])
+        y = 110
+        for line_idx in range(lines_per_page):
+            text = (
+                f"{line_idx + 1}.转运前应评估患儿病情{comma}"
+                f"体温维持在36 {celsius}左右{comma}并记录生命体征{period}"
+            )
+            page.insert_text((72, y), text, fontname="china-s", fontsize=10)
+            y += 32
+        if footerless_pages is None or page_idx not in footerless_pages:
+            page.insert_text((290, 810), str(page_idx + 1), fontname="helv", fontsize=9)
+    if with_toc:
+        doc.set_toc(toc)
+    doc.save(file_path)
+    doc.close()
+    return file_path
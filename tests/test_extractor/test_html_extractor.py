@@ -1,7 +1,61 @@
+import json
+import random
+from pathlib import Path
+
+from dify_rag.extractor.html import (
+    constants,
+    html_helper,
+    html_stream,
+    html_text,
+    readability,
+)
+from dify_rag.extractor.html.readability import readability as readability_module
 from dify_rag.extractor.html_extractor import HtmlExtractor
+from dify_rag.models.document import Document
 from tests.log import logger
 
 file_path = "tests/data/《中国新生儿转运指南(2013)》解读.html"
+# 原始实现的输出，用于对比优化后的结果
+extract_golden_path = "tests/data/html_extract_golden.json"
+text_golden_path = "tests/data/html_text_golden.json"
+table_golden_path = "tests/data/html_table_golden.json"
+
+# 覆盖标题清洗、超链接展开、复选框清理、表格名称及嵌套表格
+preprocess_html = """<html><head><title>预处理</title></head><body>
+<h1>第一章 <a href="#">概述</a></h1>
+<p>说明 <a href="#1">参考
+文献</a> 结束</p>
+<p>表1 <a href="#">转运指征</a></p>
+<table><tr><th>指征</th><th>说明</th></tr>
+<tr><td rowspan="2">早产</td><td>胎龄 <b>32</b> 周</td></tr>
+<tr><td>体重<table><tr><td>嵌套</td></tr></table></td></tr></table>
+<h2>第二章 <span>评估</span></h2>
+<p><input type="checkbox"><span>未选</span><input type="radio" checked><span>已选</span>表2</p>
+<table><tr><td>项目</td><td>结果</td></tr><tr><td>呼吸</td><td>正常</td></tr></table>
+<p><a href="#">表3 评估结果</a></p><p>转运<a href="#"></a>表</p>
+<h3>小结</h3><p><input type="checkbox">汇总表</p>
+<table><tr><td>a</td><td>b</td></tr></table><div><!--表3-->表3 数据</div>
+</body></html>"""
+
+
+def make_text_html(rng: random.Random, elements: int = 200) -> str:
+    """随机生成包含各级标题、上标引用、标点及空白的 html"""
+    texts = [
+        "", " ", "\n\t", "正文内容", "text", ", 逗号", "(括号", ")", ". end ", "  多个   空格 ",
+    ]
+    sups = ["1", "12", "[1]", "[1-3, 5]", "[2～4，6]", "a", " 3 "]
+    tags = ["p", "div", "span", "li", "br", "b", "td", "tr", "h1", "h2", "h3", "h4"]
+    parts = []
+    for _ in range(elements):
+        tag = rng.choice(tags)
+        if tag == "br":
+            parts.append(f"<br>{rng.choice(texts)}")
+        elif rng.random() < 0.2:
+            parts.append(f"{rng.choice(texts)}<sup>{rng.choice(sups)}</sup>")
+        else:
+            parts.append(f"<{tag}>{rng.choice(texts)}{rng.choice(texts)}</{tag}>")
+    return f"<html><body><div>{''.join(parts)}</div></body></html>"
+
 
 def test_html_extractor():
     extractor = HtmlExtractor(file_path)
@@ -15,5 +69,355 @@ def test_html_extractor():
         logger.info(f"{d.page_content} ({len(d.page_content)})")
 
 
+def load_golden(path: str) -> list:
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def dump_documents(docs: list[Document]) -> list[dict]:
+    return [doc.model_dump(mode="json") for doc in docs]
+
+
+def test_html_extractor_shared_tree():
+    text_content = Path(file_path).read_text(encoding="utf-8")
+    for case in load_golden(extract_golden_path):
+        docs = HtmlExtractor(file=text_content, use_summary=case["use_summary"]).extract()
+        assert dump_documents(docs) == case["output"]
+
+
+def test_html_extractor_lazy_extract():
+    text_content = Path(file_path).read_text(encoding="utf-8")
+    tree = html_text._cleaned_html_tree(text_content)
+    _, split_contents, titles = html_text.etree_to_text(tree, title="标题")
+    sections = list(html_text.iter_etree_sections(tree, title="标题"))
+    assert [content for content, _ in sections] == split_contents
+    assert [list(hierarchy_titles) for _, hierarchy_titles in sections] == titles
+    # 标题栈为不可变元组，无需逐段复制
+    assert all(isinstance(hierarchy_titles, tuple) for _, hierarchy_titles in sections)
+
+    for use_lxml in (False, True):
+        extractor = HtmlExtractor(file=text_content, use_lxml=use_lxml)
+        assert list(extractor.lazy_extract()) == extractor.extract()
+
+
+def test_etree_to_text_golden():
+    for case in load_golden(text_golden_path):
+        tree = html_text._cleaned_html_tree(case["input"])
+        for expected in case["outputs"]:
+            kwargs = expected["kwargs"]
+            text, split_contents, titles = html_text.etree_to_text(tree, **kwargs)
+            # json 中标题元组保存为列表
+            assert [
+                text,
+                split_contents,
+                [[list(title) for title in hierarchy_titles] for hierarchy_titles in titles],
+            ] == expected["output"]
+            assert list(html_text.iter_etree_sections(tree, **kwargs)) == [
+                (content, tuple(hierarchy_titles))
+                for content, hierarchy_titles in zip(split_contents, titles)
+            ]
+
+
+def test_lxml_preprocessing():
+    for use_first_header_as_title in (False, True):
+        for text_content in (preprocess_html, Path(file_path).read_text(encoding="utf-8")):
+            args = (text_content, "标题", use_first_header_as_title, True, True, True, True)
+            _, tables, title = html_helper.preprocessing(*args)
+            _, lxml_tables, lxml_title = html_helper.preprocessing(*args, use_lxml=True)
+            assert lxml_tables == tables
+            assert lxml_title == title
+
+            for use_summary in (True, False):
+                kwargs = {
+                    "file": text_content,
+                    "use_summary": use_summary,
+                    "use_first_header_as_title": use_first_header_as_title,
+                }
+                assert (
+                    HtmlExtractor(use_lxml=True, **kwargs).extract()
+                    == HtmlExtractor(**kwargs).extract()
+                )
+
+
+def make_indented_html(rng: random.Random, blocks: int = 12) -> str:
+    """随机生成缩进排版的 html，标签之间为仅含空白的字符串"""
+    gaps = ["\n", " ", "  ", "\t", "\n\n"]
+    words = ["体温", "120", "次/分", "正常", "表1 指标", "说明 文字"]
+
+    def indent(depth):
+        gap = rng.choice(gaps)
+        return gap + "  " * depth if rng.random() < 0.8 else gap
+
+    def inline(depth):
+        parts = []
+        for _ in range(rng.randint(1, 3)):
+            tag, word = rng.choice(["span", "b", "a", ""]), rng.choice(words)
+            if tag == "a":
+                parts.append(f"<a href='#'>{word}</a>")
+            else:
+                parts.append(f"<{tag}>{word}</{tag}>" if tag else word)
+        return indent(depth).join([""] + parts + [""])
+
+    def table(depth):
+        rows = []
+        for r in range(rng.randint(2, 4)):
+            cell = "th" if r == 0 else "td"
+            cells = "".join(
+                f"{indent(depth + 2)}<{cell}>{inline(depth + 3)}</{cell}>"
+                for _ in range(3)
+            )
+            rows.append(f"{indent(depth + 1)}<tr>{cells}{indent(depth + 1)}</tr>")
+        return f"<table>{''.join(rows)}{indent(depth)}</table>"
+
+    def block(depth):
+        kind = rng.choice(["h", "p", "table", "ul", "div", "pre", "check"])
+        if kind == "h":
+            level = rng.randint(1, 4)
+            return f"<h{level}>{inline(depth + 1)}</h{level}>"
+        if kind == "p":
+            return f"<p>{inline(depth + 1)}</p>"
+        if kind == "table":
+            return table(depth)
+        if kind == "ul":
+            items = "".join(
+                f"{indent(depth + 1)}<li>{inline(depth + 2)}</li>" for _ in range(2)
+            )
+            return f"<ul>{items}{indent(depth)}</ul>"
+        if kind == "pre":
+            return "<pre>  \n  <span>代码</span>  \n</pre>"
+        if kind == "check":
+            return (
+                f"<p>{indent(depth + 1)}<input type='checkbox'>"
+                f"{indent(depth + 1)}<span>未选</span>{indent(depth + 1)}已选</p>"
+            )
+        if depth >= 3:
+            return f"<div>{inline(depth + 1)}</div>"
+        children = "".join(
+            indent(depth + 1) + block(depth + 1) for _ in range(rng.randint(1, 3))
+        )
+        return f"<div>{children}{indent(depth)}</div>"
+
+    body = "".join(indent(1) + block(1) for _ in range(blocks))
+    return (
+        "<html>\n<head>\n  <title>缩进</title>\n</head>\n"
+        f"<body>{body}\n</body>\n</html>"
+    )
+
+
+indented_table_html = """<html><body>
+<table>
+  <tr><th>项目</th><th>说明</th></tr>
+  <tr>
+    <td>体温</td>
+    <td>
+      <span>36</span>
+      <span>℃</span>
+    </td>
+  </tr>
+  <tr>
+    <td>心率</td>
+    <td><span>120</span>  <span>次/分</span></td>
+  </tr>
+</table>
+</body></html>"""
+
+
+def test_lxml_preprocessing_indented():
+    expected = ["项目为体温的说明是36\n℃", "项目为心率的说明是120 次/分"]
+    for use_lxml in (False, True):
+        docs = HtmlExtractor(file=indented_table_html, use_lxml=use_lxml).extract()
+        assert [d.page_content for d in docs] == expected
+
+    rng = random.Random(0)
+    for _ in range(30):
+        page = make_indented_html(rng)
+        for kwargs in (
+            {},
+            {"use_summary": False},
+            {"use_first_header_as_title": True, "cut_table_to_line": False},
+        ):
+            assert (
+                HtmlExtractor(file=page, use_lxml=True, **kwargs).extract()
+                == HtmlExtractor(file=page, **kwargs).extract()
+            )
+
+
+def split_table_documents(docs: list[Document]) -> tuple[list, list]:
+    """增量解析中表格与正文交替返回，分别比较"""
+    texts = [d for d in docs if "content_type" not in d.metadata]
+    tables = [d for d in docs if "content_type" in d.metadata]
+    return texts, tables
+
+
+def test_html_extractor_incremental(monkeypatch):
+    rng = random.Random(0)
+    pages = [Path(file_path).read_text(encoding="utf-8"), preprocess_html]
+    pages += [make_text_html(rng) for _ in range(20)]
+    for chunk_size in (html_stream.CHUNK_SIZE, 7):
+        monkeypatch.setattr(html_stream, "CHUNK_SIZE", chunk_size)
+        for page in pages:
+            for kwargs in (
+                {},
+                {"use_first_header_as_title": True, "cut_table_to_line": False},
+                {"remove_hyperlinks": False, "fix_check": False, "file_name": "f.html"},
+                {"seperate_tables": False, "prevent_duplicate_header": False},
+            ):
+                expected = HtmlExtractor(
+                    file=page, use_lxml=True, use_summary=False, **kwargs
+                ).extract()
+                docs = HtmlExtractor(file=page, incremental=True, **kwargs).extract()
+                assert split_table_documents(docs) == split_table_documents(expected)
+
+    docs = HtmlExtractor(file_path, incremental=True).extract()
+    assert docs and all(d.page_content for d in docs)
+
+
+def test_html_extractor_incremental_indented(monkeypatch):
+    rng = random.Random(0)
+    pages = [indented_table_html] + [make_indented_html(rng) for _ in range(20)]
+    for chunk_size in (html_stream.CHUNK_SIZE, 7):
+        monkeypatch.setattr(html_stream, "CHUNK_SIZE", chunk_size)
+        for page in pages:
+            for kwargs in (
+                {},
+                {"use_first_header_as_title": True, "cut_table_to_line": False},
+                {"remove_hyperlinks": False, "fix_check": False},
+            ):
+                # 与默认的 BeautifulSoup 预处理结果一致
+                expected = HtmlExtractor(
+                    file=page, use_summary=False, **kwargs
+                ).extract()
+                docs = HtmlExtractor(file=page, incremental=True, **kwargs).extract()
+                assert split_table_documents(docs) == split_table_documents(expected)
+
+
+def test_html_stream_bounded():
+    section = (
+        "<div><h2>第{i}节</h2><p>说明 <a href='#'>链接</a><!-- c --></p>"
+        "<p>表{i}</p><table><tr><td>项目</td><td>{i}</td></tr></table></div>"
+    )
+    sizes = []
+    for sections in (100, 1000):
+        body = "".join(section.format(i=i) for i in range(sections))
+        html = f"<html><body><div>{body}</div></body></html>"
+        stream = html_stream.HtmlStream(
+            html[i : i + 100] for i in range(0, len(html), 100)
+        )
+        retained, tables = 0, 0
+        for _ in stream.events():
+            retained = max(retained, sum(1 for _ in stream.root.iter()))
+            tables += len(stream.pop_tables())
+        assert tables == sections
+        sizes.append(retained)
+    assert sizes[0] == sizes[1]
+
+
+def make_retry_html(paragraphs: int = 50) -> str:
+    """正文位于 comment 容器中，ruthless 模式会将其删除，触发宽松模式重试"""
+    body = "".join(
+        f"<p>第{i}段，新生儿转运前需评估呼吸、循环及体温情况。</p>" for i in range(paragraphs)
+    )
+    return f"<html><body><p>导读</p><div class='comment'>{body}</div></body></html>"
+
+
+def test_readability_retry_parses_once(monkeypatch):
+    calls = []
+    build_doc = readability_module.build_doc
+
+    def counting_build_doc(page):
+        calls.append(page)
+        return build_doc(page)
+
+    monkeypatch.setattr(readability_module, "build_doc", counting_build_doc)
+    summary = readability.Document(make_retry_html()).summary(html_partial=True)
+    assert len(calls) == 1
+    assert "第49段" in summary
+
+
+def test_readability_retry_reuses_text_stats(monkeypatch):
+    calls = []
+    text_piece = readability_module._text_piece
+
+    def counting_text_piece(text):
+        calls.append(text)
+        return text_piece(text)
+
+    monkeypatch.setattr(readability_module, "_text_piece", counting_text_piece)
+    # ruthless 模式已统计的导读文本，重试时不再重新计算
+    guide = "".join(f"<p>导读{i}</p>" for i in range(50))
+    html = make_retry_html().replace("<p>导读</p>", guide)
+    summary = readability.Document(html).summary(html_partial=True)
+    assert "第49段" in summary
+    assert "导读0" in calls
+    assert len(calls) == len(set(calls))
+
+
+def test_readability_summary_tree_nesting():
+    def shape(elem):
+        return elem.tag, elem.text or "", [shape(child) for child in elem], elem.tail or ""
+
+    def article(tree):
+        return list(tree.find("body")) if tree.tag == "html" else [tree]
+
+    # 只含行内元素与 h2 的 div 被改写为 p，h2 不能位于 p 中，与重新解析的结构一致
+    paragraph = "新生儿转运前需评估呼吸、循环及体温情况，确保转运安全。" * 5
+    for inner in ["<span>前言</span>", "<span>前言</span><h2>转运指征</h2>尾注"]:
+        html = f"<html><body><div>{paragraph}<div>{inner}</div><p>{paragraph}</p></div></body></html>"
+        tree = readability.Document(html).summary_tree(html_partial=True)
+        expected = html_text.parse_html(readability.Document(html).summary(html_partial=True))
+        assert [shape(e) for e in article(tree)] == [shape(e) for e in article(expected)]
+
+    # 嵌套的 p 中多余的 </p> 会关闭外层的 p，改为重新解析
+    html = f"<html><body><div>{paragraph}<p><span><div>前言<h2>转运指征</h2></div>尾注</span></p></div></body></html>"
+    tree = readability.Document(html).summary_tree(html_partial=True)
+    expected = html_text.parse_html(readability.Document(html).summary(html_partial=True))
+    assert tree.tag == "html"
+    assert [shape(e) for e in article(tree)] == [shape(e) for e in article(expected)]
+
+
+def test_readability_node_stats():
+    rng = random.Random(0)
+    pieces = ["", " ", "\n", " \t\n ", "\n" * 3, " " * 300, "a", "文本，", "b, c.", "\xa0"]
+
+    def text():
+        return "".join(rng.choice(pieces) for _ in range(rng.randint(0, 4)))
+
+    def element(depth):
+        tag = rng.choice(["div", "p", "a", "span", "td"] if depth else ["b"])
+        children = "".join(
+            element(depth - 1) + text() for _ in range(rng.randint(0, 3) if depth else 0)
+        )
+        return f"<{tag}>{text()}{children}</{tag}>"
+
+    for _ in range(50):
+        doc = readability.Document(f"<html><body>{element(4)}</body></html>")
+        root = doc._html(True)
+        # 增量计算的统计值与直接计算结果一致
+        for elem in root.iter():
+            stats = doc.node_stats(elem)
+            assert stats.text_length == readability_module.text_length(elem)
+            assert stats.commas == elem.text_content().count(",")
+            assert stats.link_length == sum(
+                readability_module.text_length(a) for a in elem.iterdescendants("a")
+            )
+
+
+def test_html_cut_table_handler_golden():
+    titles = [(constants.TITLE_KEY, "标题"), ("h2", ""), ("p", "表1")]
+    for case in load_golden(table_golden_path):
+        table = {"table": case["input"], "titles": titles}
+        if case["output"] is None:
+            # 单列表格的空值不能 strip，与原始实现一致抛出
+            try:
+                html_helper.html_cut_table_handler(table)
+            except AttributeError:
+                continue
+            raise AssertionError(case["input"])
+        docs = html_helper.html_cut_table_handler(table)
+        assert dump_documents(docs) == case["output"], case["input"]
+
+
 if __name__ == "__main__":
     test_html_extractor()
+    test_html_extractor_shared_tree()
+    test_lxml_preprocessing()
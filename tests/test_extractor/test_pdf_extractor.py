@@ -0,0 +1,399 @@
+import builtins
+import io
+import mmap
+import os
+import random
+
+import pymupdf
+
+from dify_rag.extractor.pdf import constants, pdf_helper, toc
+from dify_rag.extractor.pdf.batch import run_in_pool
+from dify_rag.extractor.pdf.cache import PdfExtractionCache
+from dify_rag.extractor.pdf.incremental import PdfPageStore
+from dify_rag.extractor.pdf_extractor import PdfExtractor, extract_many
+from dify_rag.models.document import Document
+from tests.log import logger
+from tests.pdf_builder import make_pdf
+
+
+def test_pdf_extractor(tmp_path):
+    file_path = make_pdf(str(tmp_path / "corrupted.pdf"), pages=5)
+    text_docs = PdfExtractor(file_path).extract()
+
+    assert len(text_docs) == 5
+    for d in text_docs:
+        assert d.metadata["titles"]
+        assert d.metadata[constants.CONTENT_REPAIRED_KEY]
+        assert "袁" not in d.page_content and "，" in d.page_content
+
+        logger.info("----->")
+        logger.info(f"Metadata: {d.metadata}")
+        logger.info(f"{d.page_content} ({len(d.page_content)})")
+
+
+def test_pdf_extractor_skips_repair_on_clean_pdf(tmp_path):
+    file_path = make_pdf(str(tmp_path / "clean.pdf"), pages=5, corrupted=False)
+    text_docs = PdfExtractor(file_path).extract()
+
+    assert text_docs
+    for d in text_docs:
+        assert not d.metadata[constants.CONTENT_REPAIRED_KEY]
+
+
+def test_pdf_extractor_parallel_matches_serial(tmp_path):
+    file_path = make_pdf(str(tmp_path / "parallel.pdf"), pages=9)
+
+    serial_docs = PdfExtractor(file_path).extract()
+    parallel_docs = PdfExtractor(file_path, workers=2).extract()
+    assert parallel_docs == serial_docs
+
+
+def test_pdf_extractor_lazy_extract_matches_extract(tmp_path):
+    for with_toc in [True, False]:
+        file_path = make_pdf(str(tmp_path / f"lazy_{with_toc}.pdf"), pages=6, with_toc=with_toc)
+        extractor = PdfExtractor(file_path)
+        assert list(extractor.lazy_extract()) == extractor.extract()
+
+
+def test_pdf_extractor_lazy_extract_partially_corrupted(tmp_path):
+    # 仅部分页面字体映射错误时，两种解析方式基于同一批抽样页判断是否修复
+    for corrupted_pages in [{0, 1}, {1, 2}, {3}]:
+        file_path = make_pdf(
+            str(tmp_path / f"partial_{min(corrupted_pages)}.pdf"),
+            pages=60,
+            corrupted_pages=corrupted_pages,
+        )
+        extractor = PdfExtractor(file_path)
+        docs = extractor.extract()
+        assert list(extractor.lazy_extract()) == docs
+        assert extractor.preview(max_sections=2) == docs[:2]
+
+
+def test_get_lines_toc_large_outline():
+    lines, lines_page_idx, toc, expected = [], [], [], []
+    for page in range(1500):
+        # 每 10 页有一页没有文本，目录项无法定位
+        if page % 10 != 9:
+            expected.append((1, f"第{page}页 第0节", len(lines)))
+            expected.append((2, f"第{page}页 第 1 节", len(lines) + 1))
+            lines += [f"第{page}页第0节", f"第{page}页 第 1 节 正文", f"第{page}页正文"]
+            lines_page_idx += [page] * 3
+        # 去除空格后匹配的标题、原样匹配的标题、找不到的标题
+        toc.append([1, f"第{page}页 第0节", page + 1])
+        toc.append([2, f"第{page}页 第 1 节", page + 1])
+        toc.append([2, f"第{page}页 第9节", page + 1])
+        # 标题只在目录指向的页面中查找
+        toc.append([2, f"第{page}页第0节", page + 2])
+    # 越界页码
+    toc += [[1, "第0页第0节", 0], [1, "第0页第0节", 1501]]
+
+    assert pdf_helper.get_lines_toc(toc, lines, lines_page_idx) == expected
+
+
+def test_generate_toc_pattern_levels():
+    lines = [
+        "摘要",
+        "第一章 总则",
+        "第一节 适用范围",
+        "1.1、转运指征",
+        "正文内容，不是标题。",
+        "第二节 转运流程",
+        "第二章 附则",
+    ]
+    assert toc.extract_title(lines[2])["pattern"] == constants.TITLE_PATTERN[3]
+    assert toc.generate_toc(lines) == [
+        [1, "摘要", 0],
+        [1, "第一章 总则", 1],
+        [2, "第一节 适用范围", 2],
+        [2, "1.1、转运指征", 3],
+        [2, "第二节 转运流程", 5],
+        [1, "第二章 附则", 6],
+    ]
+
+
+def test_split_content_large_outline():
+    rng = random.Random(0)
+    lines_toc, lines, expected_titles = [], ["前言"] * 3, []
+    counters = []
+    for _ in range(5000):
+        # 层级随机游走，子标题编号由祖先编号前缀构成
+        level = rng.randint(1, min(len(counters) + 1, 6))
+        counters = counters[:level]
+        if len(counters) < level:
+            counters.append(0)
+        counters[-1] += 1
+        title = ".".join(map(str, counters))
+        expected_titles.append([".".join(map(str, counters[:k])) for k in range(1, level + 1)])
+        lines_toc.append((level, title, len(lines)))
+        lines.extend([title, f"{title} 正文"])
+
+    repaired = []
+
+    def repair(text):
+        repaired.append(text)
+        return text
+
+    documents = PdfExtractor._split_content(lines_toc, lines, repair)
+    assert documents[0].page_content == "前言" * 3
+    assert [d.metadata["titles"] for d in documents[1:]] == expected_titles
+    assert [d.page_content for d in documents[1:]] == [f"{t} 正文" for _, t, _ in lines_toc]
+    # 每个标题只修复一次：前言 + 5000 个章节正文 + 5000 个标题
+    assert len(repaired) == 1 + 2 * len(lines_toc)
+
+
+def test_pdf_extractor_cache(tmp_path):
+    file_path = make_pdf(str(tmp_path / "cached.pdf"), pages=3)
+    cache = PdfExtractionCache(str(tmp_path / "cache.db"))
+
+    docs = PdfExtractor(file_path, cache=cache).extract()
+    assert PdfExtractor(file_path, cache=cache).extract() == docs
+    assert list(PdfExtractor(file_path, cache=cache).lazy_extract()) == docs
+    assert cache.stats()["hits"] == 2
+
+    # 解析配置不同时不命中
+    PdfExtractor(file_path, split_tags=[1], cache=cache).extract()
+    assert cache.stats()["entries"] == 2
+
+    # 未提供 file_cache_key 时按文件内容命中，重新打开缓存后仍可命中
+    cache = PdfExtractionCache(str(tmp_path / "cache.db"))
+    assert PdfExtractor(file_path, file_cache_key="kb-1", cache=cache).extract() == docs
+    assert cache.stats()["misses"] == 1
+    assert PdfExtractor(file_path, cache=cache).extract() == docs
+    assert cache.stats()["hits"] == 1
+
+    assert PdfExtractor(file_path, cache=cache).invalidate_cache() == 2
+    assert cache.stats()["entries"] == 1
+
+
+def test_pdf_extraction_cache_eviction(tmp_path):
+    cache = PdfExtractionCache(str(tmp_path / "cache.db"))
+    documents = [Document(page_content=str(i) * 1000) for i in range(10)]
+    cache.set("a", {}, documents)
+    cache.max_bytes = cache.stats()["size"] * 2
+
+    cache.set("b", {}, documents)
+    assert cache.get("a", {}) == documents
+    cache.set("c", {}, documents)
+
+    # b 最久未访问，被淘汰
+    assert cache.get("b", {}) is None
+    assert cache.get("a", {}) == cache.get("c", {}) == documents
+    assert cache.stats()["evictions"] == 1
+
+
+def test_pdf_extractor_incremental(tmp_path):
+    file_path = make_pdf(str(tmp_path / "v1.pdf"), pages=6)
+    store = PdfPageStore(str(tmp_path / "pages.db"))
+
+    first = PdfExtractor(file_path, page_store=store).extract_incremental("guideline")
+    assert first.documents == PdfExtractor(file_path).extract()
+    assert first.changed_pages == list(range(6))
+    assert first.changed_sections == list(range(len(first.documents)))
+
+    # 修订第 3 页，只有该页重新解析，只有第 3 章变化
+    revised_path = str(tmp_path / "v2.pdf")
+    with pymupdf.open(file_path) as doc:
+        doc[2].insert_text((72, 760), "补充说明", fontname="china-s", fontsize=10)
+        doc.save(revised_path)
+
+    second = PdfExtractor(revised_path, page_store=store).extract_incremental("guideline")
+    assert second.documents == PdfExtractor(revised_path).extract()
+    assert second.changed_pages == [2]
+    assert [second.documents[i].metadata["titles"] for i in second.changed_sections] == [
+        ["第3章 新生儿转运"]
+    ]
+    assert second.removed_sections == [first.section_hashes[2]]
+
+    # 未修改的文件再次解析时不重新解析任何页面
+    third = PdfExtractor(revised_path, page_store=store).extract_incremental("guideline")
+    assert third.changed_pages == third.changed_sections == third.removed_sections == []
+    assert store.stats() == {"pages": 6, "documents": 1}
+
+    # 只修改共用字体的编码，使用该字体的页面全部重新解析
+    font_path = str(tmp_path / "v3.pdf")
+    with pymupdf.open(revised_path) as doc:
+        font_xref = next(f[0] for f in doc[0].get_fonts() if f[3] == "Helvetica")
+        doc.xref_set_key(
+            font_xref,
+            "Encoding",
+            "<< /BaseEncoding /WinAnsiEncoding /Differences [ 49 /A ] >>",
+        )
+        doc.save(font_path)
+
+    fourth = PdfExtractor(font_path, page_store=store).extract_incremental("guideline")
+    assert fourth.documents == PdfExtractor(font_path).extract()
+    assert fourth.changed_pages == list(range(6))
+
+
+def test_pdf_page_store_disabled(tmp_path):
+    # 未配置 store_path 时不打开 sqlite 连接，增量解析视为首次解析
+    file_path = make_pdf(str(tmp_path / "disabled.pdf"), pages=3)
+    store = PdfPageStore()
+    assert not store.enabled
+
+    for _ in range(2):
+        result = PdfExtractor(file_path, page_store=store).extract_incremental("guideline")
+        assert result.changed_pages == list(range(3))
+        assert result.changed_sections == list(range(len(result.documents)))
+    assert store.stats() == {"pages": 0, "documents": 0}
+
+
+def test_pdf_extractor_pages_and_preview(tmp_path):
+    file_path = make_pdf(str(tmp_path / "preview.pdf"), pages=6)
+    extractor = PdfExtractor(file_path)
+    docs = extractor.extract()
+
+    assert extractor.extract(pages=range(6)) == docs
+    assert extractor.extract(pages=range(2, 4)) == docs[2:4]
+    assert extractor.extract(pages=range(4, 100)) == docs[4:]
+    assert extractor.preview(max_sections=2) == docs[:2]
+
+
+def test_pdf_extractor_in_memory_input(tmp_path, monkeypatch):
+    file_path = make_pdf(str(tmp_path / "upload.pdf"), pages=3)
+    docs = PdfExtractor(file_path).extract()
+    assert PdfExtractor(file_path, use_mmap=True).extract() == docs
+
+    with open(file_path, "rb") as f:
+        data = f.read()
+
+    # 内存数据解析过程中不打开任何文件
+    def forbid_open(*args, **kwargs):
+        raise AssertionError("unexpected file access")
+
+    monkeypatch.setattr(builtins, "open", forbid_open)
+    for source in [data, bytearray(data), memoryview(data), io.BytesIO(data)]:
+        extractor = PdfExtractor(source)
+        assert extractor.extract() == docs
+        assert list(extractor.lazy_extract()) == docs
+
+
+def test_pdf_extractor_mmap_closed(tmp_path, monkeypatch):
+    file_path = make_pdf(str(tmp_path / "mapped.pdf"), pages=3)
+    mapped = []
+    mmap_mmap = mmap.mmap
+
+    def recording_mmap(*args, **kwargs):
+        mapped.append(mmap_mmap(*args, **kwargs))
+        return mapped[-1]
+
+    monkeypatch.setattr(mmap, "mmap", recording_mmap)
+    extractor = PdfExtractor(file_path, use_mmap=True)
+    docs = extractor.extract()
+    assert list(extractor.lazy_extract()) == docs
+    assert extractor.preview(max_sections=1) == docs[:1]
+    # 解析结束（包括提前停止的预览）后立即解除映射，不依赖垃圾回收
+    assert len(mapped) == 3
+    assert all(m.closed for m in mapped)
+
+
+def test_header_footer_height_tolerance():
+    page_metrics = [
+        {"header_height": 12.0 + i % 3 * 0.1, "footer_height": 9.0 + i * 2}
+        for i in range(20)
+    ]
+    # 页眉高度存在细微差异时仍视为相同，页脚高度各不相同
+    assert pdf_helper.should_remove_headers_footers(page_metrics) == (True, False)
+    assert pdf_helper.should_remove_headers_footers(page_metrics, tolerance=0.01) == (
+        False,
+        False,
+    )
+
+
+def test_header_footer_height_window():
+    # 正文与页脚高度相差不足 1pt 但超过容差，不应合并为同一高度
+    page_metrics = [{"header_height": 12.0, "footer_height": 12.366}] * 11
+    page_metrics += [{"header_height": 12.0, "footer_height": 11.76}] * 2
+    assert pdf_helper.should_remove_headers_footers(page_metrics, tolerance=0.5) == (
+        True,
+        False,
+    )
+    assert pdf_helper.should_remove_headers_footers(page_metrics, tolerance=1) == (
+        True,
+        True,
+    )
+
+
+def test_filter_doc_header_or_footer_keeps_body_without_footer(tmp_path):
+    # 页码页脚（12.366pt）与正文（12.0pt）高度接近，缺少页脚的页面最后一行正文应保留
+    footerless_pages = {4, 9}
+    file_path = make_pdf(
+        str(tmp_path / "footerless.pdf"), pages=13, footerless_pages=footerless_pages
+    )
+    with pymupdf.open(file_path) as doc:
+        page_blocks = pdf_helper.filter_doc_header_or_footer(doc)
+
+    for page_idx, blocks in enumerate(page_blocks):
+        last_text = blocks[-1][4]
+        if page_idx in footerless_pages:
+            assert last_text.startswith("20.")
+        else:
+            assert last_text.strip() == str(page_idx + 1)
+
+
+def test_filter_doc_header_or_footer_extracts_each_page_once(tmp_path, monkeypatch):
+    file_path = make_pdf(str(tmp_path / "sampled.pdf"), pages=45)
+    collected = []
+    collect_page_metrics = pdf_helper.collect_page_metrics
+
+    def counting_collect(page):
+        collected.append(page.number)
+        return collect_page_metrics(page)
+
+    monkeypatch.setattr(pdf_helper, "collect_page_metrics", counting_collect)
+    with pymupdf.open(file_path) as doc:
+        page_blocks = pdf_helper.filter_doc_header_or_footer(doc)
+
+    assert sorted(collected) == list(range(45))
+    # 页眉与页码页脚均被移除
+    texts = [block[4] for blocks in page_blocks for block in blocks]
+    assert not any("临床诊疗指南" in t or t.strip().isdigit() for t in texts)
+
+
+def test_extract_many(tmp_path):
+    paths = [make_pdf(str(tmp_path / f"batch_{i}.pdf"), pages=i + 2) for i in range(3)]
+    broken_path = tmp_path / "broken.pdf"
+    broken_path.write_bytes(b"not a pdf")
+    paths.insert(1, str(broken_path))
+
+    # max_rss_mb 很小时每个进程处理一个文件后即被替换
+    results = sorted(extract_many(paths, workers=2, max_rss_mb=1), key=lambda r: r.index)
+    assert [r.path for r in results] == paths
+    assert results[1].documents is None and results[1].error
+    for result in results[:1] + results[2:]:
+        assert result.error is None
+        assert result.documents == PdfExtractor(result.path).extract()
+
+
+def test_extract_many_with_cache(tmp_path, monkeypatch):
+    # 子进程不继承主进程的 sqlite 连接，按环境变量或传入的缓存路径各自打开
+    paths = [make_pdf(str(tmp_path / f"cached_{i}.pdf"), pages=i + 2) for i in range(4)]
+    expected = [PdfExtractor(path).extract() for path in paths]
+
+    cache_path = str(tmp_path / "env_cache.db")
+    monkeypatch.setenv("DIFY_RAG_PDF_CACHE_PATH", cache_path)
+    for _ in range(2):
+        results = sorted(extract_many(paths, workers=2), key=lambda r: r.index)
+        assert [r.documents for r in results] == expected
+    assert PdfExtractionCache(cache_path).stats()["entries"] == len(paths)
+
+    cache = PdfExtractionCache(str(tmp_path / "cache.db"))
+    results = sorted(extract_many(paths, workers=2, cache=cache), key=lambda r: r.index)
+    assert [r.documents for r in results] == expected
+    assert cache.stats()["entries"] == len(paths)
+
+
+def crash_on_negative(value):
+    if value < 0:
+        os._exit(3)
+    return value * 2
+
+
+def test_run_in_pool_survives_worker_crash():
+    results = sorted(run_in_pool(crash_on_negative, [1, -1, 2, 3], workers=2))
+    assert results == [
+        (0, 2, None),
+        (1, None, "worker exited with code 3"),
+        (2, 4, None),
+        (3, 6, None),
+    ]
@@ -0,0 +1,27 @@
+import json
+
+from dify_rag.extractor.utils import fix_error_pdf_content
+
+golden_path = "tests/data/pdf_repair_golden.json"
+
+
+def test_fix_error_pdf_content_golden():
+    with open(golden_path, encoding="utf-8") as f:
+        golden = json.load(f)
+
+    for case in golden:
+        assert fix_error_pdf_content(case["input"]) == case["output"], case["input"]
+
+
+def test_should_protect_char():
+    from dify_rag.extractor.utils import should_protect_char
+
+    assert should_protect_char("转运至医院治疗", "院")
+    assert should_protect_char("一步之遥", "遥")
+    assert not should_protect_char("血压正常遥患者", "遥")
+    assert not should_protect_char("36 益袁血", "袁")
+
+
+if __name__ == "__main__":
+    test_fix_error_pdf_content_golden()
+    test_should_protect_char()
@@ -0,0 +1,105 @@
+import json
+
+from dify_rag.extractor import utils
+
+# 原始实现的判断结果
+gibberish_golden_path = "tests/data/gibberish_golden.json"
+
+CHINESE_TEXT = "新生儿转运是危重新生儿救治的重要环节，需要规范的转运流程。\n"
+
+
+def test_detect_encoding_small_file_matches_find_codec(tmp_path):
+    for encoding in ["utf-8", "gbk"]:
+        blob = CHINESE_TEXT.encode(encoding)
+        file_path = tmp_path / f"{encoding}.txt"
+        file_path.write_bytes(blob)
+
+        result = utils.detect_encoding(file_path)
+        assert result.encoding == utils.find_codec(blob)
+        assert result.confidence == 1.0
+
+
+def test_detect_encoding_bom(tmp_path):
+    file_path = tmp_path / "bom.csv"
+    file_path.write_bytes(CHINESE_TEXT.encode("utf-8-sig"))
+
+    result = utils.detect_encoding(file_path)
+    assert result.encoding == "utf-8-sig"
+    assert result.source == "bom"
+
+
+def test_detect_encoding_meta_charset(tmp_path):
+    file_path = tmp_path / "meta.html"
+    html = f'<html><head><meta charset="gbk"></head><body>{CHINESE_TEXT}</body></html>'
+    file_path.write_bytes(html.encode("gbk") * 1000)
+
+    result = utils.detect_encoding(file_path, sample_size=1024)
+    assert result.encoding == "gb18030"
+    assert result.source == "meta"
+
+
+def test_detect_encoding_large_file_uses_sample(tmp_path):
+    file_path = tmp_path / "large.txt"
+    file_path.write_bytes(CHINESE_TEXT.encode("gbk") * 10000)
+
+    result = utils.detect_encoding(file_path, sample_size=4096)
+    assert result.source == "sample"
+    assert result.confidence >= utils.ENCODING_MIN_CONFIDENCE
+    assert file_path.read_text(encoding=result.encoding) == CHINESE_TEXT * 10000
+
+
+def test_detect_encoding_ascii_sample_falls_back_to_full_scan(tmp_path):
+    file_path = tmp_path / "ascii_head.txt"
+    blob = b"id,name\n" * 1000 + CHINESE_TEXT.encode("gbk")
+    file_path.write_bytes(blob)
+
+    result = utils.detect_encoding(file_path, sample_size=1024)
+    assert result.source == "full_scan"
+    assert result.encoding == utils.find_codec(blob)
+
+
+def test_detect_encoding_invalid_bytes_after_sample(tmp_path):
+    # 采样内为合法的 utf-8 与 gbk，采样之后出现无法解码的字节
+    for encoding in ["utf-8", "gbk"]:
+        file_path = tmp_path / f"invalid_tail_{encoding}.txt"
+        blob = CHINESE_TEXT.encode(encoding) * 1000 + b"\xff\xfe\x80" + CHINESE_TEXT.encode(encoding)
+        file_path.write_bytes(blob)
+
+        result = utils.detect_encoding(file_path, sample_size=4096)
+        assert result.encoding == utils.find_codec(blob)
+        file_path.read_text(encoding=result.encoding)
+
+
+def test_encoding_cache(tmp_path):
+    file_path = tmp_path / "cached.txt"
+    file_path.write_bytes(CHINESE_TEXT.encode("gbk"))
+    cache = utils.EncodingCache(maxsize=1, store_path=str(tmp_path / "encoding.db"))
+
+    assert cache.get(file_path) is None
+    result = utils.detect_encoding(file_path)
+    cache.set(file_path, result)
+    assert cache.get(file_path) == result
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 1
+
+    other_path = tmp_path / "other.txt"
+    other_path.write_bytes(CHINESE_TEXT.encode("utf-8"))
+    cache.set(other_path, utils.detect_encoding(other_path))
+    assert cache.stats()["evictions"] == 1
+
+    # 内存淘汰后仍可从持久化存储中读取
+    assert cache.get(file_path) == result
+
+    # 文件变化后标识不同，不再命中
+    file_path.write_bytes(CHINESE_TEXT.encode("utf-8") * 2)
+    assert cache.get(file_path) is None
+
+
+def test_is_gibberish_golden():
+    with open(gibberish_golden_path, encoding="utf-8") as f:
+        golden = json.load(f)
+
+    texts = [case["input"] for case in golden]
+    expected = [case["output"] for case in golden]
+    assert [utils.is_gibberish(text) for text in texts] == expected
+    assert utils.classify_gibberish(texts) == expected
+    assert utils.classify_gibberish(["", texts[0], ""]) == [False, expected[0], False]